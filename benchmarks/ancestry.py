@@ -0,0 +1,83 @@
+"""
+Common-ancestor and ancestry queries on a long history, with skip pointers against walking back by generation, and
+the read-only dag view against copying the dag.
+
+    python benchmarks/ancestry.py [commits]
+"""
+import heapq
+import json
+import os
+import sys
+import tempfile
+import time
+
+from revert import config
+from revert.dag import Dag, DagView, none
+
+
+def walk_merge_base(dag, a, b):
+    """the search by generation the skip pointers replace for histories without merges"""
+    reached = {a: 1}
+    reached[b] = reached.get(b, 0) | 2
+    queue = [(-dag.generation(i), i) for i in reached]
+    heapq.heapify(queue)
+    while queue:
+        _, i = heapq.heappop(queue)
+        sides = reached.pop(i, None)
+        if sides is None:
+            continue
+        if sides == 3:
+            return i
+        for parent in dag.parent_indexes(i):
+            if parent not in reached:
+                heapq.heappush(queue, (-dag.generation(parent), parent))
+            reached[parent] = reached.get(parent, 0) | sides
+    return none
+
+
+def timed(function, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = function()
+    return result, (time.perf_counter() - start) / repeat
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    directory = tempfile.mkdtemp()
+    # a long chain with a branch off its first commit and one off its last
+    with open(os.path.join(directory, config.commit_parents_file), 'w') as f:
+        parent = config.init_commit
+        for i in range(n):
+            commit = '%064x' % (i + 1)
+            f.write(json.dumps([commit, [parent], [f'commit {i}']]) + '\n')
+            parent = commit
+        f.write(json.dumps(['old branch', ['%064x' % 1], ['branched early']]) + '\n')
+        f.write(json.dumps(['new branch', ['%064x' % (n - 1)], ['branched late']]) + '\n')
+    start = time.perf_counter()
+    dag = Dag(directory)
+    print(f'indexing {n} commits: {time.perf_counter() - start:.1f} s')
+    dag.close()
+    start = time.perf_counter()
+    dag = Dag(directory)
+    print(f'opening the index: {(time.perf_counter() - start) * 1e3:.1f} ms')
+    tip = n - 1
+    for name, branch in (('nearby', dag.index('new branch')), ('distant', dag.index('old branch'))):
+        expected, skip = timed(lambda: dag.merge_base(tip, branch), 100)
+        walked, walk = timed(lambda: walk_merge_base(dag, tip, branch), 1)
+        assert expected == walked
+        print(f'{name} common ancestor: {skip * 1e6:.0f} us with skip pointers, {walk * 1e3:.1f} ms walking back')
+    view = DagView(dag, dag.id(tip))
+    _, ancestor = timed(lambda: view.ancestor(view.head, n // 2), 100)
+    print(f'ancestor {n // 2} commits back: {ancestor * 1e6:.0f} us')
+    _, viewed = timed(lambda: (view.parents(view.head), view.messages(view.head), view.head in view), 100)
+    from revert import db_state
+    from revert.revert import get_commit_dag
+    db_state.dag = dag
+    _, copied = timed(get_commit_dag, 1)
+    print(f'parents and messages of the head: {viewed * 1e6:.0f} us from the view, {copied * 1e3:.0f} ms copying the dag')
+    dag.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,50 @@
+"""
+Storage and commit time of commits that touch a key next to a large value, with the value stored inline in every
+commit that changes it and as a blob.
+
+    python benchmarks/blobs.py [commits] [value size]
+"""
+import contextlib
+import io
+import os
+import sys
+import tempfile
+import time
+
+import revert
+from revert import compaction, config
+
+
+def directory_size(directory):
+    total = compaction.directory_size(directory)
+    for path, _, names in os.walk(f'{directory}/blobs'):
+        total += sum(os.path.getsize(f'{path}/{name}') for name in names)
+    return total
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    size = int(sys.argv[2]) if len(sys.argv) > 2 else 1 << 16
+    documents = ['x' * size, 'y' * size]
+    for name, threshold in (('inline', sys.maxsize), ('blobs', 1 << 12)):
+        config.blob_threshold = threshold
+        directory = tempfile.mkdtemp()
+        with contextlib.redirect_stdout(io.StringIO()):
+            revert.connect(directory)
+            start = time.perf_counter()
+            for i in range(n):
+                with revert.transaction(f'commit {i}'):
+                    revert.put('document', documents[i % 2])
+                    revert.put('version', str(i))
+            revert.flush()
+            elapsed = time.perf_counter() - start
+            start = time.perf_counter()
+            for _ in range(n // 2):
+                revert.undo()
+            undo = time.perf_counter() - start
+        print(f'{name:>6}: {directory_size(directory) / 1e6:.1f} MB on disk, {n / elapsed:.0f} commits/s, '
+              f'{n // 2} undos in {undo * 1e3:.0f} ms')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,41 @@
+"""
+Checking out across a long history of commits that keep rewriting the same keys.
+
+    python benchmarks/checkout_jump.py [commits]
+"""
+import contextlib
+import io
+import sys
+import tempfile
+import time
+
+import revert
+from revert import config, db_state
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    config.checkpoint_interval = 2 * n
+    with contextlib.redirect_stdout(io.StringIO()):
+        revert.connect(tempfile.mkdtemp())
+        with revert.transaction('base'):
+            for j in range(2000):
+                revert.put(f'objects/{j}', '0')
+        first = db_state.head
+        for i in range(n):
+            with revert.transaction(f'commit {i}'):
+                for j in range(200):
+                    revert.put(f'objects/{j}', str(i))
+        last = db_state.head
+    times = []
+    for _ in range(3):
+        for target in (first, last):
+            with contextlib.redirect_stdout(io.StringIO()):
+                start = time.perf_counter()
+                revert.checkout(target)
+                times.append(time.perf_counter() - start)
+    print(f'{min(times) * 1e3:.0f} ms to jump {n} commits of 200 writes over 2000 keys')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,56 @@
+"""
+Checking out across a long history with the commits read one at a time and read ahead on a pool of threads, with the
+pack evicted from the page cache before every checkout.
+
+    python benchmarks/checkout_prefetch.py [commits]
+"""
+import contextlib
+import io
+import os
+import sys
+import tempfile
+import time
+
+import revert
+from revert import config, db_state
+
+
+def evict(directory):
+    """drops the pack segments from the page cache, which needs no privileges for clean pages"""
+    for name in os.listdir(directory):
+        if name.startswith('pack-'):
+            fd = os.open(os.path.join(directory, name), os.O_RDONLY)
+            os.fsync(fd)
+            os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+            os.close(fd)
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    config.checkpoint_interval = 2 * n
+    config.checkpoint_bytes = 1 << 40
+    directory = tempfile.mkdtemp()
+    with contextlib.redirect_stdout(io.StringIO()):
+        revert.connect(directory)
+        first = db_state.head
+        for i in range(n):
+            with revert.transaction(f'commit {i}'):
+                for j in range(50):
+                    revert.put(f'objects/{i % 100}/{j}', f'{i} {"x" * 100}')
+        last = db_state.head
+    for window in (0, config.prefetch_window):
+        config.prefetch_window = window
+        times = []
+        for _ in range(3):
+            for target in (first, last):
+                with contextlib.redirect_stdout(io.StringIO()):
+                    revert.connect(directory)
+                    evict(directory)
+                    start = time.perf_counter()
+                    revert.checkout(target)
+                    times.append(time.perf_counter() - start)
+        print(f'window {window:>2}: {min(times) * 1e3:.0f} ms to check out across {n} commits from a cold cache')
+
+
+if __name__ == '__main__':
+    main()
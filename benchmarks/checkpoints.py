@@ -0,0 +1,35 @@
+"""
+Time to connect to a history of small commits, replaying it from init against loading the latest checkpoint.
+
+    python benchmarks/checkpoints.py [commits]
+"""
+import contextlib
+import io
+import sys
+import tempfile
+import time
+
+import revert
+from revert import config
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 20_000
+    for interval in (2 * n, 1000):
+        config.checkpoint_interval = interval
+        directory = tempfile.mkdtemp()
+        with contextlib.redirect_stdout(io.StringIO()):
+            revert.connect(directory)
+            for i in range(n):
+                with revert.transaction(f'commit {i}'):
+                    for j in range(10):
+                        revert.put(f'objects/{(i * 10 + j) % 2000}/value', str(i))
+            start = time.perf_counter()
+            revert.connect(directory)
+            elapsed = time.perf_counter() - start
+        print(f'checkpoint every {interval:>5} commits: connect {elapsed * 1e3:.0f} ms, '
+              f'{len(revert.db_state.checkpoints)} checkpoints')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,47 @@
+"""
+Size and parse + apply throughput of the legacy json commit files against the binary format.
+
+    python benchmarks/commit_format.py [keys]
+"""
+import json
+import sys
+import time
+
+from revert import commit_file
+from revert.commit_file import CommitFile
+from revert.transaction import Transaction
+from revert.trie import Trie, split
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    state = Trie()
+    trans = Transaction('benchmark')
+    for i in range(n):
+        trans.put(state, split(f'ogm/objects/{i // 10}/field{i % 10}'), str(i))
+    legacy = json.dumps({'parents': ['init'], **trans.to_json()})
+    binary = commit_file.encode(['init'], trans.messages, trans.old_values, trans.new_values)
+
+    start = time.perf_counter()
+    for _ in Transaction.from_json(json.loads(legacy)).new_values.items([]):
+        pass
+    legacy_parse = time.perf_counter() - start
+    start = time.perf_counter()
+    for _ in CommitFile(binary).new_items():
+        pass
+    binary_parse = time.perf_counter() - start
+    start = time.perf_counter()
+    Transaction.from_json(json.loads(legacy)).redo(Trie())
+    legacy_apply = time.perf_counter() - start
+    start = time.perf_counter()
+    CommitFile(binary).redo(Trie())
+    binary_apply = time.perf_counter() - start
+    print(f'{n} keys')
+    for name, size, parse, apply in (('json', len(legacy), legacy_parse, legacy_apply),
+                                     ('binary', len(binary), binary_parse, binary_apply)):
+        print(f'{name:>6}: {size / 1e6:.2f} MB, parse {parse * 1e3:.0f} ms ({n / parse:,.0f} ops/s), '
+              f'parse + redo {apply * 1e3:.0f} ms ({n / apply:,.0f} ops/s)')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,35 @@
+"""
+Commits per second under each durability policy, counting until all commits are written.
+
+    python benchmarks/commit_throughput.py [commits]
+"""
+import contextlib
+import io
+import sys
+import tempfile
+import time
+
+import revert
+from revert import config
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    for durability in ('none', 'batch', 'every_commit'):
+        config.durability = durability
+        with contextlib.redirect_stdout(io.StringIO()):
+            revert.connect(tempfile.mkdtemp())
+            start = time.perf_counter()
+            for i in range(n):
+                with revert.transaction(f'commit {i}'):
+                    for j in range(5):
+                        revert.put(f'objects/{i}/{j}', str(i))
+            returned = time.perf_counter() - start
+            revert.flush()
+            elapsed = time.perf_counter() - start
+        print(f'{durability:>12}: {n / elapsed:.0f} commits/s, transactions returned after {returned * 1e3:.0f} ms, '
+              f'written after {elapsed * 1e3:.0f} ms')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,30 @@
+"""
+Counter updates through the public API, one call per key against one add_many per batch.
+
+    python benchmarks/counters.py [keys]
+"""
+import sys
+import tempfile
+import time
+
+import revert
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    revert.connect(tempfile.mkdtemp())
+    for name, apply in (('count_up_or_set', lambda keys: [revert.count_up_or_set(key) for key in keys]),
+                        ('increment', lambda keys: [revert.increment(key, 1) for key in keys]),
+                        ('add_many', lambda keys: revert.add_many([(key, 1) for key in keys]))):
+        keys = [f'{name}/child_relations/{i % 1000}/Edge/{i}' for i in range(n)]
+        times = []
+        for _ in range(2):
+            with revert.transaction(name):
+                start = time.perf_counter()
+                apply(keys)
+                times.append(time.perf_counter() - start)
+        print(f'{name:>15}: create {times[0] / n * 1e9:.0f} ns, update {times[1] / n * 1e9:.0f} ns per increment')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,61 @@
+"""
+Loading the commit DAG of a long linear history: parsing every line of the commits log into dicts, as connect used to,
+against opening the memory-mapped dag index.
+
+    python benchmarks/dag_load.py [commits]
+"""
+import json
+import os
+import sys
+import tempfile
+import time
+from collections import defaultdict
+
+from revert import config
+from revert.dag import Dag
+
+
+def parse_log(directory):
+    commit_parents = defaultdict(list)
+    commit_children = defaultdict(list)
+    commit_messages = {}
+    with open(os.path.join(directory, config.commit_parents_file), 'r') as f:
+        for line in f.readlines():
+            commit, parents, messages = json.loads(line)
+            commit_parents[commit] = parents
+            commit_messages[commit] = messages
+            for parent in parents:
+                commit_children[parent].append(commit)
+    return commit_parents
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    directory = tempfile.mkdtemp()
+    with open(os.path.join(directory, config.commit_parents_file), 'w') as f:
+        parent = config.init_commit
+        for i in range(n):
+            commit = '%064x' % (i + 1)
+            f.write(json.dumps([commit, [parent], [f'transaction {i}']]) + '\n')
+            parent = commit
+    for name, load in (('parse log', lambda: parse_log(directory)),
+                       ('index log', lambda: Dag(directory).close()),
+                       ('open index', lambda: Dag(directory).close())):
+        start = time.perf_counter()
+        load()
+        print(f'{name:>10}: {(time.perf_counter() - start) * 1e3:.0f} ms')
+    dag = Dag(directory)
+    start = time.perf_counter()
+    head = dag.index(parent)
+    walk = [dag.id(i) for i in range(head, head - 1000, -1)]
+    print(f'head lookup and 1000 ids: {(time.perf_counter() - start) * 1e3:.1f} ms')
+    for name, query in (('first lookup of an old commit', lambda: dag.index(walk[-1])),
+                        ('first children query', lambda: dag.children(walk[-1]))):
+        start = time.perf_counter()
+        query()
+        print(f'{name}: {(time.perf_counter() - start) * 1e3:.0f} ms')
+    dag.close()
+
+
+if __name__ == '__main__':
+    main()
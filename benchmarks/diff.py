@@ -0,0 +1,44 @@
+"""
+Diffing two commits of a large store that differ in a few keys, against comparing both states item by item.
+
+    python benchmarks/diff.py [keys] [changed keys]
+"""
+import contextlib
+import io
+import sys
+import tempfile
+import time
+
+import revert
+from revert import db_state
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    changed = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    with contextlib.redirect_stdout(io.StringIO()):
+        revert.connect(tempfile.mkdtemp())
+        with revert.transaction('base'):
+            for i in range(n):
+                revert.put(f'objects/{i % 1000}/{i}', str(i))
+        first = db_state.head
+        for i in range(changed):
+            with revert.transaction(f'change {i}'):
+                revert.put(f'objects/{i * 7919 % 1000}/{i * 7919 % n}', 'changed')
+        last = db_state.head
+        start = time.perf_counter()
+        changes = list(revert.diff(first, last))
+        elapsed = time.perf_counter() - start
+        start = time.perf_counter()
+        new = dict(revert.match_items('objects'))
+        revert.checkout(first)
+        old = dict(revert.match_items('objects'))
+        compared = [key for key in old.keys() | new.keys() if old.get(key) != new.get(key)]
+        full = time.perf_counter() - start
+    assert len(changes) == len(compared) == changed
+    print(f'diff of {changed} changes among {n} keys: {elapsed * 1e3:.1f} ms, '
+          f'checking out and comparing all items: {full * 1e3:.0f} ms')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,51 @@
+"""
+Lookups through the public API with keys split on every call, with the split cache, and with pre-split keys.
+
+    python benchmarks/key_split.py [objects]
+"""
+import sys
+import tempfile
+import time
+import uuid
+
+import revert
+from revert import db_state
+from revert.trie import split
+
+
+def best(f):
+    times = []
+    for _ in range(5):
+        start = time.perf_counter()
+        f()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 10_000
+    revert.connect(tempfile.mkdtemp())
+    paths = [f'ogm/objects/{uuid.UUID(int=i)}/attrs/name' for i in range(n)]
+    with revert.transaction('fill'):
+        for path in paths:
+            revert.put(path, 'value')
+    keys = [revert.key(path) for path in paths]
+
+    def uncached():
+        for path in paths:
+            db_state.state[split(path)]
+
+    def cached():
+        for path in paths:
+            revert.safe_get(path)
+
+    def presplit():
+        for k in keys:
+            revert.safe_get(k)
+
+    for name, f in (('split per call', uncached), ('split cache', cached), ('Key', presplit)):
+        print(f'{name:>14}: {best(f) / n * 1e9:.0f} ns per get')
+
+
+if __name__ == '__main__':
+    main()
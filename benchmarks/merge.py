@@ -0,0 +1,59 @@
+"""
+Merging two long branches of a large store, against merging by comparing the three states item by item.
+
+    python benchmarks/merge.py [keys] [commits per branch]
+"""
+import contextlib
+import io
+import sys
+import tempfile
+import time
+
+import revert
+from revert import db_state
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    commits = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+    with contextlib.redirect_stdout(io.StringIO()):
+        revert.connect(tempfile.mkdtemp())
+        with revert.transaction('base'):
+            for i in range(n):
+                revert.put(f'objects/{i % 1000}/{i}', str(i))
+        base = db_state.head
+        for branch in ('theirs', 'ours'):
+            revert.checkout(base)
+            for i in range(commits):
+                with revert.transaction(f'{branch} {i}'):
+                    for j in range(10):
+                        k = (i * 10 + j) * 7919 % n
+                        # the branches change disjoint keys, except for every 50th commit
+                        revert.put(f'objects/{k % 1000}/{k}', branch if i % 50 else f'{branch} {i}')
+                    revert.put(f'{branch}/{i}', str(i))
+            if branch == 'theirs':
+                theirs = db_state.head
+        ours = db_state.head
+        start = time.perf_counter()
+        revert.merge(theirs, lambda key, base_value, our_value, their_value: our_value)
+        elapsed = time.perf_counter() - start
+        merged = dict(revert.match_items(''))
+        start = time.perf_counter()
+        states = []
+        for commit in (base, ours, theirs):
+            revert.checkout(commit)
+            states.append(dict(revert.match_items('')))
+        base_items, our_items, their_items = states
+        naive = dict(our_items)
+        for key in our_items.keys() | their_items.keys():
+            if our_items.get(key) == base_items.get(key) and their_items.get(key) != our_items.get(key):
+                naive[key] = their_items[key]
+        naive = {key: value for key, value in naive.items() if value is not None}
+        full = time.perf_counter() - start
+    assert naive == merged
+    print(f'merging {commits} commits into {commits} others over {n} keys: {elapsed * 1e3:.0f} ms, '
+          f'checking out and comparing all items: {full * 1e3:.0f} ms')
+
+
+if __name__ == '__main__':
+    main()
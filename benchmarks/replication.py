@@ -0,0 +1,55 @@
+"""
+Replicating a long history into an empty directory, and then the few commits made since.
+
+    python benchmarks/replication.py [commits]
+"""
+import contextlib
+import io
+import os
+import sys
+import tempfile
+import time
+
+import revert
+from revert import db_state
+from revert.replication import replicate
+
+
+def directory_size(directory):
+    return sum(os.path.getsize(os.path.join(path, name)) for path, _, names in os.walk(directory) for name in names)
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    source, target = tempfile.mkdtemp(), tempfile.mkdtemp()
+    with contextlib.redirect_stdout(io.StringIO()):
+        revert.connect(source)
+        for i in range(n):
+            with revert.transaction(f'commit {i}'):
+                for j in range(5):
+                    revert.put(f'objects/{i % 1000}/{j}', f'{i} {j}')
+        revert.connect(tempfile.mkdtemp())
+    start = time.perf_counter()
+    commits, _ = replicate(source, target)
+    elapsed = time.perf_counter() - start
+    size = directory_size(target)
+    print(f'full: {commits} commits in {elapsed * 1e3:.0f} ms, {commits / elapsed:.0f} commits/s, '
+          f'{size / elapsed / 1e6:.1f} MB/s')
+    with contextlib.redirect_stdout(io.StringIO()):
+        revert.connect(source)
+        for i in range(100):
+            with revert.transaction(f'later {i}'):
+                revert.put(f'later/{i}', str(i))
+        head = db_state.head
+        revert.connect(tempfile.mkdtemp())
+    start = time.perf_counter()
+    commits, _ = replicate(source, target)
+    elapsed = time.perf_counter() - start
+    print(f'incremental: {commits} commits in {elapsed * 1e3:.0f} ms')
+    with contextlib.redirect_stdout(io.StringIO()):
+        revert.connect(target)
+    assert db_state.head == head
+
+
+if __name__ == '__main__':
+    main()
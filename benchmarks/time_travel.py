@@ -0,0 +1,60 @@
+"""
+Reading values as of old commits with get_at, against checking each commit out and back.
+
+    python benchmarks/time_travel.py [keys] [commits] [reads]
+"""
+import contextlib
+import io
+import random
+import sys
+import tempfile
+import time
+
+import revert
+from revert import db_state
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    commits = int(sys.argv[2]) if len(sys.argv) > 2 else 5000
+    reads = int(sys.argv[3]) if len(sys.argv) > 3 else 50
+    rng = random.Random(0)
+    with contextlib.redirect_stdout(io.StringIO()):
+        revert.connect(tempfile.mkdtemp())
+        with revert.transaction('base'):
+            for i in range(n):
+                revert.put(f'objects/{i}', '0')
+        history = []
+        for i in range(commits):
+            with revert.transaction(f'change {i}'):
+                revert.put(f'objects/{rng.randrange(n)}', str(i))
+                revert.put('latest', str(i))
+            history.append(db_state.head)
+        head = db_state.head
+        targets = [rng.randrange(commits) for _ in range(reads)]
+        start = time.perf_counter()
+        for i in targets:
+            revert.checkout(history[i])
+            assert revert.get('latest') == str(i)
+            revert.checkout(head)
+        checkout = time.perf_counter() - start
+        start = time.perf_counter()
+        for i in targets:
+            assert revert.get_at(history[i], 'latest') == str(i)
+        cold = time.perf_counter() - start
+        start = time.perf_counter()
+        for i in targets:
+            assert revert.get_at(history[i], 'latest') == str(i)
+        warm = time.perf_counter() - start
+        start = time.perf_counter()
+        for i in range(commits - 1, commits - 1 - reads, -1):
+            assert revert.get_at(history[i - reads], 'latest') == str(i - reads)
+        walk = time.perf_counter() - start
+    print(f'{reads} reads at random commits among {commits}, {n} keys: '
+          f'checkout and back {checkout / reads * 1e3:.2f} ms, get_at {cold / reads * 1e3:.2f} ms, '
+          f'again from the cache {warm / reads * 1e6:.1f} us; '
+          f'walking back one commit at a time {walk / reads * 1e3:.2f} ms per read')
+
+
+if __name__ == '__main__':
+    main()
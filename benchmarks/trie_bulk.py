@@ -0,0 +1,41 @@
+"""
+Building and updating tries one put at a time against the bulk loaders, best of five runs.
+
+    python benchmarks/trie_bulk.py [keys]
+"""
+import sys
+import time
+
+from revert.trie import Trie, split
+
+
+def best(setup, f):
+    times = []
+    for _ in range(5):
+        trie = setup()
+        start = time.perf_counter()
+        f(trie)
+        times.append(time.perf_counter() - start)
+    return min(times) * 1e3
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    items = sorted((split(f'ogm/objects/{i // 10}/field{i % 10}'), str(i)) for i in range(n))
+
+    def puts(trie):
+        for key, value in items:
+            trie.put(key, value)
+
+    def existing():
+        return Trie.from_sorted_items(items)
+
+    print(f'{n} sorted keys')
+    print(f'build:     put {best(Trie, puts):.0f} ms, '
+          f'from_sorted_items {best(lambda: None, lambda _: Trie.from_sorted_items(items)):.0f} ms')
+    print(f'overwrite: put {best(existing, puts):.0f} ms, '
+          f'update_many {best(existing, lambda trie: trie.update_many(items)):.0f} ms')
+
+
+if __name__ == '__main__':
+    main()
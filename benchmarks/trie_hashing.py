@@ -0,0 +1,31 @@
+"""
+Cost of re-hashing the state after a single-key commit under a wide prefix.
+
+    python benchmarks/trie_hashing.py [fan-out]
+"""
+import sys
+import time
+import uuid
+
+from revert.trie import Trie, split
+
+
+def main():
+    fan_out = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    trie = Trie()
+    for i in range(fan_out):
+        trie.put(split(f'ogm/classes/X/objects/{uuid.UUID(int=i)}'), '')
+    start = time.perf_counter()
+    trie.update_hash()
+    full = time.perf_counter() - start
+    rounds = 1000
+    start = time.perf_counter()
+    for i in range(rounds):
+        trie.put(split(f'ogm/classes/X/objects/{uuid.UUID(int=i)}'), str(i))
+        trie.update_hash()
+    single = (time.perf_counter() - start) / rounds
+    print(f'fan-out {fan_out}: full hash {full * 1e3:.1f} ms, single-key commit {single * 1e6:.1f} us')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,69 @@
+"""
+Prefix scans with the explicit-stack cursor against the recursive generators it replaced.
+
+    python benchmarks/trie_iteration.py [number of keys]
+"""
+import itertools
+import sys
+import timeit
+import uuid
+
+from revert import config
+from revert.trie import Trie, split
+
+
+def recursive_keys(node):
+    if node.value is not None:
+        yield []
+    for word, child in (node.children or {}).items():
+        label = [word, *child.edge]
+        for key in recursive_keys(child):
+            yield label + key
+
+
+def recursive_match_keys(trie, prefix):
+    node, rest = trie._seek(prefix)
+    base = list(prefix) + list(rest)
+    for key in recursive_keys(node):
+        yield config.key_separator.join(base + key)
+
+
+def ogm_trie(n):
+    trie = Trie()
+    for i in range(n // 2):
+        uid = uuid.UUID(int=i)
+        trie.put(split(f'ogm/objects/{uid}/attrs/name/first'), '')
+        trie.put(split(f'ogm/objects/{uid}/attrs/name/last'), '')
+    return trie
+
+
+def branching_trie(depth, fan_out):
+    trie = Trie()
+    for key in itertools.product(*[[f'w{i}' for i in range(fan_out)]] * depth):
+        trie.put(list(key), '')
+    return trie
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 400_000
+    shapes = {
+        'ogm objects': (ogm_trie(n), split('ogm/objects')),
+        'depth 8, fan-out 4': (branching_trie(8, 4), []),
+        'depth 12, fan-out 3': (branching_trie(12, 3), []),
+    }
+    for shape, (trie, prefix) in shapes.items():
+        count = trie.size(prefix)
+        print(f'{shape} ({count} keys)')
+        cases = {
+            'recursive keys': lambda: sum(1 for _ in recursive_keys(trie._seek(prefix)[0])),
+            'cursor keys': lambda: sum(1 for _ in trie.keys(prefix)),
+            'recursive match_keys': lambda: sum(1 for _ in recursive_match_keys(trie, prefix)),
+            'cursor joined_keys': lambda: sum(1 for _ in trie.joined_keys(prefix)),
+        }
+        for name, case in cases.items():
+            seconds = min(timeit.repeat(case, number=1, repeat=3))
+            print(f'  {name:>20}: {seconds / count * 1e9:6.0f} ns/key')
+
+
+if __name__ == '__main__':
+    main()
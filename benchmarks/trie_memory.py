@@ -0,0 +1,46 @@
+"""
+Bytes per key of the state trie on an OGM-shaped key set.
+
+    python benchmarks/trie_memory.py [number of keys]
+"""
+import sys
+import tracemalloc
+import uuid
+
+from revert.trie import Trie, split
+
+
+def ogm_keys(n):
+    nodes = [str(uuid.UUID(int=i)) for i in range(max(2, n // 8))]
+    i = 0
+    for j in range(n):
+        parent = nodes[j % len(nodes)]
+        child = nodes[(j * 7 + 1) % len(nodes)]
+        for key in (f'ogm/objects/{parent}/class_reference',
+                    f'ogm/objects/{parent}/attrs/name',
+                    f'ogm/classes/Person/objects/get_node(\'{parent}\')',
+                    f'ogm/child_edges/{parent}/{child}/Edge/Knows',
+                    f'ogm/parent_edges/{child}/{parent}/Edge/Knows',
+                    f'ogm/child_relations/{parent}/Edge/{child}',
+                    f'ogm/parent_relations/{child}/Edge/{parent}',
+                    f'ogm/objects/{parent}/updated_at'):
+            yield key
+            i += 1
+            if i == n:
+                return
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    keys = [split(key) for key in ogm_keys(n)]
+    tracemalloc.start()
+    trie = Trie()
+    for key in keys:
+        trie.put(key, '')
+    used, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f'{len(trie)} keys, {used / 2 ** 20:.1f} MiB, {used / len(trie):.1f} bytes/key')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,33 @@
+"""
+Paging through a large set, seeking with subtree counts against walking and discarding entries.
+
+    python benchmarks/trie_pagination.py [number of members]
+"""
+import sys
+import time
+import uuid
+from itertools import islice
+
+from revert.trie import Trie, split
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    trie = Trie()
+    for i in range(n):
+        trie.put(split(f'ogm/classes/Person/objects/get_node(\'{uuid.UUID(int=i)}\')'), '')
+    prefix = split('ogm/classes/Person/objects')
+    page = 50
+    for offset in (0, n // 2, n - page):
+        start = time.perf_counter()
+        walked = list(islice(trie.keys(prefix, ordered=True), offset, offset + page))
+        walk = time.perf_counter() - start
+        start = time.perf_counter()
+        seeked = list(islice(trie.keys(prefix, ordered=True, offset=offset), page))
+        seek = time.perf_counter() - start
+        assert walked == seeked
+        print(f'page at {offset:>8}: walk {walk * 1e3:8.1f} ms, seek {seek * 1e3:6.2f} ms')
+
+
+if __name__ == '__main__':
+    main()
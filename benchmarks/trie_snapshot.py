@@ -0,0 +1,38 @@
+"""
+Cost of taking a snapshot of the state and of the first writes after it, against a full clone.
+
+    python benchmarks/trie_snapshot.py [keys]
+"""
+import sys
+import time
+
+from revert.trie import Trie, split
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    trie = Trie()
+    for i in range(n):
+        trie.put(split(f'ogm/classes/X{i % 100}/objects/{i}'), str(i))
+    trie.update_hash()
+    start = time.perf_counter()
+    clone = Trie.from_json(trie.to_json())
+    full = time.perf_counter() - start
+    rounds = 1000
+    start = time.perf_counter()
+    for i in range(rounds):
+        trie.snapshot()
+    snap = (time.perf_counter() - start) / rounds
+    start = time.perf_counter()
+    for i in range(rounds):
+        trie.snapshot()
+        trie.put(split(f'ogm/classes/X{i % 100}/objects/{i}'), 'changed')
+        trie.update_hash()
+    write = (time.perf_counter() - start) / rounds
+    assert len(clone) == len(trie)
+    print(f'{n} keys: json clone {full * 1e3:.1f} ms, snapshot {snap * 1e6:.2f} us, '
+          f'snapshot + commit {write * 1e6:.1f} us')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,39 @@
+"""
+Interactive undo/redo over the last commits, with and without the cache of decoded commits.
+
+    python benchmarks/undo_redo.py [steps]
+"""
+import contextlib
+import io
+import sys
+import tempfile
+import time
+
+import revert
+from revert import config
+
+
+def main():
+    steps = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+    for capacity in (0, config.commit_cache_size):
+        config.commit_cache_size = capacity
+        with contextlib.redirect_stdout(io.StringIO()):
+            revert.connect(tempfile.mkdtemp())
+            for i in range(steps):
+                with revert.transaction(f'commit {i}'):
+                    for j in range(1000):
+                        revert.put(f'objects/{i}/{j}', str(i))
+            start = time.perf_counter()
+            for _ in range(10):
+                for _ in range(steps):
+                    revert.undo()
+                for _ in range(steps):
+                    revert.redo()
+            elapsed = time.perf_counter() - start
+        stats = revert.commit_cache_stats()
+        print(f'cache of {capacity:>8} bytes: {elapsed / (20 * steps) * 1e3:.2f} ms per undo or redo, '
+              f'{stats["hits"]} hits, {stats["misses"]} misses')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,133 @@
+"""
+Content-addressed storage of large values.
+
+Strings of at least `config.blob_threshold` characters are stored once in `blobs/<xx>/<digest>` under the database
+directory, and the state and the commits hold a `Blob` with their digest instead. The digest is the one the trie hashes
+strings by, so a state hashes the same whether its large values are inline or stored as blobs.
+"""
+from __future__ import annotations
+
+import hashlib
+import os
+from typing import TYPE_CHECKING, Optional, Set, Union
+
+from . import config
+from .cache import SizedCache
+from .writer import Writer
+
+if TYPE_CHECKING:
+    from .wal import Wal
+
+digest_size = 32
+
+
+def digest(value: str) -> bytes:
+    return hashlib.blake2b(value.encode('utf-8'), digest_size=digest_size, person=b'revert-value').digest()
+
+
+def path(directory: str, blob_digest: bytes) -> str:
+    """returns where the blob is stored under the database `directory`"""
+    name = blob_digest.hex()
+    return os.path.join(directory, 'blobs', name[:2], name)
+
+
+class Blob:
+    """reference to a stored value by its digest"""
+    __slots__ = ['digest']
+
+    def __init__(self, digest: bytes) -> None:
+        self.digest = digest
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, Blob):
+            return NotImplemented
+        return self.digest == other.digest
+
+    def __hash__(self) -> int:
+        return hash(self.digest)
+
+    def __repr__(self) -> str:
+        return f'Blob({self.digest.hex()})'
+
+
+class BlobStore:
+    __slots__ = ['directory', 'writer', 'wal', 'known', 'cache']
+
+    def __init__(self, directory: str, writer: Optional[Writer] = None, wal: Optional[Wal] = None) -> None:
+        """writes through the background `writer`, or else directly, logging new blobs to `wal` first"""
+        self.directory = os.path.join(directory, 'blobs')
+        self.writer = writer
+        self.wal = wal
+        # digests known to be stored or queued for writing
+        self.known: Set[bytes] = set()
+        self.cache: SizedCache[str] = SizedCache(config.blob_cache_size)
+
+    def _path(self, blob_digest: bytes) -> str:
+        return path(os.path.dirname(self.directory), blob_digest)
+
+    @staticmethod
+    def reference(value: str) -> Union[str, Blob]:
+        """returns what the state holds for `value`"""
+        if len(value) < config.blob_threshold:
+            return value
+        return Blob(digest(value))
+
+    def store(self, value: str) -> Union[str, Blob]:
+        """stores `value` if it is large. returns what the state holds for it"""
+        blob = self.reference(value)
+        if not isinstance(blob, Blob) or blob.digest in self.known:
+            return blob
+        self.known.add(blob.digest)
+        self.cache.put(blob.digest, value, len(value))
+        blob_path = self._path(blob.digest)
+        if not os.path.exists(blob_path):
+            data = value.encode('utf-8')
+            if self.wal is not None:
+                self.wal.blob(value)
+
+            def write() -> None:
+                os.makedirs(os.path.dirname(blob_path), exist_ok=True)
+                with open(f'{blob_path}.tmp', 'wb') as f:
+                    f.write(data)
+                    if self.writer is not None and self.writer.durability != 'none':
+                        f.flush()
+                        os.fsync(f.fileno())
+                os.replace(f'{blob_path}.tmp', blob_path)
+
+            if self.writer is None:
+                write()
+            else:
+                self.writer.call(write)
+        return blob
+
+    def load(self, blob: Blob) -> str:
+        value = self.cache.get(blob.digest)
+        if value is None:
+            if self.writer is not None:
+                self.writer.flush()
+            with open(self._path(blob.digest), 'rb') as f:
+                value = f.read().decode('utf-8')
+            self.cache.put(blob.digest, value, len(value))
+        return value
+
+    def resolve(self, value: Optional[Union[str, int, Blob]]) -> Optional[Union[str, int]]:
+        """returns the value for what the state holds"""
+        return self.load(value) if isinstance(value, Blob) else value
+
+
+def remove_unreferenced(directory: str, referenced: Set[bytes]) -> int:
+    """removes the stored blobs of `directory` whose digests are not in `referenced`. returns the number removed"""
+    removed = 0
+    root = os.path.join(directory, 'blobs')
+    if not os.path.exists(root):
+        return 0
+    for prefix in os.listdir(root):
+        for name in os.listdir(os.path.join(root, prefix)):
+            try:
+                blob_digest = bytes.fromhex(name)
+            except ValueError:
+                continue
+            if blob_digest not in referenced:
+                os.remove(os.path.join(root, prefix, name))
+                removed += 1
+    return removed
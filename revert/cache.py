@@ -0,0 +1,50 @@
+from __future__ import annotations
+
+from collections import OrderedDict
+from typing import Dict, Generic, Hashable, Optional, Tuple, TypeVar
+
+T = TypeVar('T')
+
+
+class SizedCache(Generic[T]):
+    """least recently used cache that evicts once the sizes of its entries add up to more than `capacity`"""
+    __slots__ = ['capacity', 'entries', 'size', 'hits', 'misses']
+
+    def __init__(self, capacity: int) -> None:
+        self.capacity = capacity
+        self.entries: OrderedDict[Hashable, Tuple[T, int]] = OrderedDict()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable) -> Optional[T]:
+        entry = self.entries.get(key, None)
+        if entry is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.entries.move_to_end(key)
+        return entry[0]
+
+    def put(self, key: Hashable, value: T, size: int) -> None:
+        self.discard(key)
+        if size > self.capacity:
+            return
+        self.entries[key] = value, size
+        self.size += size
+        while self.size > self.capacity:
+            _, (_, evicted) = self.entries.popitem(last=False)
+            self.size -= evicted
+
+    def discard(self, key: Hashable) -> None:
+        entry = self.entries.pop(key, None)
+        if entry is not None:
+            self.size -= entry[1]
+
+    def clear(self) -> None:
+        self.entries.clear()
+        self.size = 0
+
+    def stats(self) -> Dict[str, int]:
+        return {'hits': self.hits, 'misses': self.misses, 'entries': len(self.entries), 'size': self.size,
+                'capacity': self.capacity}
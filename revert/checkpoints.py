@@ -0,0 +1,51 @@
+"""
+Full-state checkpoints.
+
+A checkpoint is the whole state at a commit, stored as `<commit id>.checkpoint` in the binary commit format with the
+state as the new values of the commit. The ids and byte sizes of all checkpoints are listed in the checkpoints file,
+which is appended to only after the checkpoint itself was written, so a listed checkpoint is always complete.
+"""
+from __future__ import annotations
+
+import json
+import os
+from typing import Dict
+
+from . import commit_file, config
+from .commit_file import CommitFile
+from .trie import Trie
+
+
+def _path(directory: str, commit_id: str) -> str:
+    return os.path.join(directory, f'{commit_id}.checkpoint')
+
+
+def load_list(directory: str) -> Dict[str, int]:
+    """returns the size in bytes of every checkpoint by commit id"""
+    checkpoints = {}
+    path = os.path.join(directory, config.checkpoint_file)
+    if os.path.exists(path):
+        with open(path, 'r') as f:
+            for line in f:
+                if line.strip():
+                    commit_id, size = json.loads(line)
+                    checkpoints[commit_id] = size
+    return checkpoints
+
+
+def write(directory: str, commit_id: str, state: Trie) -> int:
+    """writes the checkpoint of `state` at `commit_id`. returns its size"""
+    data = commit_file.encode([commit_id], [], Trie(), state)
+    path = _path(directory, commit_id)
+    with open(path + '.tmp', 'wb') as f:
+        f.write(data)
+    os.replace(path + '.tmp', path)
+    with open(os.path.join(directory, config.checkpoint_file), 'a') as f:
+        f.write(json.dumps([commit_id, len(data)]) + '\n')
+    return len(data)
+
+
+def load(directory: str, commit_id: str, state: Trie) -> None:
+    """fills the empty `state` with the checkpoint at `commit_id`"""
+    with open(_path(directory, commit_id), 'rb') as f:
+        state.update_many(CommitFile(f.read()).new_items())
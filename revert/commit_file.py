@@ -0,0 +1,227 @@
+"""
+Binary commit files.
+
+A commit file is the magic `RVC1` followed by varint-prefixed sections:
+
+    parents   count, then each commit id as a length-prefixed utf-8 string
+    messages  count, then each message as a length-prefixed utf-8 string
+    old       the ops of the old values
+    new       the ops of the new values
+
+An op section holds the byte lengths of its two streams followed by the streams themselves. Ops are sorted by key,
+and each is recorded in the first stream as varints: the number of leading segments shared with the previous key, the
+number of segments that follow, their lengths, a value tag and either the length of a string value, the length of the
+hex digest of a blob or, zigzag encoded, an integer value. The text of the segments, string values and blob digests is
+concatenated into the second stream, a single utf-8 string measured in code points, so that decoding a section costs
+one `decode` and redo and undo stream ops straight into the state without building intermediate tries.
+"""
+from __future__ import annotations
+
+import json
+import os
+from typing import Iterator, List, Tuple, Union
+
+from .blobs import Blob
+from .transaction import Transaction
+from .trie import Trie, V
+
+K = List[str]
+
+magic = b'RVC1'
+_tag_str = 0
+_tag_int = 1
+_tag_blob = 2
+
+
+def _write_varint(out: bytearray, n: int) -> None:
+    while n >= 0x80:
+        out.append(n & 0x7f | 0x80)
+        n >>= 7
+    out.append(n)
+
+
+def _read_varint(data: bytes, pos: int) -> Tuple[int, int]:
+    """returns (value, position after the varint)"""
+    b = data[pos]
+    if b < 0x80:
+        return b, pos + 1
+    n = b & 0x7f
+    shift = 7
+    pos += 1
+    while True:
+        b = data[pos]
+        pos += 1
+        n |= (b & 0x7f) << shift
+        if b < 0x80:
+            return n, pos
+        shift += 7
+
+
+def _write_str(out: bytearray, s: str) -> None:
+    encoded = s.encode()
+    _write_varint(out, len(encoded))
+    out += encoded
+
+
+def _read_str(data: bytes, pos: int) -> Tuple[str, int]:
+    n, pos = _read_varint(data, pos)
+    end = pos + n
+    return data[pos:end].decode(), end
+
+
+def _encode_section(out: bytearray, trie: Trie) -> None:
+    ops = bytearray()
+    text: List[str] = []
+    previous: K = []
+    for key, value in trie.items([], ordered=True):
+        shared = 0
+        limit = min(len(key), len(previous))
+        while shared < limit and key[shared] == previous[shared]:
+            shared += 1
+        _write_varint(ops, shared)
+        _write_varint(ops, len(key) - shared)
+        for segment in key[shared:]:
+            _write_varint(ops, len(segment))
+            text.append(segment)
+        if isinstance(value, int):
+            ops.append(_tag_int)
+            _write_varint(ops, value << 1 if value >= 0 else (~value << 1) | 1)
+        elif isinstance(value, Blob):
+            ops.append(_tag_blob)
+            hex_digest = value.digest.hex()
+            _write_varint(ops, len(hex_digest))
+            text.append(hex_digest)
+        else:
+            ops.append(_tag_str)
+            _write_varint(ops, len(value))
+            text.append(value)
+        previous = key
+    encoded = ''.join(text).encode()
+    _write_varint(out, len(ops))
+    _write_varint(out, len(encoded))
+    out += ops
+    out += encoded
+
+
+def encode(parents: List[str], messages: List[str], old_values: Trie, new_values: Trie) -> bytes:
+    out = bytearray(magic)
+    for strings in (parents, messages):
+        _write_varint(out, len(strings))
+        for s in strings:
+            _write_str(out, s)
+    _encode_section(out, old_values)
+    _encode_section(out, new_values)
+    return bytes(out)
+
+
+def _section_span(data: bytes, pos: int) -> Tuple[int, int, int]:
+    """returns the start of the ops of the section at `pos`, the start of its text and the end of the section"""
+    ops_length, pos = _read_varint(data, pos)
+    text_length, pos = _read_varint(data, pos)
+    return pos, pos + ops_length, pos + ops_length + text_length
+
+
+class CommitFile:
+    """a decoded header over the raw bytes of a commit file, with the ops of each section decoded on demand"""
+    __slots__ = ['parents', 'messages', 'data', 'old_span', 'new_span']
+
+    def __init__(self, data: bytes) -> None:
+        if data[:len(magic)] != magic:
+            raise ValueError('not a commit file')
+        pos = len(magic)
+        header = []
+        for _ in range(2):
+            n, pos = _read_varint(data, pos)
+            strings = []
+            for _ in range(n):
+                s, pos = _read_str(data, pos)
+                strings.append(s)
+            header.append(strings)
+        self.parents: List[str] = header[0]
+        self.messages: List[str] = header[1]
+        self.data = data
+        self.old_span = _section_span(data, pos)
+        self.new_span = _section_span(data, self.old_span[2])
+
+    def _ops(self, span: Tuple[int, int, int]) -> Iterator[Tuple[K, V]]:
+        """yields (key, value) in sorted order, the key is updated in place and must be copied to be kept"""
+        data = self.data
+        pos, end, text_end = span
+        text = data[end:text_end].decode()
+        at = 0
+        key: K = []
+        while pos < end:
+            # varints below 0x80 are a single byte, which holds for nearly all counts and lengths
+            n = data[pos]
+            if n < 0x80:
+                pos += 1
+            else:
+                n, pos = _read_varint(data, pos)
+            del key[n:]
+            n = data[pos]
+            if n < 0x80:
+                pos += 1
+            else:
+                n, pos = _read_varint(data, pos)
+            for _ in range(n):
+                length = data[pos]
+                if length < 0x80:
+                    pos += 1
+                else:
+                    length, pos = _read_varint(data, pos)
+                key.append(text[at:at + length])
+                at += length
+            tag = data[pos]
+            length = data[pos + 1]
+            if length < 0x80:
+                pos += 2
+            else:
+                length, pos = _read_varint(data, pos + 1)
+            if tag == _tag_str:
+                yield key, text[at:at + length]
+                at += length
+            elif tag == _tag_int:
+                yield key, ~(length >> 1) if length & 1 else length >> 1
+            elif tag == _tag_blob:
+                yield key, Blob(bytes.fromhex(text[at:at + length]))
+                at += length
+            else:
+                raise ValueError(f'unknown value tag {tag}')
+
+    def old_items(self) -> Iterator[Tuple[K, V]]:
+        return self._ops(self.old_span)
+
+    def new_items(self) -> Iterator[Tuple[K, V]]:
+        return self._ops(self.new_span)
+
+    def redo(self, state: Trie) -> None:
+        for key, _ in self._ops(self.old_span):
+            state.discard(key)
+        state.update_many(self._ops(self.new_span))
+
+    def undo(self, state: Trie) -> None:
+        for key, _ in self._ops(self.new_span):
+            state.discard(key)
+        state.update_many(self._ops(self.old_span))
+
+    def to_transaction(self) -> Transaction:
+        trans = Transaction(self.messages[0])
+        trans.messages = list(self.messages)
+        trans.old_values = Trie.from_sorted_items(self._ops(self.old_span))
+        trans.new_values = Trie.from_sorted_items(self._ops(self.new_span))
+        return trans
+
+
+def write(directory: str, commit_id: str, parents: List[str], trans: Transaction) -> None:
+    with open(os.path.join(directory, f'{commit_id}.commit'), 'wb') as f:
+        f.write(encode(parents, trans.messages, trans.old_values, trans.new_values))
+
+
+def read(directory: str, commit_id: str) -> Union[CommitFile, Transaction]:
+    """returns the commit, which supports `redo` and `undo`, from its binary file or else from its legacy json file"""
+    path = os.path.join(directory, f'{commit_id}.commit')
+    if os.path.exists(path):
+        with open(path, 'rb') as f:
+            return CommitFile(f.read())
+    with open(os.path.join(directory, f'{commit_id}.json'), 'r') as f:
+        return Transaction.from_json(json.loads(f.read()))
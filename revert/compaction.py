@@ -0,0 +1,109 @@
+"""
+Compaction of the commit storage of a directory.
+
+`compact` keeps a set of commits and drops all others: their pack data, loose files, checkpoints and log lines. The
+pack is rewritten first, then the commits log is replaced in one rename and the dag index, which is derived from the
+log, is removed to be rebuilt on the next connect. Blobs that no kept commit or checkpoint refers to are removed last.
+"""
+from __future__ import annotations
+
+import json
+import os
+from typing import Dict, Iterable, Iterator, List, Set, Tuple
+
+from . import config
+from .blobs import Blob, remove_unreferenced
+from .checkpoints import load_list
+from .commit_file import CommitFile
+from .dag import Dag, none
+from .pack import Pack, remove_loose, repack
+
+
+def device_heads(directory: str) -> List[str]:
+    """returns the heads of all devices that use `directory`"""
+    heads = []
+    prefix = f'{config.head_file}_'
+    for name in os.listdir(directory):
+        if name.startswith(prefix) and not name.endswith('.tmp'):
+            with open(os.path.join(directory, name), 'r') as f:
+                heads.append(f.read().strip())
+    return heads
+
+
+def ancestors(dag: Dag, roots: Iterable[str]) -> Set[int]:
+    """returns the records of `roots` and of all their ancestors"""
+    seen: Set[int] = set()
+    stack = [dag.index(root) for root in roots]
+    while stack:
+        i = stack.pop()
+        if i == none or i in seen:
+            continue
+        seen.add(i)
+        stack.extend(dag.parent_indexes(i))
+    return seen
+
+
+def directory_size(directory: str) -> int:
+    return sum(entry.stat().st_size for entry in os.scandir(directory) if entry.is_file())
+
+
+def blob_digests(data: bytes) -> Iterator[bytes]:
+    """yields the digests of the blobs the commit in the binary commit format refers to"""
+    commit = CommitFile(data)
+    for items in (commit.old_items(), commit.new_items()):
+        for _, value in items:
+            if isinstance(value, Blob):
+                yield value.digest
+
+
+def compact(directory: str, pack: Pack, dag: Dag, keep: Set[str], replaced: Dict[str, bytes]) -> None:
+    """
+    rewrites the storage to hold only the commits of `keep`, replacing the data of those in `replaced` together with
+    their parents and messages in the log. `pack` and `dag` describe the old storage, and are closed before its files
+    are replaced or removed, which open or mapped files cannot be on every platform.
+    """
+    entries = []
+    dropped = []
+    for commit_id, parents, messages in dag.entries():
+        if commit_id not in keep:
+            dropped.append(commit_id)
+            continue
+        if commit_id in replaced:
+            header = CommitFile(replaced[commit_id])
+            parents, messages = header.parents, header.messages
+        entries.append((commit_id, parents, messages))
+    dag.close()
+    referenced: Set[bytes] = set()
+
+    def kept() -> Iterator[Tuple[str, bytes]]:
+        for commit_id, _, _ in entries:
+            data = replaced.get(commit_id, None) or pack.encoded(commit_id)
+            referenced.update(blob_digests(data))
+            yield commit_id, data
+
+    repack(directory, kept(), pack.close)
+    path = os.path.join(directory, config.commit_parents_file)
+    with open(f'{path}.tmp', 'w') as f:
+        for entry in entries:
+            f.write(json.dumps(list(entry)) + '\n')
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(f'{path}.tmp', path)
+    os.remove(os.path.join(directory, config.dag_file))
+    remove_loose(directory, dropped)
+    remove_loose(directory, (commit_id for commit_id, _, _ in entries))
+    checkpoints = load_list(directory)
+    path = os.path.join(directory, config.checkpoint_file)
+    with open(f'{path}.tmp', 'w') as f:
+        for commit_id, size in checkpoints.items():
+            if commit_id in keep:
+                f.write(json.dumps([commit_id, size]) + '\n')
+    os.replace(f'{path}.tmp', path)
+    for commit_id in checkpoints:
+        path = os.path.join(directory, f'{commit_id}.checkpoint')
+        if commit_id not in keep:
+            os.remove(path)
+            continue
+        with open(path, 'rb') as f:
+            referenced.update(blob_digests(f.read()))
+    remove_unreferenced(directory, referenced)
@@ -1,7 +1,31 @@
 import platform
 
 commit_parents_file = '.commits'
+dag_file = '.dag'
 head_file = '.HEAD'
 init_commit = 'init'
 key_separator = '/'
 device_name = platform.node()
+split_cache_size = 1 << 16
+pack_index_file = '.pack_index'
+pack_segment_size = 1 << 26
+# bytes of encoded commits whose decoded form is kept for undo, redo and checkout
+commit_cache_size = 1 << 26
+checkpoint_file = '.checkpoints'
+# a checkpoint is written once this many commits or bytes of commits were made since the last one
+checkpoint_interval = 1000
+checkpoint_bytes = 1 << 24
+# how far a commit is written before its transaction returns: none, batch or every_commit, see revert.writer
+durability = 'none'
+# strings of at least this many characters are stored once as blobs, see revert.blobs
+blob_threshold = 1 << 12
+blob_cache_size = 1 << 26
+# commits read ahead on a pool of threads while checkout applies earlier ones, 0 to read them one at a time
+prefetch_window = 32
+prefetch_threads = 4
+# the write-ahead log, which is emptied once it grew to wal_size bytes and everything it records was written
+wal_file = '.wal'
+wal_size = 1 << 24
+# states read as of other commits by get_at, match_items_at, view and diff that are kept. They share the nodes they do
+# not differ in with each other and the current state
+version_cache_size = 64
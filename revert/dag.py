@@ -0,0 +1,415 @@
+"""
+Binary index of the commit DAG.
+
+The commits file stays the append-only log of commits as json lines of `[id, parents, messages]`. The dag file indexes
+it with one fixed-size record per commit, in the order of the log:
+
+    id (32 bytes), id length (4), first parent (4), second parent (4), generation (4), offset of the log line (8),
+    depth (4), jump (4)
+
+Ids that are lowercase hex are stored as their bytes, any other id as utf-8 with the top bit of its length set.
+Parents are record numbers, `none` standing for init and for a missing second parent. The generation of a commit is
+one more than the highest generation of its parents, init having generation 0. The depth counts the commits on the
+chain of first parents down to init, and its top bit is set once a merge commit is among the ancestors. The jump is a
+skip pointer to a first parent ancestor chosen as in a skew binary random access list, so that any ancestor on the
+chain, and the lowest common ancestor of two chains, is reached in a logarithmic number of steps. An index of the
+previous format without depths is rebuilt from the log.
+
+The dag file is memory-mapped, so connecting reads only the log lines appended since the index was last written.
+Messages are read from the log on demand, the lookup of records by id is built on first use and the children of
+commits the first time they are asked for.
+"""
+from __future__ import annotations
+
+import heapq
+import json
+import mmap
+import os
+import struct
+from typing import BinaryIO, Dict, Iterator, List, Optional, Tuple
+
+from . import config
+from .writer import Writer
+
+_magic = b'RVD2\0\0\0\0'
+_previous_magic = b'RVD1\0\0\0\0'
+_record = struct.Struct('<32sIIIIQII')
+# the width of a record and the positions of its parent fields in 4 byte words
+_words = _record.size // 4
+_parent_words = (9, 10)
+_text = 0x80000000
+_merged = 0x80000000
+none = 0xffffffff
+
+Record = Tuple[bytes, int, int, int, int, int, int, int]
+
+
+def _encode_id(commit_id: str) -> Tuple[bytes, int]:
+    try:
+        raw = bytes.fromhex(commit_id)
+        length = len(raw)
+        if raw.hex() != commit_id:
+            raise ValueError(commit_id)
+    except ValueError:
+        raw = commit_id.encode()
+        length = len(raw) | _text
+    if len(raw) > 32:
+        raise ValueError(f'commit id {commit_id} is longer than 32 bytes')
+    return raw.ljust(32, b'\0'), length
+
+
+def _decode_id(raw: bytes, length: int) -> str:
+    if length & _text:
+        return raw[:length & ~_text].decode()
+    return raw[:length].hex()
+
+
+class Dag:
+    __slots__ = ['directory', 'file', 'map', 'mapped', 'tail', 'positions', 'recent', 'children_of', 'log', 'log_end',
+                 'writer', 'read_only']
+
+    def __init__(self, directory: str, writer: Optional[Writer] = None, read_only: bool = False) -> None:
+        """
+        appends through the background `writer`, or else directly. Unless `read_only`, the files are repaired after a
+        crash and the index catches up with the log. `read_only` leaves them as they are, for a directory that another
+        process may be writing to, and indexes the log lines the index lacks in memory only
+        """
+        self.directory = directory
+        self.read_only = read_only
+        path = os.path.join(directory, config.dag_file)
+        if read_only:
+            self.file: Optional[BinaryIO] = open(path, 'rb') if os.path.exists(path) else None
+            magic = _magic if self.file is None else self.file.read(len(_magic))
+        else:
+            if not os.path.exists(path) or os.path.getsize(path) < len(_magic):
+                with open(path, 'wb') as f:
+                    f.write(_magic)
+            self.file = open(path, 'r+b')
+            magic = self.file.read(len(_magic))
+            if magic == _previous_magic:
+                self.file.seek(0)
+                self.file.write(_magic)
+                self.file.truncate()
+                magic = _magic
+        self.mapped = 0
+        if magic == _magic and self.file is not None:
+            self.mapped = max(os.path.getsize(path) - len(_magic), 0) // _record.size
+        elif magic not in (_magic, _previous_magic):
+            raise ValueError(f'{path} is not a dag file')
+        # records torn by a crash, or whose log line did not reach the log, are dropped. The catch up with the log
+        # writes them again
+        log_path = os.path.join(directory, config.commit_parents_file)
+        log_size = os.path.getsize(log_path) if os.path.exists(log_path) else 0
+        while self.mapped:
+            self.file.seek(len(_magic) + (self.mapped - 1) * _record.size)
+            if _record.unpack(self.file.read(_record.size))[5] < log_size:
+                break
+            self.mapped -= 1
+        if not read_only:
+            self.file.truncate(len(_magic) + self.mapped * _record.size)
+            self.file.seek(0, os.SEEK_END)
+        self.map: Optional[mmap.mmap] = None
+        if self.mapped:
+            self.map = mmap.mmap(self.file.fileno(), len(_magic) + self.mapped * _record.size, access=mmap.ACCESS_READ)
+        # records appended since the file was mapped, and the positions of their ids
+        self.tail: List[Record] = []
+        self.recent: Dict[bytes, int] = {}
+        self.positions: Optional[Dict[bytes, int]] = None
+        self.children_of: Optional[Dict[int, List[int]]] = None
+        self.log: Optional[BinaryIO] = None
+        self.log_end = 0
+        self.writer: Optional[Writer] = None
+        self._catch_up()
+        self.writer = writer
+
+    def _catch_up(self) -> None:
+        """indexes the commits of the log that are not in the dag file yet"""
+        path = os.path.join(self.directory, config.commit_parents_file)
+        if not os.path.exists(path):
+            return
+        with open(path, 'rb' if self.read_only else 'rb+') as f:
+            if len(self):
+                f.seek(self._record(len(self) - 1)[5])
+                f.readline()
+            while True:
+                offset = f.tell()
+                line = f.readline()
+                if not line.endswith(b'\n'):
+                    break
+                if line.strip():
+                    commit_id, parents, _ = json.loads(line)
+                    self._add(commit_id, parents, offset)
+            if not self.read_only:
+                # a line torn by a crash, which the next commit would otherwise be appended to
+                f.truncate(offset)
+        self.log_end = offset
+        if not self.read_only:
+            self.file.flush()
+
+    def _record(self, i: int) -> Record:
+        if i < self.mapped:
+            return _record.unpack_from(self.map, len(_magic) + i * _record.size)
+        return self.tail[i - self.mapped]
+
+    def __len__(self) -> int:
+        return self.mapped + len(self.tail)
+
+    def _positions(self) -> Dict[bytes, int]:
+        if self.positions is None:
+            data = self.map
+            start = len(_magic)
+            end = start + self.mapped * _record.size
+            # the id and its length, which keeps ids apart that only differ in trailing zero bytes
+            self.positions = {data[at:at + 36]: i for i, at in enumerate(range(start, end, _record.size))}
+            self.positions.update(self.recent)
+        return self.positions
+
+    def index(self, commit_id: str) -> int:
+        """returns the record number of the commit, `none` for init. raises KeyError for unknown commits"""
+        if commit_id == config.init_commit:
+            return none
+        raw, length = _encode_id(commit_id)
+        key = raw + length.to_bytes(4, 'little')
+        i = self.recent.get(key, None)
+        if i is not None:
+            return i
+        # the head is nearly always the last commit, which is found without building the lookup of all ids
+        if self.positions is None and self.mapped and self._record(self.mapped - 1)[:2] == (raw, length):
+            return self.mapped - 1
+        return self._positions()[key]
+
+    def __contains__(self, commit_id: str) -> bool:
+        try:
+            self.index(commit_id)
+        except KeyError:
+            return False
+        return True
+
+    def id(self, i: int) -> str:
+        if i == none:
+            return config.init_commit
+        raw, length = self._record(i)[:2]
+        return _decode_id(raw, length)
+
+    def generation(self, i: int) -> int:
+        return 0 if i == none else self._record(i)[4]
+
+    def parent_indexes(self, i: int) -> List[int]:
+        if i == none:
+            return []
+        first, second = self._record(i)[2:4]
+        if first == none and second == none:
+            return [none]
+        return [first] if second == none else [first, second]
+
+    def first_parent(self, i: int) -> int:
+        """returns the parent the changes of the commit are recorded against"""
+        return self._record(i)[2]
+
+    def depth(self, i: int) -> int:
+        """returns the number of commits on the chain of first parents from the commit down to init"""
+        return 0 if i == none else self._record(i)[6] & ~_merged
+
+    def _jump(self, i: int) -> int:
+        return none if i == none else self._record(i)[7]
+
+    def ancestor(self, i: int, depth: int) -> int:
+        """returns the first parent ancestor of the commit at `depth`"""
+        while self.depth(i) > depth:
+            jump = self._jump(i)
+            i = jump if self.depth(jump) >= depth else self.first_parent(i)
+        return i
+
+    def _first_parent_base(self, a: int, b: int) -> int:
+        """returns the lowest commit on the chains of first parents of both commits"""
+        depth = min(self.depth(a), self.depth(b))
+        a = self.ancestor(a, depth)
+        b = self.ancestor(b, depth)
+        # commits at the same depth have jumps to the same depth, so jumps that differ stay below the common ancestor
+        while a != b:
+            jump_a, jump_b = self._jump(a), self._jump(b)
+            if jump_a != jump_b:
+                a, b = jump_a, jump_b
+            else:
+                a, b = self.first_parent(a), self.first_parent(b)
+        return a
+
+    def merge_base(self, a: int, b: int) -> int:
+        """returns a common ancestor of both commits that no other common ancestor descends from, `none` for init"""
+        # without merges among their ancestors the commits lie on a tree of first parents
+        if not any(i != none and self._record(i)[6] & _merged for i in (a, b)):
+            return self._first_parent_base(a, b)
+        # commits are visited in order of decreasing generation, so all descendants of a commit that were reached from
+        # either side are visited before it
+        reached = {a: 1}
+        reached[b] = reached.get(b, 0) | 2
+        queue = [(-self.generation(i), i) for i in reached]
+        heapq.heapify(queue)
+        while queue:
+            _, i = heapq.heappop(queue)
+            sides = reached.pop(i, None)
+            if sides is None:
+                continue
+            if sides == 3:
+                return i
+            for parent in self.parent_indexes(i):
+                if parent not in reached:
+                    heapq.heappush(queue, (-self.generation(parent), parent))
+                reached[parent] = reached.get(parent, 0) | sides
+        return none
+
+    def parents(self, commit_id: str) -> List[str]:
+        return [self.id(parent) for parent in self.parent_indexes(self.index(commit_id))]
+
+    def children(self, commit_id: str) -> List[str]:
+        if self.children_of is None:
+            children_of: Dict[int, List[int]] = {}
+            if self.mapped:
+                with memoryview(self.map) as data, data[len(_magic):] as records, records.cast('I') as words:
+                    for column in _parent_words:
+                        for i, parent in enumerate(words[column::_words].tolist()):
+                            if parent != none or column == _parent_words[0]:
+                                children_of.setdefault(parent, []).append(i)
+            for i in range(self.mapped, len(self)):
+                for parent in self.parent_indexes(i):
+                    children_of.setdefault(parent, []).append(i)
+            for children in children_of.values():
+                children.sort()
+            self.children_of = children_of
+        return [self.id(child) for child in self.children_of.get(self.index(commit_id), [])]
+
+    def messages(self, commit_id: str) -> List[str]:
+        i = self.index(commit_id)
+        if i == none:
+            return []
+        if self.writer is not None:
+            self.writer.flush()
+        with open(os.path.join(self.directory, config.commit_parents_file), 'rb') as f:
+            f.seek(self._record(i)[5])
+            return json.loads(f.readline())[2]
+
+    def entries(self) -> Iterator[Tuple[str, List[str], List[str]]]:
+        """yields the id, parents and messages of every commit in the order they were made"""
+        path = os.path.join(self.directory, config.commit_parents_file)
+        if not os.path.exists(path):
+            return
+        if self.writer is not None:
+            self.writer.flush()
+        with open(path, 'r') as f:
+            for line, _ in zip(f, range(len(self))):
+                if line.strip():
+                    commit_id, parents, messages = json.loads(line)
+                    yield commit_id, parents, messages
+
+    def _add(self, commit_id: str, parents: List[str], offset: int) -> None:
+        if len(parents) > 2:
+            raise NotImplementedError('Cannot index commits with more than two parents')
+        indexes = [self.index(parent) for parent in parents] + [none, none]
+        raw, length = _encode_id(commit_id)
+        generation = 1 + max((self.generation(parent) for parent in indexes[:len(parents)]), default=0)
+        first = indexes[0]
+        depth = self.depth(first) + 1
+        if len(parents) > 1 or any(parent != none and self._record(parent)[6] & _merged for parent in indexes[:2]):
+            depth |= _merged
+        jump = self._jump(first)
+        if first == none or jump == none or self.depth(first) - self.depth(jump) != self.depth(jump) - \
+                self.depth(self._jump(jump)):
+            jump = first
+        else:
+            jump = self._jump(jump)
+        record = (raw, length, first, indexes[1], generation, offset, depth, jump)
+        if not self.read_only:
+            self._append(self.file, _record.pack(*record))
+        i = len(self)
+        self.tail.append(record)
+        key = raw + length.to_bytes(4, 'little')
+        self.recent[key] = i
+        if self.positions is not None:
+            self.positions[key] = i
+        if self.children_of is not None:
+            for parent in self.parent_indexes(i):
+                self.children_of.setdefault(parent, []).append(i)
+
+    def _append(self, f: BinaryIO, data: bytes) -> None:
+        if self.writer is None:
+            f.write(data)
+        else:
+            self.writer.append(f, data)
+
+    def append(self, commit_id: str, parents: List[str], messages: List[str]) -> None:
+        """logs the commit and indexes it"""
+        if self.read_only:
+            raise ValueError(f'the dag of {self.directory} was opened read-only')
+        if self.log is None:
+            self.log = open(os.path.join(self.directory, config.commit_parents_file), 'ab')
+        line = (json.dumps([commit_id, parents, messages]) + '\n').encode()
+        offset = self.log_end
+        self.log_end += len(line)
+        self._append(self.log, line)
+        self._add(commit_id, parents, offset)
+        if self.writer is None:
+            self.log.flush()
+            self.file.flush()
+
+    def close(self) -> None:
+        for f in (self.log, self.file):
+            if f is None:
+                pass
+            elif self.writer is None:
+                f.close()
+            else:
+                self.writer.close_file(f)
+        if self.writer is not None:
+            self.writer.flush()
+        self.log = None
+        if self.map is not None:
+            self.map.close()
+            self.map = None
+
+
+class DagView:
+    """
+    read-only view of the commit dag as of the head `head`, answering from the index in place rather than copying it.
+    It stays valid until the next connect
+    """
+    __slots__ = ['dag', 'head']
+
+    def __init__(self, dag: Dag, head: str) -> None:
+        self.dag = dag
+        self.head = head
+
+    def __len__(self) -> int:
+        return len(self.dag)
+
+    def __contains__(self, commit_id: str) -> bool:
+        return commit_id in self.dag
+
+    def __iter__(self) -> Iterator[str]:
+        """yields the ids of all commits in the order they were made"""
+        dag = self.dag
+        return (dag.id(i) for i in range(len(dag)))
+
+    def parents(self, commit_id: str) -> List[str]:
+        return self.dag.parents(commit_id)
+
+    def children(self, commit_id: str) -> List[str]:
+        return self.dag.children(commit_id)
+
+    def messages(self, commit_id: str) -> List[str]:
+        return self.dag.messages(commit_id)
+
+    def generation(self, commit_id: str) -> int:
+        return self.dag.generation(self.dag.index(commit_id))
+
+    def ancestor(self, commit_id: str, n: int) -> str:
+        """returns the commit `n` first parents back from `commit_id`, init once the chain ends"""
+        i = self.dag.index(commit_id)
+        return self.dag.id(self.dag.ancestor(i, max(self.dag.depth(i) - n, 0)))
+
+    def merge_base(self, a: str, b: str) -> str:
+        return self.dag.id(self.dag.merge_base(self.dag.index(a), self.dag.index(b)))
+
+    def is_ancestor(self, ancestor: str, commit_id: str) -> bool:
+        """whether `ancestor` is `commit_id` or one of its ancestors"""
+        i = self.dag.index(ancestor)
+        return self.dag.merge_base(i, self.dag.index(commit_id)) == i
@@ -1,19 +1,34 @@
-from collections import defaultdict
-from typing import List, Dict, DefaultDict
+from typing import List, Dict, Optional
 
 from . import config
 from .transaction import Transaction
 from .trie import Trie
+from .blobs import BlobStore
+from .cache import SizedCache
+from .dag import Dag
+from .index import IndexedTrie
+from .pack import Pack
+from .wal import Wal
+from .writer import Writer
 
 __all__ = []
 
 directory: str = ''
+pack: Optional[Pack] = None
+dag: Optional[Dag] = None
+writer: Optional[Writer] = None
+blobs: Optional[BlobStore] = None
+wal: Optional[Wal] = None
 
 head: str = config.init_commit
 
-state = Trie()
+state = IndexedTrie()
 active_transactions: List[Transaction] = []
 
-commit_parents: Dict[str, List[str]] = defaultdict(list)
-commit_children: DefaultDict[str, List[str]] = defaultdict(list)
-commit_messages: Dict[str, List[str]] = {}
+# size in bytes of every checkpoint by commit id, and the commits and bytes of commits made since the last one
+checkpoints: Dict[str, int] = {}
+commits_since_checkpoint: int = 0
+bytes_since_checkpoint: int = 0
+
+# states as of other commits than the head, see revert.revert._version
+versions: SizedCache[Trie] = SizedCache(config.version_cache_size)
@@ -1,4 +1,7 @@
-__all__ = ['DBError', 'NoTransactionActiveError', 'InTransactionError', 'AmbiguousRedoError', 'AmbiguousUndoError']
+from typing import List
+
+__all__ = ['DBError', 'NoTransactionActiveError', 'InTransactionError', 'AmbiguousRedoError', 'AmbiguousUndoError',
+           'NoSuchIndexError', 'SquashError', 'MergeConflictError']
 
 
 class DBError(Exception):
@@ -19,3 +22,17 @@ class AmbiguousRedoError(DBError):
 
 class AmbiguousUndoError(DBError):
     pass
+
+
+class NoSuchIndexError(DBError):
+    pass
+
+
+class SquashError(DBError):
+    pass
+
+
+class MergeConflictError(DBError):
+    def __init__(self, message: str, conflicts: List[str]) -> None:
+        super().__init__(message)
+        self.conflicts = conflicts
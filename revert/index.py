@@ -0,0 +1,132 @@
+from __future__ import annotations
+
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+from .keys import Key
+from .trie import K, Trie, V
+
+wildcard = '*'
+
+
+class Index:
+    """maps each value stored at a key matching `pattern`, where `*` matches any one segment, to those keys"""
+    __slots__ = ['pattern', 'entries']
+
+    def __init__(self, pattern: Key) -> None:
+        self.pattern = pattern
+        self.entries: Dict[V, Set[Tuple[str, ...]]] = {}
+
+    def matches(self, key: K) -> bool:
+        pattern = self.pattern
+        if len(key) != len(pattern):
+            return False
+        for word, expected in zip(key, pattern):
+            if word != expected and expected != wildcard:
+                return False
+        return True
+
+    def prefix(self) -> Key:
+        """the segments before the first wildcard, which every matching key starts with"""
+        if wildcard in self.pattern:
+            return Key(self.pattern[:self.pattern.index(wildcard)])
+        return self.pattern
+
+    def add(self, key: Tuple[str, ...], value: V) -> None:
+        keys = self.entries.get(value, None)
+        if keys is None:
+            keys = self.entries[value] = set()
+        keys.add(key)
+
+    def remove(self, key: Tuple[str, ...], value: V) -> None:
+        keys = self.entries.get(value, None)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self.entries[value]
+
+    def find(self, value: V) -> Iterator[Tuple[str, ...]]:
+        return iter(self.entries.get(value, ()))
+
+
+class IndexedTrie(Trie):
+    """
+    root of the database state that keeps its reverse indexes up to date on every write. Undo, redo, rollback and
+    checkout all write through the state, so the indexes follow them without further bookkeeping.
+    """
+    __slots__ = ['indexes']
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.indexes: Dict[Key, Index] = {}
+
+    def create_index(self, pattern: Key) -> Index:
+        index = self.indexes.get(pattern, None)
+        if index is None:
+            index = Index(pattern)
+            for key, value in self.items(index.prefix()):
+                if index.matches(key):
+                    index.add(tuple(key), value)
+            self.indexes[pattern] = index
+        return index
+
+    def drop_index(self, pattern: Key) -> None:
+        self.indexes.pop(pattern, None)
+
+    def _matching(self, key: K) -> List[Index]:
+        return [index for index in self.indexes.values() if index.matches(key)]
+
+    @staticmethod
+    def _reindex(indexes: List[Index], key: K, old: Optional[V], new: Optional[V]) -> None:
+        key = tuple(key)
+        for index in indexes:
+            if old is not None:
+                index.remove(key, old)
+            if new is not None:
+                index.add(key, new)
+
+    def put(self, key: K, value: V) -> Optional[V]:
+        old = super().put(key, value)
+        if self.indexes:
+            indexes = self._matching(key)
+            if indexes:
+                self._reindex(indexes, key, old, value)
+        return old
+
+    def put_if_not_present(self, key: K, value: V) -> None:
+        indexes = self._matching(key) if self.indexes else None
+        if indexes and key not in self:
+            self._reindex(indexes, key, None, value)
+        super().put_if_not_present(key, value)
+
+    def increment(self, key: K, delta: int) -> Optional[V]:
+        old = super().increment(key, delta)
+        if self.indexes:
+            indexes = self._matching(key)
+            if indexes:
+                self._reindex(indexes, key, old, self[key])
+        return old
+
+    def discard(self, key: K) -> Optional[V]:
+        old = super().discard(key)
+        if old is not None and self.indexes:
+            indexes = self._matching(key)
+            if indexes:
+                self._reindex(indexes, key, old, None)
+        return old
+
+    def update_many(self, items: Iterable[Tuple[K, V]]) -> None:
+        if not self.indexes:
+            super().update_many(items)
+            return
+        items = [(key[:], value) for key, value in items]
+        # the value before the batch and the last value written by it, for every indexed key in the batch
+        changes: Dict[Tuple[str, ...], Tuple[List[Index], Optional[V], V]] = {}
+        for key, value in items:
+            indexes = self._matching(key)
+            if indexes:
+                key = tuple(key)
+                change = changes.get(key, None)
+                changes[key] = indexes, self[key] if change is None else change[1], value
+        super().update_many(items)
+        for key, (indexes, old, new) in changes.items():
+            self._reindex(indexes, key, old, new)
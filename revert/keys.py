@@ -0,0 +1,36 @@
+from __future__ import annotations
+
+from functools import lru_cache
+from typing import Union
+
+from . import config
+
+__all__ = ['Key', 'key']
+
+
+class Key(tuple):
+    """
+    a key that is already split into its segments, which the public functions pass to the trie as is. Keys returned
+    by `key` are interned while they stay in its cache, so building the same key twice yields the same object.
+    """
+    __slots__ = ()
+
+    def __truediv__(self, other: Union[str, Key]) -> Key:
+        return Key(self + as_key(other))
+
+    def __str__(self) -> str:
+        return config.key_separator.join(self)
+
+    def __repr__(self) -> str:
+        return f'key({str(self)!r})'
+
+
+@lru_cache(maxsize=config.split_cache_size)
+def key(path: str) -> Key:
+    return Key(w for w in path.split(config.key_separator) if w)
+
+
+def as_key(path: Union[str, Key]) -> Key:
+    if isinstance(path, Key):
+        return path
+    return key(path)
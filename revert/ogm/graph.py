@@ -51,31 +51,26 @@ class DirectedEdge(Edge, ABC):
 
     def __init__(self, *, parent: Node, child: Node) -> None:
         actual_cls = self.__class__.class_reference()
-        for cls in self.__class__.mro():
-            if issubclass(cls, Edge):
-                revert.count_up_or_set(
-                    f'{config.base}/child_relations/{encode(parent)}/{cls.class_reference()}/{encode(child)}')
-                revert.count_up_or_set(
-                    f'{config.base}/parent_relations/{encode(child)}/{cls.class_reference()}/{encode(parent)}')
-                revert.put(
-                    f'{config.base}/child_edges/{encode(parent)}/{encode(child)}/{cls.class_reference()}/{actual_cls}',
-                    '')
-                revert.put(
-                    f'{config.base}/parent_edges/{encode(child)}/{encode(parent)}/{cls.class_reference()}/{actual_cls}',
-                    '')
+        edge_classes = [cls.class_reference() for cls in self.__class__.mro() if issubclass(cls, Edge)]
+        revert.add_many([(f'{config.base}/{relation}/{encode(a)}/{cls}/{encode(b)}', 1)
+                         for relation, a, b in (('child_relations', parent, child), ('parent_relations', child, parent))
+                         for cls in edge_classes])
+        for cls in edge_classes:
+            revert.put(f'{config.base}/child_edges/{encode(parent)}/{encode(child)}/{cls}/{actual_cls}', '')
+            revert.put(f'{config.base}/parent_edges/{encode(child)}/{encode(parent)}/{cls}/{actual_cls}', '')
 
     def delete(self) -> None:
         actual_cls = self.__class__.class_reference()
-        for cls in self.__class__.mro():
-            if issubclass(cls, Edge):
-                revert.count_down_or_del(
-                    f'{config.base}/child_relations/{encode(self.parent)}/{cls.class_reference()}/{encode(self.child)}')
-                revert.count_down_or_del(
-                    f'{config.base}/parent_relations/{encode(self.child)}/{cls.class_reference()}/{encode(self.parent)}')
-                revert.delete(
-                    f'{config.base}/child_edges/{encode(self.parent)}/{encode(self.child)}/{cls.class_reference()}/{actual_cls}')
-                revert.delete(
-                    f'{config.base}/parent_edges/{encode(self.child)}/{encode(self.parent)}/{cls.class_reference()}/{actual_cls}')
+        parent, child = self.parent, self.child
+        edge_classes = [cls.class_reference() for cls in self.__class__.mro() if issubclass(cls, Edge)]
+        counters = [f'{config.base}/{relation}/{encode(a)}/{cls}/{encode(b)}'
+                    for relation, a, b in (('child_relations', parent, child), ('parent_relations', child, parent))
+                    for cls in edge_classes]
+        # counters of an edge that was deleted before are gone, and counting them down would create them
+        revert.add_many([(counter, -1) for counter in counters if revert.has(counter)])
+        for cls in edge_classes:
+            revert.delete(f'{config.base}/child_edges/{encode(parent)}/{encode(child)}/{cls}/{actual_cls}')
+            revert.delete(f'{config.base}/parent_edges/{encode(child)}/{encode(parent)}/{cls}/{actual_cls}')
 
     def __hash__(self) -> int:
         return hash((self.__class__, self.parent, self.child))
@@ -100,39 +95,27 @@ class UndirectedEdge(Edge, ABC):
 
     def __init__(self, *, node_1: Node, node_2: Node) -> None:
         actual_cls = self.__class__.class_reference()
-        for cls in self.__class__.mro():
-            if issubclass(cls, Edge):
-                revert.count_up_or_set(
-                    f'{config.base}/parent_relations/{encode(node_1)}/{cls.class_reference()}/{encode(node_2)}')
-                revert.count_up_or_set(
-                    f'{config.base}/child_relations/{encode(node_1)}/{cls.class_reference()}/{encode(node_2)}')
-                revert.count_up_or_set(
-                    f'{config.base}/parent_relations/{encode(node_2)}/{cls.class_reference()}/{encode(node_1)}')
-                revert.count_up_or_set(
-                    f'{config.base}/child_relations/{encode(node_2)}/{cls.class_reference()}/{encode(node_1)}')
-                revert.put(
-                    f'{config.base}/bi_edges/{encode(node_1)}/{encode(node_2)}/{cls.class_reference()}/{actual_cls}',
-                    '')
-                revert.put(
-                    f'{config.base}/bi_edges/{encode(node_2)}/{encode(node_1)}/{cls.class_reference()}/{actual_cls}',
-                    '')
+        edge_classes = [cls.class_reference() for cls in self.__class__.mro() if issubclass(cls, Edge)]
+        revert.add_many([(f'{config.base}/{relation}/{encode(a)}/{cls}/{encode(b)}', 1)
+                         for a, b in ((node_1, node_2), (node_2, node_1))
+                         for relation in ('parent_relations', 'child_relations')
+                         for cls in edge_classes])
+        for cls in edge_classes:
+            revert.put(f'{config.base}/bi_edges/{encode(node_1)}/{encode(node_2)}/{cls}/{actual_cls}', '')
+            revert.put(f'{config.base}/bi_edges/{encode(node_2)}/{encode(node_1)}/{cls}/{actual_cls}', '')
 
     def delete(self) -> None:
         actual_cls = self.__class__.class_reference()
-        for cls in self.__class__.mro():
-            if issubclass(cls, Edge):
-                revert.count_down_or_del(
-                    f'{config.base}/parent_relations/{encode(self.node_1)}/{cls.class_reference()}/{encode(self.node_2)}')
-                revert.count_down_or_del(
-                    f'{config.base}/child_relations/{encode(self.node_1)}/{cls.class_reference()}/{encode(self.node_2)}')
-                revert.count_down_or_del(
-                    f'{config.base}/parent_relations/{encode(self.node_2)}/{cls.class_reference()}/{encode(self.node_1)}')
-                revert.count_down_or_del(
-                    f'{config.base}/child_relations/{encode(self.node_2)}/{cls.class_reference()}/{encode(self.node_1)}')
-                revert.delete(
-                    f'{config.base}/bi_edges/{encode(self.node_1)}/{encode(self.node_2)}/{cls.class_reference()}/{actual_cls}')
-                revert.delete(
-                    f'{config.base}/bi_edges/{encode(self.node_2)}/{encode(self.node_1)}/{cls.class_reference()}/{actual_cls}')
+        node_1, node_2 = self.node_1, self.node_2
+        edge_classes = [cls.class_reference() for cls in self.__class__.mro() if issubclass(cls, Edge)]
+        counters = [f'{config.base}/{relation}/{encode(a)}/{cls}/{encode(b)}'
+                    for a, b in ((node_1, node_2), (node_2, node_1))
+                    for relation in ('parent_relations', 'child_relations')
+                    for cls in edge_classes]
+        revert.add_many([(counter, -1) for counter in counters if revert.has(counter)])
+        for cls in edge_classes:
+            revert.delete(f'{config.base}/bi_edges/{encode(node_1)}/{encode(node_2)}/{cls}/{actual_cls}')
+            revert.delete(f'{config.base}/bi_edges/{encode(node_2)}/{encode(node_1)}/{cls}/{actual_cls}')
 
     def __hash__(self) -> int:
         return hash((self.__class__, self.node_1, self.node_2))
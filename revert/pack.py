@@ -0,0 +1,320 @@
+"""
+Append-only pack files for commits.
+
+Commits are appended to numbered segment files `pack-<n>` in the binary commit format, and every append adds a record
+to the index file mapping the commit id to its segment, offset and length:
+
+    id length (1 byte), id (utf-8), segment (4 bytes), offset (8 bytes), length (4 bytes)
+
+The data is written before its index record. Index records that are incomplete or point past the end of their
+segment, as a crash may leave them, are dropped on load. Commits written before packs existed stay readable as loose
+files, and a directory of loose commits is packed with
+
+    python -m revert.pack <directory> [--keep]
+"""
+from __future__ import annotations
+
+import json
+import os
+import struct
+import sys
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from itertools import islice
+from typing import BinaryIO, Callable, Deque, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple, Union
+
+from . import commit_file, config
+from .cache import SizedCache
+from .commit_file import CommitFile
+from .transaction import Transaction
+from .writer import Writer
+
+_location = struct.Struct('<IQI')
+
+
+class Pack:
+    __slots__ = ['directory', 'index', 'segment', 'segment_size', 'readers', 'segment_file', 'index_file', 'writer',
+                 'cache', 'pool', 'read_only']
+
+    def __init__(self, directory: str, writer: Optional[Writer] = None, read_only: bool = False) -> None:
+        """
+        appends through the background `writer`, or else directly. `read_only` leaves an index torn by a crash as it
+        is, for a directory that another process may be writing to, and reads up to its last complete record
+        """
+        self.directory = directory
+        self.read_only = read_only
+        self.writer = writer
+        # commit id -> (segment, offset, length)
+        self.index: Dict[str, Tuple[int, int, int]] = {}
+        self.segment = 0
+        self.segment_size = 0
+        self.readers: Dict[int, BinaryIO] = {}
+        self.segment_file: Optional[BinaryIO] = None
+        self.index_file: Optional[BinaryIO] = None
+        # decoded commits, sized by their encoded length
+        self.cache: SizedCache[Union[CommitFile, Transaction]] = SizedCache(config.commit_cache_size)
+        self.pool: Optional[ThreadPoolExecutor] = None
+        self._load_index()
+
+    def _segment_path(self, segment: int) -> str:
+        return os.path.join(self.directory, f'pack-{segment}')
+
+    def _load_index(self) -> None:
+        path = os.path.join(self.directory, config.pack_index_file)
+        if not os.path.exists(path):
+            return
+        with open(path, 'rb') as f:
+            data = f.read()
+        pos = 0
+        segment_sizes: Dict[int, int] = {}
+        while pos < len(data):
+            n = data[pos]
+            end = pos + 1 + n + _location.size
+            if end > len(data):
+                break
+            location = _location.unpack_from(data, pos + 1 + n)
+            segment, offset, length = location
+            if segment not in segment_sizes:
+                segment_path = self._segment_path(segment)
+                segment_sizes[segment] = os.path.getsize(segment_path) if os.path.exists(segment_path) else 0
+            # a record whose data did not reach the segment before a crash
+            if offset + length > segment_sizes[segment]:
+                break
+            self.index[data[pos + 1:pos + 1 + n].decode()] = location
+            self.segment = max(self.segment, segment)
+            pos = end
+        # later records are appended after the last complete one
+        if pos < len(data) and not self.read_only:
+            with open(path, 'rb+') as f:
+                f.truncate(pos)
+        segment_path = self._segment_path(self.segment)
+        if os.path.exists(segment_path):
+            self.segment_size = os.path.getsize(segment_path)
+
+    def __contains__(self, commit_id: str) -> bool:
+        return commit_id in self.index
+
+    def _append(self, f: BinaryIO, data: bytes) -> None:
+        if self.writer is None:
+            f.write(data)
+            f.flush()
+        else:
+            self.writer.append(f, data)
+
+    def _close(self, f: BinaryIO) -> None:
+        if self.writer is None:
+            f.close()
+        else:
+            self.writer.close_file(f)
+
+    def append(self, commit_id: str, data: bytes) -> None:
+        if self.read_only:
+            raise ValueError(f'the pack of {self.directory} was opened read-only')
+        if self.segment_file is None or self.segment_size + len(data) > config.pack_segment_size and self.segment_size:
+            if self.segment_file is not None:
+                self._close(self.segment_file)
+                self.segment += 1
+                self.segment_size = 0
+                # segments left over by a repack that did not finish
+                while os.path.exists(self._segment_path(self.segment)):
+                    self.segment += 1
+            self.segment_file = open(self._segment_path(self.segment), 'ab')
+        if self.index_file is None:
+            self.index_file = open(os.path.join(self.directory, config.pack_index_file), 'ab')
+        offset = self.segment_size
+        self._append(self.segment_file, data)
+        self.segment_size += len(data)
+        location = (self.segment, offset, len(data))
+        encoded = commit_id.encode()
+        self._append(self.index_file, bytes([len(encoded)]) + encoded + _location.pack(*location))
+        self.index[commit_id] = location
+        self.cache.put(commit_id, CommitFile(data), len(data))
+
+    def read_bytes(self, commit_id: str) -> bytes:
+        segment, offset, length = self.index[commit_id]
+        if self.writer is not None:
+            self.writer.flush()
+        reader = self.readers.get(segment, None)
+        if reader is None:
+            reader = self.readers[segment] = open(self._segment_path(segment), 'rb')
+        reader.seek(offset)
+        return reader.read(length)
+
+    def size(self, commit_id: str) -> int:
+        """returns the size in bytes of the commit, as an estimate of the cost of applying it"""
+        location = self.index.get(commit_id, None)
+        if location is not None:
+            return location[2]
+        for extension in ('commit', 'json'):
+            path = os.path.join(self.directory, f'{commit_id}.{extension}')
+            if os.path.exists(path):
+                return os.path.getsize(path)
+        return 0
+
+    def encoded(self, commit_id: str) -> bytes:
+        """returns the commit in the binary commit format, converting it if it is a legacy json file"""
+        if commit_id in self.index:
+            return self.read_bytes(commit_id)
+        path = os.path.join(self.directory, f'{commit_id}.commit')
+        if os.path.exists(path):
+            with open(path, 'rb') as f:
+                return f.read()
+        with open(os.path.join(self.directory, f'{commit_id}.json'), 'r') as f:
+            content = json.loads(f.read())
+        trans = Transaction.from_json(content)
+        return commit_file.encode(content['parents'], trans.messages, trans.old_values, trans.new_values)
+
+    def read(self, commit_id: str) -> Union[CommitFile, Transaction]:
+        """returns the commit from the cache, the pack, or from its loose file if it was never packed"""
+        commit = self.cache.get(commit_id)
+        if commit is None:
+            if commit_id in self.index:
+                commit = CommitFile(self.read_bytes(commit_id))
+            else:
+                commit = commit_file.read(self.directory, commit_id)
+            self.cache.put(commit_id, commit, self.size(commit_id))
+        return commit
+
+    def _fetch(self, commit_id: str, location: Optional[Tuple[int, int, int]]) -> Union[CommitFile, Transaction]:
+        """reads the commit with a file of its own, so that it can run on the prefetch threads"""
+        if location is None:
+            return commit_file.read(self.directory, commit_id)
+        segment, offset, length = location
+        with open(self._segment_path(segment), 'rb') as f:
+            f.seek(offset)
+            return CommitFile(f.read(length))
+
+    def read_many(self, commit_ids: Sequence[str]) -> Iterator[Union[CommitFile, Transaction]]:
+        """
+        yields the commits in order like `read`, reading up to `config.prefetch_window` of those that are not cached
+        ahead on a pool of threads while the caller works on the earlier ones
+        """
+        window = config.prefetch_window
+        if window < 2 or len(commit_ids) < 2:
+            for commit_id in commit_ids:
+                yield self.read(commit_id)
+            return
+        if self.writer is not None:
+            self.writer.flush()
+        if self.pool is None:
+            self.pool = ThreadPoolExecutor(config.prefetch_threads, thread_name_prefix='revert-prefetch')
+        pending: Deque[Tuple[str, Union[CommitFile, Transaction, Future]]] = deque()
+        ahead = iter(commit_ids)
+        while True:
+            for commit_id in islice(ahead, window - len(pending)):
+                commit = self.cache.get(commit_id)
+                if commit is None:
+                    commit = self.pool.submit(self._fetch, commit_id, self.index.get(commit_id, None))
+                pending.append((commit_id, commit))
+            if not pending:
+                return
+            commit_id, commit = pending.popleft()
+            if isinstance(commit, Future):
+                commit = commit.result()
+                self.cache.put(commit_id, commit, self.size(commit_id))
+            yield commit
+
+    def close(self) -> None:
+        if self.pool is not None:
+            self.pool.shutdown()
+            self.pool = None
+        for f in (self.segment_file, self.index_file):
+            if f is not None:
+                self._close(f)
+        if self.writer is not None:
+            self.writer.flush()
+        self.segment_file = None
+        self.index_file = None
+        self.cache.clear()
+        for reader in self.readers.values():
+            reader.close()
+        self.readers.clear()
+
+
+def _loose_commits(directory: str) -> List[str]:
+    """commit ids in the order they were created, as listed by the commit parents file"""
+    commits = []
+    path = os.path.join(directory, config.commit_parents_file)
+    if os.path.exists(path):
+        with open(path, 'r') as f:
+            for line in f:
+                if line.strip():
+                    commits.append(json.loads(line)[0])
+    return commits
+
+
+def migrate(directory: str, keep: bool = False) -> int:
+    """packs all loose commits of `directory`, deleting their files unless `keep`. returns the number packed"""
+    pack = Pack(directory)
+    packed = []
+    for commit_id in _loose_commits(directory):
+        if commit_id in pack:
+            continue
+        pack.append(commit_id, pack.encoded(commit_id))
+        packed.append(commit_id)
+    pack.close()
+    if not keep:
+        remove_loose(directory, packed)
+    return len(packed)
+
+
+def remove_loose(directory: str, commits: Iterable[str]) -> None:
+    for commit_id in commits:
+        for extension in ('commit', 'json'):
+            path = os.path.join(directory, f'{commit_id}.{extension}')
+            if os.path.exists(path):
+                os.remove(path)
+
+
+def _segments(directory: str) -> List[int]:
+    return [int(name[5:]) for name in os.listdir(directory) if name.startswith('pack-') and name[5:].isdigit()]
+
+
+def repack(directory: str, commits: Iterable[Tuple[str, bytes]], release: Optional[Callable[[], None]] = None) -> None:
+    """
+    replaces the pack of `directory` by one holding just `commits`. The new segments are numbered after the existing
+    ones, and the old segments are only removed once the new index replaced the old one. `release` is called once the
+    new pack is written, to close the files of the old one before they are replaced
+    """
+    old = _segments(directory)
+    segment = max(old, default=-1) + 1
+    index = bytearray()
+    size = 0
+    f = open(os.path.join(directory, f'pack-{segment}'), 'wb')
+    for commit_id, data in commits:
+        if size and size + len(data) > config.pack_segment_size:
+            f.flush()
+            os.fsync(f.fileno())
+            f.close()
+            segment += 1
+            size = 0
+            f = open(os.path.join(directory, f'pack-{segment}'), 'wb')
+        encoded = commit_id.encode()
+        index += bytes([len(encoded)]) + encoded + _location.pack(segment, size, len(data))
+        f.write(data)
+        size += len(data)
+    f.flush()
+    os.fsync(f.fileno())
+    f.close()
+    path = os.path.join(directory, config.pack_index_file)
+    with open(f'{path}.tmp', 'wb') as f:
+        f.write(index)
+        f.flush()
+        os.fsync(f.fileno())
+    if release is not None:
+        release()
+    os.replace(f'{path}.tmp', path)
+    for segment in old:
+        os.remove(os.path.join(directory, f'pack-{segment}'))
+
+
+def main(argv: List[str]) -> None:
+    if not argv or argv[0].startswith('-'):
+        print('usage: python -m revert.pack <directory> [--keep]')
+        sys.exit(2)
+    count = migrate(argv[0], keep='--keep' in argv[1:])
+    print(f'packed {count} commits in {argv[0]}')
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,126 @@
+"""
+Replication of commits between database directories.
+
+The target is sent the ids of the source's commits in the order of the source log, and answers with those it lacks.
+Commit ids are the Merkle hashes of their states and blobs are named by the hash of their content, so only the missing
+commits and blobs are copied. For each commit its blobs are copied first, then its pack data and last its log line, so
+a replication that was interrupted leaves only complete commits behind and the next one carries on where it stopped.
+The head files of the source's other devices are copied too, so that the target's gc keeps their commits. A head is
+only moved forward: it is written where the target has none for the device or holds an ancestor of the source's, and
+`replicate` moves the head of this device the same way. The source is only read, and is left as it is even where its
+files end in a record that another process is still writing. A directory is replicated into another with
+
+    python -m revert.replication <source> <target>
+"""
+from __future__ import annotations
+
+import os
+import shutil
+import sys
+from typing import List, Tuple
+
+from . import config
+from .blobs import path as blob_path
+from .commit_file import CommitFile
+from .compaction import blob_digests
+from .dag import Dag
+from .pack import Pack
+
+
+def missing(source: Dag, target: Dag) -> List[str]:
+    """returns the commits of `source` that `target` lacks, parents first"""
+    return [commit_id for commit_id in (source.id(i) for i in range(len(source))) if commit_id not in target]
+
+
+def transfer(source: str, source_pack: Pack, source_dag: Dag, target: str, target_pack: Pack,
+             target_dag: Dag) -> Tuple[int, int]:
+    """copies the commits and blobs of the source that the target lacks. returns the number of each copied"""
+    commits = blobs = 0
+    for commit_id in missing(source_dag, target_dag):
+        data = source_pack.encoded(commit_id)
+        for blob_digest in blob_digests(data):
+            target_path = blob_path(target, blob_digest)
+            if not os.path.exists(target_path):
+                os.makedirs(os.path.dirname(target_path), exist_ok=True)
+                shutil.copyfile(blob_path(source, blob_digest), f'{target_path}.tmp')
+                os.replace(f'{target_path}.tmp', target_path)
+                blobs += 1
+        if commit_id not in target_pack:
+            target_pack.append(commit_id, data)
+        header = CommitFile(data)
+        target_dag.append(commit_id, header.parents, header.messages)
+        commits += 1
+    return commits, blobs
+
+
+def copy_heads(source: str, target: str, target_dag: Dag) -> List[str]:
+    """
+    copies the head files of the other devices using `source` where the head in `target` is missing or an ancestor,
+    so that newer or diverged work in `target` is kept. returns the heads of all devices using it, this one included
+    """
+    heads = []
+    prefix = f'{config.head_file}_'
+    for name in sorted(os.listdir(source)):
+        if not name.startswith(prefix) or name.endswith('.tmp'):
+            continue
+        with open(os.path.join(source, name), 'r') as f:
+            head = f.read().strip()
+        if head not in target_dag:
+            continue
+        heads.append(head)
+        if name != f'{prefix}{config.device_name}':
+            _advance(target, name, head, target_dag)
+    return heads
+
+
+def _advance(directory: str, name: str, head: str, dag: Dag) -> None:
+    """writes `head` to the head file `name` unless that holds a commit that `head` does not descend from"""
+    path = os.path.join(directory, name)
+    if os.path.exists(path):
+        with open(path, 'r') as f:
+            current = dag.index(f.read().strip())
+        if dag.merge_base(current, dag.index(head)) != current:
+            return
+    _write_head(directory, name, head)
+
+
+def _write_head(directory: str, name: str, head: str) -> None:
+    with open(os.path.join(directory, f'{name}.tmp'), 'w') as f:
+        f.write(head)
+    os.replace(os.path.join(directory, f'{name}.tmp'), os.path.join(directory, name))
+
+
+def fast_forward(source: str, target: str, target_dag: Dag) -> None:
+    """moves the head of this device in `target` to its head in `source` if it descends from it"""
+    name = f'{config.head_file}_{config.device_name}'
+    if not os.path.exists(os.path.join(source, name)):
+        return
+    with open(os.path.join(source, name), 'r') as f:
+        _advance(target, name, f.read().strip(), target_dag)
+
+
+def replicate(source: str, target: str) -> Tuple[int, int]:
+    """copies what `target` lacks of `source`, neither being connected. returns the number of commits and blobs"""
+    os.makedirs(target, exist_ok=True)
+    source_pack, source_dag = Pack(source, read_only=True), Dag(source, read_only=True)
+    target_pack, target_dag = Pack(target), Dag(target)
+    try:
+        copied = transfer(source, source_pack, source_dag, target, target_pack, target_dag)
+        copy_heads(source, target, target_dag)
+        fast_forward(source, target, target_dag)
+    finally:
+        for opened in (source_pack, source_dag, target_pack, target_dag):
+            opened.close()
+    return copied
+
+
+def main(argv: List[str]) -> None:
+    if len(argv) != 2:
+        print('usage: python -m revert.replication <source> <target>')
+        sys.exit(2)
+    commits, blobs = replicate(argv[0], argv[1])
+    print(f'copied {commits} commits and {blobs} blobs from {argv[0]} to {argv[1]}')
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -1,22 +1,35 @@
 from __future__ import annotations
 
-import json
+import atexit
 import os
+from collections import defaultdict
 from contextlib import contextmanager
-from copy import deepcopy
-from typing import Dict, List, Optional, Tuple, Iterator
+from itertools import islice
+from operator import itemgetter
+from typing import Callable, Dict, Iterable, List, Mapping, Optional, Tuple, Iterator, Union
 
 from intent import Intent
 
-from . import config, db_state
-from .exceptions import AmbiguousRedoError, InTransactionError, NoTransactionActiveError, AmbiguousUndoError
+from . import checkpoints, commit_file, compaction, config, db_state, replication
+from .exceptions import AmbiguousRedoError, InTransactionError, NoTransactionActiveError, NoSuchIndexError, \
+    SquashError, MergeConflictError
+from .blobs import BlobStore
+from .dag import Dag, DagView, none
+from .index import IndexedTrie
+from .pack import Pack
+from .snapshots import Snapshot, _resolved
 from .transaction import Transaction
-from .trie import Trie, split
+from .keys import Key, as_key, key
+from .trie import K, Trie, V
+from .wal import Wal, recover
+from .writer import Writer
 
-__all__ = ['connect', 'undo', 'redo', 'checkout', 'get_commit_dag',
+__all__ = ['connect', 'undo', 'redo', 'checkout', 'diff', 'merge', 'get_commit_dag', 'commit_dag', 'DagView',
            'safe_get', 'get', 'put', 'delete', 'discard', 'has',
-           'count_up_or_set', 'count_down_or_del', 'match_count', 'match_keys', 'match_items',
-           'transaction',
+           'count_up_or_set', 'count_down_or_del', 'increment', 'add_many',
+           'match_count', 'match_keys', 'match_items', 'match_range', 'nth_key', 'get_at', 'match_items_at', 'view',
+           'transaction', 'flush', 'commit_cache_stats', 'gc', 'squash', 'pull',
+           'snapshot', 'Snapshot', 'key', 'Key', 'create_index', 'drop_index', 'find_by_value',
            'intent_db_connected']
 
 # todo: add more hooks
@@ -24,39 +37,84 @@ intent_db_connected: Intent[str] = Intent()
 
 
 def get_commit_dag() -> Tuple[str, Dict[str, List[str]], Dict[str, List[str]], Dict[str, List[str]]]:
-    return (db_state.head, deepcopy(db_state.commit_parents), deepcopy(db_state.commit_children),
-            deepcopy(db_state.commit_messages))
+    """returns the head and dicts of the parents, children and messages of all commits, read from the whole log"""
+    commit_parents: Dict[str, List[str]] = defaultdict(list)
+    commit_children: Dict[str, List[str]] = defaultdict(list)
+    commit_messages: Dict[str, List[str]] = {}
+    for commit, parents, messages in db_state.dag.entries():
+        commit_parents[commit] = parents
+        commit_messages[commit] = messages
+        for parent in parents:
+            commit_children[parent].append(commit)
+    return db_state.head, commit_parents, commit_children, commit_messages
+
+
+def commit_dag() -> DagView:
+    """returns a read-only view of the commit dag, which reads the index in place instead of copying it"""
+    return DagView(db_state.dag, db_state.head)
+
+
+def _empty_state() -> IndexedTrie:
+    """returns an empty state with the same indexes as the current one"""
+    state = IndexedTrie()
+    for pattern in db_state.state.indexes:
+        state.create_index(pattern)
+    return state
 
 
 def connect(directory: str) -> None:
     print('connecting to db at', directory)
     db_state.directory = directory
+    if db_state.pack is not None:
+        db_state.pack.close()
+    if db_state.dag is not None:
+        db_state.dag.close()
+    if db_state.wal is not None:
+        flush()
+        db_state.wal.close()
+    if db_state.writer is None or db_state.writer.durability != config.durability:
+        if db_state.writer is not None:
+            db_state.writer.close()
+        db_state.writer = Writer(config.durability)
+    db_state.pack = Pack(directory, db_state.writer)
+    db_state.dag = Dag(directory, db_state.writer)
+    db_state.wal = Wal(directory)
+    expected_head = recover(directory, db_state.wal, db_state.pack, db_state.dag)
+    db_state.blobs = BlobStore(directory, db_state.writer, db_state.wal)
+    db_state.checkpoints = checkpoints.load_list(directory)
+    db_state.versions.clear()
+    db_state.commits_since_checkpoint = 0
+    db_state.bytes_since_checkpoint = 0
     head_path = os.path.join(db_state.directory, f'{config.head_file}_{config.device_name}')
-    state = Trie()
-    db_state.state = state
+    db_state.state = _empty_state()
     db_state.head = config.init_commit
-    commits_path = os.path.join(directory, config.commit_parents_file)
-    if os.path.exists(commits_path):
-        with open(commits_path, 'r') as f:
-            for line in f.readlines():
-                commit, parents, messages = json.loads(line)
-                db_state.commit_parents[commit] = parents
-                db_state.commit_messages[commit] = messages
-                for parent in parents:
-                    db_state.commit_children[parent].append(commit)
-        if os.path.exists(head_path):
-            with open(head_path, 'r') as f:
-                expected_head = f.read().strip()
-                checkout(expected_head)
-        else:
-            db_state.head = config.init_commit
+    if expected_head is None and os.path.exists(head_path):
+        with open(head_path, 'r') as f:
+            expected_head = f.read().strip()
+    if len(db_state.dag) and expected_head is not None:
+        checkout(expected_head)
+    if db_state.wal.size:
+        # the head the log ended at replaces that of the head file, and once both are written the log is emptied
+        _update_head()
+        flush()
     intent_db_connected.announce(directory)
 
 
 def _update_head():
     head_path = os.path.join(db_state.directory, f'{config.head_file}_{config.device_name}')
-    with open(head_path, 'w') as f:
-        f.write(db_state.head)
+    db_state.wal.head(db_state.head)
+    db_state.writer.replace(head_path, db_state.head.encode())
+    if db_state.wal.size >= config.wal_size:
+        flush()
+
+
+@atexit.register
+def flush() -> None:
+    """waits until all commits made so far are written, and synced unless the durability is none"""
+    if db_state.writer is not None:
+        db_state.writer.flush()
+    if db_state.wal is not None:
+        db_state.wal.reset()
 
 
 def rollback_current_transaction() -> None:
@@ -72,65 +130,134 @@ def rollback_all_transactions() -> None:
         trans.rollback(db_state.state)
 
 
-def safe_get(key: str) -> Optional[str]:
-    return db_state.state[split(key)]
+def safe_get(key: Union[str, Key]) -> Optional[V]:
+    return db_state.blobs.resolve(db_state.state[as_key(key)])
 
 
-def get(key: str) -> str:
-    value = db_state.state[split(key)]
+def get(key: Union[str, Key]) -> V:
+    value = db_state.state[as_key(key)]
     if value is None:
         raise KeyError(key)
-    return value
+    return db_state.blobs.resolve(value)
+
+
+def put(key: Union[str, Key], value: V) -> None:
+    if not db_state.active_transactions:
+        raise NoTransactionActiveError('Cannot change database values outside a transaction')
+    if isinstance(value, str):
+        value = db_state.blobs.store(value)
+    return db_state.active_transactions[-1].put(db_state.state, as_key(key), value)
+
+
+def count_up_or_set(key: Union[str, Key]) -> int:
+    if not db_state.active_transactions:
+        raise NoTransactionActiveError('Cannot change database values outside a transaction')
+    return db_state.active_transactions[-1].count_up_or_set(db_state.state, as_key(key))
 
 
-def put(key: str, value: str) -> None:
+def count_down_or_del(key: Union[str, Key]) -> int:
     if not db_state.active_transactions:
         raise NoTransactionActiveError('Cannot change database values outside a transaction')
-    return db_state.active_transactions[-1].put(db_state.state, split(key), value)
+    return db_state.active_transactions[-1].count_down_or_del(db_state.state, as_key(key))
 
 
-def count_up_or_set(key: str) -> int:
+def increment(key: Union[str, Key], delta: int = 1) -> int:
+    """adds `delta` to the number at `key`, which is removed once it reaches 0. returns new value"""
     if not db_state.active_transactions:
         raise NoTransactionActiveError('Cannot change database values outside a transaction')
-    return db_state.active_transactions[-1].count_up_or_set(db_state.state, split(key))
+    return db_state.active_transactions[-1].increment(db_state.state, as_key(key), delta)
 
 
-def count_down_or_del(key: str) -> int:
+def add_many(deltas: Union[Mapping[Union[str, Key], int], Iterable[Tuple[Union[str, Key], int]]]) -> None:
+    """increments every key by its delta"""
     if not db_state.active_transactions:
         raise NoTransactionActiveError('Cannot change database values outside a transaction')
-    return db_state.active_transactions[-1].count_down_or_del(db_state.state, split(key))
+    trans = db_state.active_transactions[-1]
+    state = db_state.state
+    if isinstance(deltas, Mapping):
+        deltas = deltas.items()
+    for k, delta in deltas:
+        trans.increment(state, as_key(k), delta)
 
 
-def discard(key: str) -> None:
+def discard(key: Union[str, Key]) -> None:
     if not db_state.active_transactions:
         raise NoTransactionActiveError('Cannot delete database values outside a transaction')
-    return db_state.active_transactions[-1].discard(db_state.state, split(key))
+    return db_state.active_transactions[-1].discard(db_state.state, as_key(key))
 
 
-def delete(key: str) -> None:
+def delete(key: Union[str, Key]) -> None:
     if not db_state.active_transactions:
         raise NoTransactionActiveError('Cannot delete database values outside a transaction')
-    value = db_state.active_transactions[-1].discard(db_state.state, split(key))
+    value = db_state.active_transactions[-1].discard(db_state.state, as_key(key))
     if value is None:
         raise KeyError(key)
 
 
-def has(key: str) -> bool:
-    return split(key) in db_state.state
+def has(key: Union[str, Key]) -> bool:
+    return as_key(key) in db_state.state
+
+
+def match_count(prefix: Union[str, Key]) -> int:
+    return db_state.state.size(as_key(prefix))
+
+
+def match_keys(prefix: Union[str, Key], after: Optional[Union[str, Key]] = None, offset: int = 0,
+               limit: Optional[int] = None) -> Iterator[str]:
+    keys = db_state.state.joined_keys(as_key(prefix), None if after is None else as_key(after), True, offset)
+    return keys if limit is None else islice(keys, limit)
+
+
+def match_items(prefix: Union[str, Key], after: Optional[Union[str, Key]] = None, offset: int = 0,
+                limit: Optional[int] = None) -> Iterator[Tuple[str, V]]:
+    items = db_state.state.joined_items(as_key(prefix), None if after is None else as_key(after), True, offset)
+    return _resolved(items if limit is None else islice(items, limit), db_state.blobs)
+
+
+def match_range(start: Union[str, Key], end: Optional[Union[str, Key]] = None) -> Iterator[Tuple[str, V]]:
+    blobs = db_state.blobs
+    for k, value in db_state.state.range_items(as_key(start), None if end is None else as_key(end)):
+        yield config.key_separator.join(k), blobs.resolve(value)
+
+
+def nth_key(prefix: Union[str, Key], index: int) -> str:
+    return config.key_separator.join(db_state.state.nth(as_key(prefix), index))
+
+
+def create_index(pattern: Union[str, Key]) -> None:
+    """
+    maintains a reverse index from values to the keys matching `pattern` holding them, where a `*` segment matches
+    any one segment. Indexes live in memory and are kept across `connect`.
+    """
+    db_state.state.create_index(as_key(pattern))
+
+
+def drop_index(pattern: Union[str, Key]) -> None:
+    db_state.state.drop_index(as_key(pattern))
 
 
-def match_count(prefix: str) -> int:
-    return db_state.state.size(split(prefix))
+def find_by_value(pattern: Union[str, Key], value: V) -> List[str]:
+    """returns the keys matching the indexed `pattern` that hold `value`, in no particular order"""
+    index = db_state.state.indexes.get(as_key(pattern), None)
+    if index is None:
+        raise NoSuchIndexError(f'no index was created for {pattern}')
+    if isinstance(value, str):
+        value = BlobStore.reference(value)
+    separator = config.key_separator
+    return [separator.join(k) for k in index.find(value)]
 
 
-def match_keys(prefix: str) -> Iterator[str]:
-    for key in db_state.state.keys(split(prefix)):
-        yield config.key_separator.join(key)
+def commit_cache_stats() -> Dict[str, int]:
+    """returns the hits, misses, entries, size and capacity in bytes of the cache of decoded commits"""
+    return db_state.pack.cache.stats()
 
 
-def match_items(prefix: str) -> Iterator[Tuple[str, str]]:
-    for key, value in db_state.state.items(split(prefix)):
-        yield config.key_separator.join(key), value
+def snapshot() -> Snapshot:
+    """
+    O(1) read-only copy of the current state, including the changes of active transactions. Later writes copy the
+    nodes they touch instead of changing the snapshot.
+    """
+    return Snapshot(db_state.head, db_state.state.snapshot(), db_state.blobs)
 
 
 @contextmanager
@@ -141,31 +268,143 @@ def transaction(message: str):
     if db_state.active_transactions:
         trans.merge_into(db_state.active_transactions[-1])
     else:
-        db_state.state.update_hash(trans.new_values)
-        db_state.state.update_hash(trans.old_values)
-        commit_id = db_state.state.hash
+        commit_id = db_state.state.update_hash().hex()
         if commit_id == db_state.head:
             print('Transaction did not change anything! Skipping commit.')
             return
-        if commit_id not in db_state.commit_parents:
-            print('creating commit', commit_id)
-            with open(os.path.join(db_state.directory, f'{commit_id}.json'), 'w') as f:
-                f.write(json.dumps({
-                    'parents': [db_state.head],
-                    'messages': trans.messages,
-                    'old': trans.old_values.to_json(),
-                    'new': trans.new_values.to_json(),
-                }))
-            with open(os.path.join(db_state.directory, config.commit_parents_file), 'a') as f:
-                f.write(json.dumps([commit_id, [db_state.head], trans.messages]) + '\n')
-            db_state.commit_parents[commit_id].append(db_state.head)
-            db_state.commit_children[db_state.head].append(commit_id)
+        _commit(commit_id, [db_state.head], trans)
+
+
+def _commit(commit_id: str, parents: List[str], trans: Transaction) -> None:
+    """records the changes of `trans` to the state as the commit `commit_id` and moves the head to it"""
+    if commit_id not in db_state.dag:
+        print('creating commit', commit_id)
+        data = commit_file.encode(parents, trans.messages, trans.old_values, trans.new_values)
+        db_state.wal.commit(commit_id, data)
+        db_state.pack.append(commit_id, data)
+        db_state.dag.append(commit_id, parents, trans.messages)
+        db_state.commits_since_checkpoint += 1
+        db_state.bytes_since_checkpoint += len(data)
+        if (db_state.commits_since_checkpoint >= config.checkpoint_interval
+                or db_state.bytes_since_checkpoint >= config.checkpoint_bytes):
+            _write_checkpoint(commit_id)
+    else:
+        # transaction wasn't empty, but ended up recreating an existing commit!
+        # todo: create a pseudo-child?
+        pass
+    db_state.head = commit_id
+    _update_head()
+    if config.durability == 'every_commit':
+        db_state.wal.sync()
+
+
+def _write_checkpoint(commit_id: str) -> None:
+    """writes the checkpoint of the current state on the writer thread, from a snapshot of it"""
+    print('writing checkpoint', commit_id)
+    directory = db_state.directory
+    state = db_state.state.snapshot()
+    sizes = db_state.checkpoints
+
+    def write() -> None:
+        sizes[commit_id] = checkpoints.write(directory, commit_id, state)
+
+    db_state.writer.call(write)
+    db_state.commits_since_checkpoint = 0
+    db_state.bytes_since_checkpoint = 0
+
+
+def _net_delta(undone: List[str], redone: List[str]) -> Dict[Tuple[str, ...], Optional[V]]:
+    """
+    returns the value each key ends up with after undoing the commits of `undone` and then redoing those of `redone`,
+    in order, None for keys that end up removed
+    """
+    delta: Dict[Tuple[str, ...], Optional[V]] = {}
+    # the commits are read ahead while earlier ones are merged into the delta
+    read = db_state.pack.read_many(undone + redone)
+    for commits, removed, written in ((undone, 'new_items', 'old_items'), (redone, 'old_items', 'new_items')):
+        for commit in islice(read, len(commits)):
+            for k, _ in getattr(commit, removed)():
+                delta[tuple(k)] = None
+            for k, value in getattr(commit, written)():
+                delta[tuple(k)] = value
+    return delta
+
+
+def _apply(delta: Dict[Tuple[str, ...], Optional[V]], state: Trie) -> None:
+    """writes each key of the net delta once"""
+    for k, value in delta.items():
+        if value is None:
+            state.discard(k)
+    state.update_many(sorted(((k, value) for k, value in delta.items() if value is not None), key=itemgetter(0)))
+
+
+def _move(state: Trie, head: str, commit_id: str, empty: Callable[[], Trie]) -> Tuple[Trie, Optional[Tuple[int, int]]]:
+    """
+    brings `state` from `head` to `commit_id`, changing it in place or loading a checkpoint into `empty()` where that is
+    cheaper. returns the state and, where they are known, the commits and bytes of commits since its last checkpoint
+    """
+    dag = db_state.dag
+    pack = db_state.pack
+    checkpoint_sizes = db_state.checkpoints
+    # walk back from the target and the head, always stepping the one of higher generation, until they meet at their
+    # common ancestor or until loading the closest checkpoint on the history of the target is known to be cheaper.
+    # The cost of applying commits is estimated by their size, and that of loading a checkpoint by its size
+    history: List[str] = []
+    undone: List[str] = []
+    target = dag.index(commit_id)
+    head = dag.index(head)
+    redo_cost = undo_cost = 0
+    checkpoint: Optional[int] = None
+    jump_cost = 0
+    while target != head and (checkpoint is None or redo_cost + undo_cost < jump_cost):
+        if dag.generation(target) >= dag.generation(head):
+            commit = dag.id(target)
+            if checkpoint is None and commit in checkpoint_sizes:
+                checkpoint = len(history)
+                jump_cost = checkpoint_sizes[commit] + redo_cost
+            history.append(commit)
+            redo_cost += pack.size(commit)
+            target = dag.first_parent(target)
         else:
-            # transaction wasn't empty, but ended up recreating an existing commit!
-            # todo: create a pseudo-child?
-            pass
-        db_state.head = commit_id
-        _update_head()
+            commit = dag.id(head)
+            undone.append(commit)
+            undo_cost += pack.size(commit)
+            head = dag.first_parent(head)
+    common = len(history)
+    met = target == head
+    tail_cost = redo_cost
+    if met and checkpoint is None:
+        # a checkpoint beyond the common ancestor is still cheaper when its tail is shorter than the undone branch
+        while target != none and tail_cost < redo_cost + undo_cost:
+            commit = dag.id(target)
+            if commit in checkpoint_sizes:
+                checkpoint = len(history)
+                jump_cost = checkpoint_sizes[commit] + tail_cost
+            history.append(commit)
+            if checkpoint is not None:
+                break
+            tail_cost += pack.size(commit)
+            target = dag.first_parent(target)
+    if checkpoint is not None and (not met or jump_cost < redo_cost + undo_cost):
+        print('loading checkpoint', history[checkpoint])
+        state = empty()
+        checkpoints.load(db_state.directory, history[checkpoint], state)
+        undone = []
+        redone = history[checkpoint - 1::-1] if checkpoint else []
+    else:
+        redone = history[common - 1::-1] if common else []
+    if len(undone) + len(redone) == 1:
+        for commit in undone:
+            pack.read(commit).undo(state)
+        for commit in redone:
+            pack.read(commit).redo(state)
+    else:
+        _apply(_net_delta(undone, redone), state)
+    if checkpoint is not None:
+        return state, (checkpoint, jump_cost - checkpoint_sizes[history[checkpoint]])
+    if target == none:
+        return state, (len(history), tail_cost)
+    return state, None
 
 
 def checkout(commit_id: str) -> None:
@@ -175,71 +414,245 @@ def checkout(commit_id: str) -> None:
         raise InTransactionError('Cannot checkout a commit while a transaction is active')
     print('checking out', commit_id)
     commit_id = commit_id.strip()
-    history = [commit_id]
-    parent = commit_id
-    commit_parents = db_state.commit_parents
-    while parent != config.init_commit:
-        if len(commit_parents[parent]) > 1:
-            raise NotImplementedError('Cannot work with multiple parents at present')
-        parent = commit_parents[parent][0]
-        history.append(parent)
-    history = history[::-1]
-    history_set = set(history)
-    common_ancestor = db_state.head
-    changed_keys = Trie()
-    while common_ancestor not in history_set:
-        with open(os.path.join(db_state.directory, f'{common_ancestor}.json'), 'r') as f:
-            trans = Transaction.from_json(json.loads(f.read()))
-            trans.undo(db_state.state)
-            for key in trans.new_values.keys([]):
-                changed_keys.put(key, '')
-            for key in trans.old_values.keys([]):
-                changed_keys.put(key, '')
-        if len(commit_parents[common_ancestor]) > 1:
-            raise NotImplementedError('Cannot work with multiple parents at present')
-        common_ancestor = commit_parents[common_ancestor][0]
-    for commit_id in history[history.index(common_ancestor):]:
-        if commit_id == config.init_commit:
-            continue
-        with open(os.path.join(db_state.directory, f'{commit_id}.json'), 'r') as f:
-            trans = Transaction.from_json(json.loads(f.read()))
-            trans.redo(db_state.state)
-            for key in trans.new_values.keys([]):
-                changed_keys.put(key, '')
-            for key in trans.old_values.keys([]):
-                changed_keys.put(key, '')
-    db_state.state.update_hash(changed_keys)
-    if commit_id != config.init_commit and db_state.state.hash != commit_id:
-        print(f'expected hash does not match hash of actual data!\nexpected: {commit_id}\nactual: {db_state.state.hash}')
+    db_state.state, since_checkpoint = _move(db_state.state, db_state.head, commit_id, _empty_state)
+    if since_checkpoint is not None:
+        db_state.commits_since_checkpoint, db_state.bytes_since_checkpoint = since_checkpoint
+    actual = db_state.state.update_hash().hex()
+    # commits created before the switch to blake2b carry shorter sha224 ids that cannot be verified
+    if commit_id != config.init_commit and len(commit_id) == len(actual) and actual != commit_id:
+        print(f'expected hash does not match hash of actual data!\nexpected: {commit_id}\nactual: {actual}')
         import sys
         sys.exit(1)
     db_state.head = commit_id
     _update_head()
 
 
+def _distance(a: str, b: str) -> int:
+    """returns the number of commits between `a` and `b` through their common ancestor"""
+    dag = db_state.dag
+    i, j = dag.index(a), dag.index(b)
+    return dag.generation(i) + dag.generation(j) - 2 * dag.generation(dag.merge_base(i, j))
+
+
+def _version(commit_id: str) -> Trie:
+    """
+    returns the committed state as of `commit_id` without changing the current one. It is moved to from a copy of the
+    head or of the version read last, whichever is closer, and kept in `db_state.versions` for later reads
+    """
+    commit_id = commit_id.strip()
+    versions = db_state.versions
+    state = versions.get(commit_id)
+    if state is not None:
+        return state
+    head = db_state.head
+    state = db_state.state.snapshot()
+    for trans in reversed(db_state.active_transactions):
+        trans.undo(state)
+    if versions.entries:
+        last = next(reversed(versions.entries))
+        if _distance(last, commit_id) < _distance(head, commit_id):
+            head, state = last, versions.entries[last][0].snapshot()
+    if commit_id != head:
+        state = _move(state, head, commit_id, Trie)[0]
+    versions.put(commit_id, state, 1)
+    return state
+
+
+def get_at(commit_id: str, key: Union[str, Key]) -> V:
+    """returns the value of `key` as of the commit, without checking it out"""
+    value = _version(commit_id)[as_key(key)]
+    if value is None:
+        raise KeyError(key)
+    return db_state.blobs.resolve(value)
+
+
+def match_items_at(commit_id: str, prefix: Union[str, Key], after: Optional[Union[str, Key]] = None, offset: int = 0,
+                   limit: Optional[int] = None) -> Iterator[Tuple[str, V]]:
+    """like `match_items` as of the commit, without checking it out"""
+    items = _version(commit_id).joined_items(as_key(prefix), None if after is None else as_key(after), True, offset)
+    return _resolved(items if limit is None else islice(items, limit), db_state.blobs)
+
+
+@contextmanager
+def view(commit_id: str) -> Iterator[Snapshot]:
+    """
+    yields a read-only snapshot of the database as of the commit. Neither the head nor the current state change, so
+    transactions may be active and continue while it is read
+    """
+    yield Snapshot(commit_id.strip(), _version(commit_id), db_state.blobs)
+
+
+def diff(commit_a: str, commit_b: str, prefix: Optional[Union[str, Key]] = None) \
+        -> Iterator[Tuple[str, Optional[V], Optional[V]]]:
+    """
+    yields (key, value at `commit_a`, value at `commit_b`) for every key under `prefix` whose values differ between the
+    commits, in sorted order and None where a key is missing, without checking either commit out. Subtrees whose
+    hashes agree are skipped, so the cost grows with the number of differences rather than the size of the state
+    """
+    if db_state.active_transactions:
+        raise InTransactionError('Cannot diff commits while a transaction is active')
+    state_a = _version(commit_a)
+    state_b = _version(commit_b)
+    separator = config.key_separator
+    blobs = db_state.blobs
+    for k, old, new in state_a.diff(state_b, [] if prefix is None else as_key(prefix)):
+        yield separator.join(k), blobs.resolve(old), blobs.resolve(new)
+
+
+def _compact(keep: Iterable[str], until: Optional[str]) -> int:
+    if db_state.active_transactions:
+        raise InTransactionError('Cannot compact the history while a transaction is active')
+    flush()
+    directory = db_state.directory
+    dag = db_state.dag
+    roots = set(keep) | set(compaction.device_heads(directory)) | {db_state.head}
+    roots.discard(config.init_commit)
+    reachable = compaction.ancestors(dag, roots)
+    replaced: Dict[str, bytes] = {}
+    if until is not None:
+        squashed = compaction.ancestors(dag, [until])
+        squashed.discard(dag.index(until))
+        for root in sorted(roots):
+            if dag.index(root) in squashed:
+                raise SquashError(f'{root} is kept or a head but would be squashed into {until}')
+        for i in reachable - squashed:
+            if i != dag.index(until) and any(parent in squashed for parent in dag.parent_indexes(i)):
+                raise SquashError(f'{dag.id(i)} branches off the history before {until}')
+        # the state at until, from the head that descends from it
+        undone = []
+        commit = dag.index(db_state.head)
+        while commit != dag.index(until):
+            if commit == none or commit in squashed:
+                raise SquashError(f'the head {db_state.head} does not descend from {until}')
+            undone.append(dag.id(commit))
+            commit = dag.first_parent(commit)
+        state = db_state.state.snapshot()
+        _apply(_net_delta(undone, []), state)
+        replaced[until] = commit_file.encode([config.init_commit], [f'squashed {len(squashed) + 1} commits'], Trie(),
+                                             state)
+        reachable -= squashed
+    size = compaction.directory_size(directory)
+    print(f'keeping {len(reachable)} of {len(dag)} commits')
+    compaction.compact(directory, db_state.pack, dag, {dag.id(i) for i in reachable}, replaced)
+    db_state.pack = Pack(directory, db_state.writer)
+    db_state.dag = Dag(directory, db_state.writer)
+    db_state.blobs = BlobStore(directory, db_state.writer, db_state.wal)
+    db_state.checkpoints = checkpoints.load_list(directory)
+    # the blobs of dropped commits are gone
+    db_state.versions.clear()
+    return size - compaction.directory_size(directory)
+
+
+def gc(keep: Iterable[str] = ()) -> int:
+    """
+    removes the commits that are neither an ancestor of the head of a device using the database nor of a commit in
+    `keep`, such as the branches abandoned by undoing and then writing. returns the bytes reclaimed
+    """
+    return _compact(keep, None)
+
+
+def squash(until: str, keep: Iterable[str] = ()) -> int:
+    """
+    replaces the history up to `until`, which every head must descend from, by a single commit holding the state at
+    `until`, and removes unreachable commits like `gc`. returns the bytes reclaimed
+    """
+    return _compact(keep, until)
+
+
+def pull(source: str) -> List[str]:
+    """
+    copies the commits and blobs of the database at `source` that this one lacks, see revert.replication. returns the
+    heads of the devices using `source`, which can then be checked out or merged
+    """
+    if db_state.active_transactions:
+        raise InTransactionError('Cannot pull while a transaction is active')
+    flush()
+    source_pack, source_dag = Pack(source, read_only=True), Dag(source, read_only=True)
+    try:
+        commits, blobs = replication.transfer(source, source_pack, source_dag, db_state.directory, db_state.pack,
+                                              db_state.dag)
+        heads = replication.copy_heads(source, db_state.directory, db_state.dag)
+    finally:
+        source_pack.close()
+        source_dag.close()
+    flush()
+    print(f'pulled {commits} commits and {blobs} blobs from {source}')
+    return heads
+
+
 def undo() -> None:
+    """checks out the parent of the head, for a merge commit the one that was merged into"""
     if db_state.active_transactions:
         raise InTransactionError('Cannot undo while a transaction is active')
-    parents = db_state.commit_parents[db_state.head]
+    parents = db_state.dag.parents(db_state.head)
     if len(parents) == 0:
         return
-    if len(parents) > 1:
-        raise AmbiguousUndoError(f'Ambiguous Undo: {db_state.head} has the following parents: {parents}')
     checkout(parents[0])
 
 
 def redo() -> None:
     if db_state.active_transactions:
         raise InTransactionError('Cannot redo while a transaction is active')
-    children = db_state.commit_children[db_state.head]
+    children = db_state.dag.children(db_state.head)
     if len(children) == 0:
         return
     if len(children) > 1:
         raise AmbiguousRedoError(f'Ambiguous Redo: {db_state.head} has the following children: {children}')
     checkout(children[0])
 
-# todo: add merge commit functionality with conflict resolution
-# todo: have multiple ordered parents of each commit.
-#       Last parent will be the highest priority and will be the conflict resolution parent
-# https://www.cs.tufts.edu/~nr/cs257/archive/david-roundy/theory-patches-2009.pdf
-# https://arxiv.org/abs/1311.3903
+
+Resolver = Callable[[str, Optional[V], Optional[V], Optional[V]], Optional[V]]
+
+
+def merge(other: str, resolver: Optional[Resolver] = None, message: Optional[str] = None) -> str:
+    """
+    merges the commit `other` into the head and returns the new head. Keys that only one side changed since their common
+    ancestor take the value of that side, and keys both sides changed differently the value `resolver(key, base, ours,
+    theirs)` returns, None removing the key. Without a resolver such conflicts raise MergeConflictError. The merge
+    commit has the head and `other` as its parents in that order, and records its changes against the head
+    """
+    if db_state.active_transactions:
+        raise InTransactionError('Cannot merge while a transaction is active')
+    dag = db_state.dag
+    base = dag.merge_base(dag.index(db_state.head), dag.index(other))
+    if base == dag.index(other):
+        return db_state.head
+    if base == dag.index(db_state.head):
+        checkout(other)
+        return other
+    print('merging', other)
+    base_id = dag.id(base)
+    ours = db_state.state.snapshot()
+    base_state = _move(ours.snapshot(), db_state.head, base_id, Trie)[0]
+    theirs = _move(base_state.snapshot(), base_id, other, Trie)[0]
+    # only keys where the sides differ need merging, and the diff skips the subtrees they share
+    merged: List[Tuple[K, Optional[V]]] = []
+    conflicts: List[Tuple[K, Optional[V], Optional[V], Optional[V]]] = []
+    for k, our_value, their_value in ours.diff(theirs):
+        base_value = base_state[k]
+        if base_value == our_value:
+            merged.append((k, their_value))
+        elif base_value != their_value:
+            conflicts.append((k, base_value, our_value, their_value))
+    separator = config.key_separator
+    if conflicts and resolver is None:
+        keys = [separator.join(k) for k, _, _, _ in conflicts]
+        raise MergeConflictError(f'{len(keys)} keys were changed differently on both sides: {", ".join(keys[:10])}',
+                                 keys)
+    blobs = db_state.blobs
+    for k, base_value, our_value, their_value in conflicts:
+        value = resolver(separator.join(k), blobs.resolve(base_value), blobs.resolve(our_value),
+                         blobs.resolve(their_value))
+        merged.append((k, blobs.store(value) if isinstance(value, str) else value))
+    trans = Transaction(f'merged {other}' if message is None else message)
+    for k, value in merged:
+        if value is None:
+            trans.discard(db_state.state, k)
+        else:
+            trans.put(db_state.state, k, value)
+    commit_id = db_state.state.update_hash().hex()
+    if commit_id == db_state.head:
+        print('Merge did not change anything! Skipping commit.')
+        return db_state.head
+    _commit(commit_id, [db_state.head, other], trans)
+    return commit_id
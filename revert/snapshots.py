@@ -0,0 +1,66 @@
+from __future__ import annotations
+
+from itertools import islice
+from typing import Iterable, Iterator, Optional, Tuple, Union
+
+from . import config
+from .blobs import BlobStore
+from .keys import Key, as_key
+from .trie import Trie, V
+
+
+def _resolved(items: Iterable[Tuple[str, V]], blobs: Optional[BlobStore]) -> Iterator[Tuple[str, V]]:
+    if blobs is None:
+        return iter(items)
+    return ((key, blobs.resolve(value)) for key, value in items)
+
+
+class Snapshot:
+    """
+    read-only view of the database as of `commit`. It shares its nodes with the live state, which copies them on its
+    next write, so it stays consistent while transactions continue and is released once it is no longer referenced.
+    Large values are read from `blobs`.
+    """
+    __slots__ = ['commit', 'state', 'blobs']
+
+    def __init__(self, commit: str, state: Trie, blobs: Optional[BlobStore] = None) -> None:
+        self.commit = commit
+        self.state = state
+        self.blobs = blobs
+
+    def safe_get(self, key: Union[str, Key]) -> Optional[V]:
+        value = self.state[as_key(key)]
+        return value if self.blobs is None else self.blobs.resolve(value)
+
+    def get(self, key: Union[str, Key]) -> V:
+        value = self.state[as_key(key)]
+        if value is None:
+            raise KeyError(key)
+        return value if self.blobs is None else self.blobs.resolve(value)
+
+    def has(self, key: Union[str, Key]) -> bool:
+        return as_key(key) in self.state
+
+    def match_count(self, prefix: Union[str, Key]) -> int:
+        return self.state.size(as_key(prefix))
+
+    def match_keys(self, prefix: Union[str, Key], after: Optional[Union[str, Key]] = None, offset: int = 0,
+                   limit: Optional[int] = None) -> Iterator[str]:
+        keys = self.state.joined_keys(as_key(prefix), None if after is None else as_key(after), True, offset)
+        return keys if limit is None else islice(keys, limit)
+
+    def match_items(self, prefix: Union[str, Key], after: Optional[Union[str, Key]] = None, offset: int = 0,
+                    limit: Optional[int] = None) -> Iterator[Tuple[str, V]]:
+        items = self.state.joined_items(as_key(prefix), None if after is None else as_key(after), True, offset)
+        return _resolved(items if limit is None else islice(items, limit), self.blobs)
+
+    def match_range(self, start: Union[str, Key], end: Optional[Union[str, Key]] = None) -> Iterator[Tuple[str, V]]:
+        items = ((config.key_separator.join(key), value)
+                 for key, value in self.state.range_items(as_key(start), None if end is None else as_key(end)))
+        return _resolved(items, self.blobs)
+
+    def nth_key(self, prefix: Union[str, Key], index: int) -> str:
+        return config.key_separator.join(self.state.nth(as_key(prefix), index))
+
+    def __repr__(self) -> str:
+        return f'Snapshot({self.commit})'
@@ -1,8 +1,8 @@
 from __future__ import annotations
 
-from typing import List, Optional, Any
+from typing import Any, Iterator, List, Optional, Tuple
 
-from .trie import Trie
+from .trie import Trie, V
 
 K = List[str]
 
@@ -16,53 +16,61 @@ class Transaction:
         self.new_values: Trie = Trie()
         self.messages: List[str] = [message]
 
-    def put(self, state: Trie, key: K, value: str) -> Optional[str]:
+    def _record_old(self, key: K, old: Optional[V]) -> None:
+        """keeps the value of `key` before this transaction. A key written before in this transaction already has it"""
+        if old is not None and key not in self.new_values:
+            self.old_values.put_if_not_present(key, old)
+
+    def put(self, state: Trie, key: K, value: V) -> Optional[V]:
         old = state.put(key, value)
+        self._record_old(key, old)
         self.new_values.put(key, value)
-        if old is not None:
-            self.old_values.put_if_not_present(key, old)
         return old
 
+    def increment(self, state: Trie, key: K, delta: int) -> int:
+        """returns new value, 0 meaning the key was removed"""
+        old = state.increment(key, delta)
+        new = (0 if old is None else int(old)) + delta
+        if not delta:
+            return new
+        self._record_old(key, old)
+        if new:
+            self.new_values.put(key, new)
+        else:
+            self.new_values.discard(key)
+        return new
+
     def count_up_or_set(self, state: Trie, key: K) -> int:
         """returns new value"""
-        old = state.count_up_or_set(key)
-        new = 1 if old is None else old + 1
-        self.new_values.put(key, str(new))
-        if old is not None:
-            self.old_values.put_if_not_present(key, str(old))
-        return new
+        return self.increment(state, key, 1)
 
     def count_down_or_del(self, state: Trie, key: K) -> Optional[int]:
         """returns new value"""
-        old = state.count_down_or_del(key)
-        if old is None:
+        if key not in state:
             return None
-        new = old - 1
-        if new == 0:
-            self.new_values.discard(key)
-        else:
-            self.new_values.put(key, str(new))
-        self.old_values.put_if_not_present(key, str(old))
-        return new
+        return self.increment(state, key, -1)
 
-    def discard(self, state: Trie, key: K) -> Optional[str]:
+    def discard(self, state: Trie, key: K) -> Optional[V]:
         old = state.discard(key)
+        self._record_old(key, old)
         self.new_values.discard(key)
-        if old is not None:
-            self.old_values.put_if_not_present(key, old)
         return old
 
+    def old_items(self) -> Iterator[Tuple[K, V]]:
+        return self.old_values.items([], ordered=True)
+
+    def new_items(self) -> Iterator[Tuple[K, V]]:
+        return self.new_values.items([], ordered=True)
+
     def redo(self, state: Trie) -> None:
         for key in self.old_values.keys([]):
             state.discard(key)
-        for key, value in self.new_values.items([]):
-            state.put(key, value)
+        state.update_many(self.new_values.items([], ordered=True))
 
     def undo(self, state: Trie) -> None:
         for key in self.new_values.keys([]):
             state.discard(key)
-        for key, value in self.old_values.items([]):
-            state.put(key, value)
+        state.update_many(self.old_values.items([], ordered=True))
 
     def rollback(self, state: Trie) -> None:
         self.undo(state)
@@ -71,10 +79,11 @@ class Transaction:
         self.messages = [self.message]
 
     def merge_into(self, parent: Transaction) -> None:
-        for key, value in self.new_values.items([]):
-            parent.new_values.put(key, value)
         for key, value in self.old_values.items([]):
-            parent.old_values.put_if_not_present(key, value)
+            parent._record_old(key, value)
+            if key not in self.new_values:
+                parent.new_values.discard(key)
+        parent.new_values.update_many(self.new_values.items([], ordered=True))
         parent.messages.extend(self.messages)
 
     def __bool__(self) -> bool:
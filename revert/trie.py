@@ -1,160 +1,411 @@
 from __future__ import annotations
 
+import gc
 import hashlib
-import json
-from typing import Any, Dict, Iterator, List, Optional, Tuple, Union
+from bisect import bisect_left, bisect_right, insort
+from contextlib import contextmanager
+from itertools import accumulate
+from operator import itemgetter
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Set, Tuple, Union
 
 from . import config
+from .blobs import Blob, digest
 
 K = List[str]
+V = Union[str, int, Blob]
+
+_no_edge: Tuple[str, ...] = ()
+_digest_size = 32
+_mask = (1 << (8 * _digest_size)) - 1
 
 
 def split(key: str) -> K:
     return [w for w in key.split(config.key_separator) if w]
 
 
+def _value_digest(value: Optional[V]) -> bytes:
+    if value is None:
+        return b''
+    if isinstance(value, int):
+        # numbers hash apart from their decimal strings, so a counter and a string spelling it are different states
+        return hashlib.blake2b(str(value).encode('utf-8'), digest_size=_digest_size, person=b'revert-int').digest()
+    if isinstance(value, Blob):
+        return value.digest
+    return digest(value)
+
+
+def _node_hash(value: Optional[V], acc: int) -> bytes:
+    message = acc.to_bytes(_digest_size, 'big') + _value_digest(value)
+    return hashlib.blake2b(message, digest_size=_digest_size, person=b'revert-node').digest()
+
+
+def _contribution(word: str, child: Trie) -> int:
+    label = config.key_separator.join((word,) + child.edge) if child.edge else word
+    message = child.hash + label.encode('utf-8')
+    return int.from_bytes(hashlib.blake2b(message, digest_size=_digest_size, person=b'revert-edge').digest(), 'big')
+
+
+_min_cached_order = 32
+
+
+@contextmanager
+def _gc_paused() -> Iterator[None]:
+    """
+    trie nodes never form reference cycles, but allocating many of them triggers full collections that rescan the
+    whole tree, so bulk operations pause the collector
+    """
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if enabled:
+            gc.enable()
+
+
+def _count(path: List[Trie], delta: int) -> None:
+    for node in path:
+        node.count += delta
+        if node.order is not None:
+            node.order[1] = None
+
+
 class Trie:
-    __slots__ = ['children', 'value', 'count', 'hash']
+    """
+    Path-compressed trie: a child stored under `word` keeps the rest of its label in `edge`, so chains of nodes without
+    values collapse into one node, and leaves keep `children` as None. Apart from the root, a node without a value
+    always has at least two children.
+
+    Hashes form a Merkle tree. `acc` is the sum of the children's contributions, so a changed child is swapped in
+    without touching its siblings. A node whose `hash` is None is dirty: `dirty` holds the words of its dirty children
+    whose contributions are missing from `acc`, or is None when the node was never hashed and `acc` is rebuilt.
+
+    Wide nodes cache their child words in sorted order in `order`, together with the running totals of the children's
+    counts once those are needed for seeking by position.
+
+    Tries are persistent: nodes are only changed in place while their `owner` is the token held by the root they are
+    written through, and are copied otherwise. `snapshot` hands the whole tree to a new root in O(1) by clearing the
+    tokens of both roots, after which each side copies the nodes on the paths it writes to.
+    """
+    __slots__ = ['children', 'value', 'count', 'hash', 'edge', 'acc', 'dirty', 'order', 'owner']
 
     def __init__(self) -> None:
-        self.children: Dict[str, Trie] = {}
-        self.value: Optional[str] = None
+        self.children: Optional[Dict[str, Trie]] = None
+        self.value: Optional[V] = None
         self.count: int = 0
-        self.hash: Optional[str] = None
+        self.hash: Optional[bytes] = None
+        self.edge: Tuple[str, ...] = _no_edge
+        self.acc: int = 0
+        self.dirty: Optional[Set[str]] = None
+        self.order: Optional[List[Any]] = None
+        self.owner: Optional[object] = None
 
-    def __getitem__(self, key: K) -> Optional[str]:
+    def _seek(self, key: K) -> Optional[Tuple[Trie, Tuple[str, ...]]]:
+        """returns the node at or below `key` and the part of its edge that lies below `key`"""
         node = self
-        for k in key:
-            node = node.children.get(k, None)
-            if node is None:
+        i = 0
+        n = len(key)
+        while i < n:
+            if node.children is None:
                 return None
-        return node.value
+            child = node.children.get(key[i], None)
+            if child is None:
+                return None
+            edge = child.edge
+            i += 1
+            if edge:
+                rest = tuple(key[i:i + len(edge)])
+                if rest != edge[:len(rest)]:
+                    return None
+                if len(rest) < len(edge):
+                    return child, edge[len(rest):]
+                i += len(edge)
+            node = child
+        return node, _no_edge
 
-    def update_hash(self, key_set: Trie) -> None:
-        for word, child in self.children.items():
-            child_key_set = key_set.children.get(word, None)
-            if child_key_set is not None:
-                child.update_hash(child_key_set)
-        message = json.dumps([
-            self.value,
-            {word: child.hash for word, child in self.children.items()}
-        ])
-        self.hash = hashlib.sha224(message.encode('utf-8')).hexdigest()
-
-    def put(self, key: K, value: str) -> Optional[str]:
+    def _locate(self, key: K) -> Optional[Trie]:
+        found = self._seek(key)
+        if found is None or found[1]:
+            return None
+        return found[0]
+
+    def _invalidate(self) -> None:
+        if self.hash is not None:
+            self.hash = None
+            self.dirty = set()
+
+    def _invalidate_child(self, word: str, child: Trie) -> None:
+        """marks `child` dirty, `self` must already be dirty"""
+        if child.hash is not None:
+            if self.dirty is not None:
+                self.acc = (self.acc - _contribution(word, child)) & _mask
+            child.hash = None
+            child.dirty = set()
+        if self.dirty is not None:
+            self.dirty.add(word)
+
+    def _forget(self, word: str, child: Trie) -> None:
+        """drops the contribution of `child` under `word`, `self` must already be dirty"""
+        if self.dirty is not None:
+            if child.hash is not None:
+                self.acc = (self.acc - _contribution(word, child)) & _mask
+            else:
+                self.dirty.discard(word)
+
+    def _attach(self, word: str, child: Trie) -> None:
+        """places `child` under `word`, `self` must already be dirty"""
+        if self.children is None:
+            self.children = {}
+        if self.order is not None and word not in self.children:
+            insort(self.order[0], word)
+            self.order[1] = None
+        self.children[word] = child
+        if self.dirty is not None:
+            if child.hash is not None:
+                self.acc = (self.acc + _contribution(word, child)) & _mask
+                self.dirty.discard(word)
+            else:
+                self.dirty.add(word)
+
+    def _detach(self, word: str) -> None:
+        """removes the child under `word`, `self` must already be dirty"""
+        self._forget(word, self.children.pop(word))
+        if self.order is not None:
+            del self.order[0][bisect_left(self.order[0], word)]
+            self.order[1] = None
+        if not self.children:
+            self.children = None
+
+    def _claim(self) -> object:
+        """returns the token that nodes written through this root must carry, taking over the root's containers"""
+        if self.owner is None:
+            if self.children is not None:
+                self.children = dict(self.children)
+            if self.dirty is not None:
+                self.dirty = set(self.dirty)
+            if self.order is not None:
+                self.order = [list(self.order[0]), self.order[1]]
+            self.owner = object()
+        return self.owner
+
+    def _own(self, word: str, token: object) -> Trie:
+        """returns the child under `word`, copying it first unless it carries `token`, `self` must carry it already"""
+        child = self.children[word]
+        if child.owner is not token:
+            child = child._relabel(child.edge, token)
+            self.children[word] = child
+        return child
+
+    def _split(self, word: str, child: Trie, at: int, token: object) -> Trie:
+        """inserts a node `at` segments down the edge of `child`, `self` must already be dirty"""
+        self._forget(word, child)
+        mid = Trie()
+        mid.edge = child.edge[:at]
+        mid.count = child.count
+        if self.dirty is not None:
+            mid.dirty = set()
+        mid.owner = token
+        mid._attach(child.edge[at], child._relabel(child.edge[at + 1:], token))
+        self._attach(word, mid)
+        return mid
+
+    def _make_path(self, key: K) -> Tuple[Trie, List[Trie]]:
+        """returns the node for `key`, creating it if needed, and all nodes from the root down to it"""
+        token = self._claim()
         node = self
-        for k in key:
-            child = node.children.get(k, None)
+        node._invalidate()
+        path = [self]
+        i = 0
+        n = len(key)
+        while i < n:
+            if node.children is None:
+                node.children = {}
+            word = key[i]
+            child = node.children.get(word, None)
             if child is None:
                 child = Trie()
-                node.children[k] = child
+                child.owner = token
+                if i + 1 < n:
+                    child.edge = tuple(key[i + 1:])
+                node._attach(word, child)
+                path.append(child)
+                return child, path
+            i += 1
+            edge = child.edge
+            if edge:
+                m = 0
+                while m < len(edge) and i + m < n and key[i + m] == edge[m]:
+                    m += 1
+                if m < len(edge):
+                    child = node._split(word, child, m, token)
+                i += m
+            if child.owner is not token:
+                child = node._own(word, token)
+            node._invalidate_child(word, child)
             node = child
+            path.append(child)
+        return node, path
+
+    def _relabel(self, edge: Tuple[str, ...], token: object) -> Trie:
+        """
+        returns a copy of this node under a new edge that carries `token`. The original stays intact for running
+        iterations, and keeps its own containers unless it already carried `token`.
+        """
+        node = Trie.__new__(Trie)
+        node.children = self.children
+        node.value = self.value
+        node.count = self.count
+        node.hash = self.hash
+        node.edge = edge
+        node.acc = self.acc
+        node.dirty = self.dirty
+        node.order = self.order
+        node.owner = token
+        if self.owner is not token:
+            if self.children is not None:
+                node.children = dict(self.children)
+            if self.dirty is not None:
+                node.dirty = set(self.dirty)
+            if self.order is not None:
+                node.order = [list(self.order[0]), self.order[1]]
+        return node
+
+    def _merge_single_child(self, word: str, token: object) -> None:
+        """replaces the dirty child under `word`, which has no value and one child, by that child"""
+        node = self.children[word]
+        (child_word, child), = node.children.items()
+        self._forget(word, node)
+        self._attach(word, child._relabel(node.edge + (child_word,) + child.edge, token))
+
+    def __getitem__(self, key: K) -> Optional[V]:
+        node = self._locate(key)
+        if node is None:
+            return None
+        return node.value
+
+    def update_hash(self) -> bytes:
+        if self.hash is None:
+            self._rehash(self._claim())
+        return self.hash
+
+    def _rehash(self, token: object) -> None:
+        children = self.children
+        if self.dirty is None:
+            acc = 0
+            words = children or ()
+        else:
+            acc = self.acc
+            words = self.dirty
+        for word in words:
+            child = children[word]
+            if child.hash is None:
+                if child.owner is not token:
+                    child = self._own(word, token)
+                child._rehash(token)
+            acc += _contribution(word, child)
+        self.acc = acc & _mask
+        self.dirty = None
+        self.hash = _node_hash(self.value, self.acc)
+
+    def put(self, key: K, value: V) -> Optional[V]:
+        node, path = self._make_path(key)
         old_value = node.value
         node.value = value
         if old_value is None:
-            node.count += 1
-            node = self
-            for k in key:
-                node.count += 1
-                node = node.children[k]
+            _count(path, 1)
         return old_value
 
-    def put_if_not_present(self, key: K, value: str) -> None:
-        node = self
-        for k in key:
-            child = node.children.get(k, None)
-            if child is None:
-                child = Trie()
-                node.children[k] = child
-            node = child
+    def put_if_not_present(self, key: K, value: V) -> None:
+        node, path = self._make_path(key)
         if node.value is None:
             node.value = value
-            node.count += 1
-            node = self
-            for k in key:
-                node.count += 1
-                node = node.children[k]
+            _count(path, 1)
+
+    def increment(self, key: K, delta: int) -> Optional[V]:
+        """
+        adds `delta` to the number at `key`, a missing key counting as 0 and a number reaching 0 being removed. Numbers
+        written as strings are converted. returns old value
+        """
+        if not delta:
+            return self[key]
+        node, path = self._make_path(key)
+        old_value = node.value
+        if old_value is None:
+            node.value = delta
+            _count(path, 1)
+        else:
+            new_value = int(old_value) + delta
+            if new_value:
+                node.value = new_value
+            else:
+                self.discard(key)
+        return old_value
 
     def count_down_or_del(self, key: K) -> Optional[int]:
         """returns old value"""
-        node = self
-        for k in key:
-            node = node.children.get(k, None)
-            if node is None:
-                return None
-        if node.value is None:
+        if key not in self:
             return None
-        old_value = int(node.value)
-        new_value = old_value - 1
-        if new_value == 0:
-            node.value = None
-            node.count -= 1
-            node = self
-            for k in key:
-                node.count -= 1
-                node = node.children[k]
-        else:
-            node.value = str(new_value)
-        return old_value
+        return int(self.increment(key, -1))
 
     def count_up_or_set(self, key: K) -> Optional[int]:
         """returns old value"""
+        old_value = self.increment(key, 1)
+        return None if old_value is None else int(old_value)
+
+    def discard(self, key: K) -> Optional[V]:
         node = self
-        for k in key:
-            child = node.children.get(k, None)
+        trail: List[Tuple[Trie, str]] = []
+        i = 0
+        n = len(key)
+        while i < n:
+            if node.children is None:
+                return None
+            word = key[i]
+            child = node.children.get(word, None)
             if child is None:
-                child = Trie()
-                node.children[k] = child
+                return None
+            i += 1
+            edge = child.edge
+            if edge:
+                if tuple(key[i:i + len(edge)]) != edge:
+                    return None
+                i += len(edge)
+            trail.append((node, word))
             node = child
-        old_value = None
-        if node.value is not None:
-            old_value = int(node.value)
-            node.value = str(old_value + 1)
-        else:
-            node.value = '1'
-            node.count += 1
-            node = self
-            for k in key:
-                node.count += 1
-                node = node.children[k]
-        return old_value
-
-    def discard(self, key: K) -> Optional[str]:
-        node = self
-        for k in key:
-            node = node.children.get(k, None)
-            if node is None:
-                return
         oldvalue = node.value
-        if oldvalue is not None:
-            node.value = None
-            node = self
-            for k in key:
-                node.count -= 1
-                child = node.children[k]
-                if child.count == 1:
-                    del node.children[k]
-                    break
-                node = child
-            else:
-                node.count -= 1
+        if oldvalue is None:
+            return None
+        token = self._claim()
+        self._invalidate()
+        node = self
+        for i, (_, word) in enumerate(trail):
+            trail[i] = node, word
+            child = node._own(word, token)
+            node._invalidate_child(word, child)
+            node = child
+        node.value = None
+        _count([parent for parent, _ in trail] + [node], -1)
+        if not trail:
+            return oldvalue
+        parent, word = trail[-1]
+        if node.count == 0:
+            parent._detach(word)
+            if len(trail) > 1 and parent.value is None and len(parent.children) == 1:
+                grandparent, parent_word = trail[-2]
+                grandparent._merge_single_child(parent_word, token)
+        elif len(node.children) == 1:
+            parent._merge_single_child(word, token)
         return oldvalue
 
     def __contains__(self, key: K) -> bool:
-        node = self
-        for k in key:
-            node = node.children.get(k, None)
-            if node is None:
-                return False
-        return node.value is not None
+        node = self._locate(key)
+        return node is not None and node.value is not None
 
     def size(self, key: K) -> int:
-        node = self
-        for k in key:
-            node = node.children.get(k, None)
-            if node is None:
-                return 0
-        return node.count
+        found = self._seek(key)
+        if found is None:
+            return 0
+        return found[0].count
 
     def __len__(self) -> int:
         return self.count
@@ -162,58 +413,135 @@ class Trie:
     def __bool__(self) -> bool:
         return self.count > 0
 
-    def keys(self, prefix: K) -> Iterator[K]:
-        if prefix:
-            node = self
-            for p in prefix:
-                node = node.children.get(p, None)
-                if node is None:
-                    return
-            for key in node.keys([]):
-                yield prefix + key
-        else:
-            if self.value is not None:
-                yield []
-            for word, child in self.children.items():
-                for key in child.keys([]):
-                    yield [word] + key
-
-    def items(self, prefix: K) -> Iterator[Tuple[K, str]]:
-        if prefix:
-            node = self
-            for p in prefix:
-                node = node.children.get(p, None)
-                if node is None:
-                    return
-            for key, value in node.items([]):
-                yield prefix + key, value
+    def _scan(self, prefix: K, after: Optional[K] = None, ordered: bool = False, offset: int = 0,
+              inclusive: bool = False) -> Iterator[Tuple[K, Trie]]:
+        """
+        yields (key, node) for every node with a value under `prefix`, starting after the key `after` (or at it, if
+        `inclusive`) or at the `offset`-th key. The key is a single buffer that is updated in place, so it must be
+        copied before the next step. Offsets count keys in sorted order and require `ordered`.
+        """
+        found = self._seek(prefix)
+        if found is None:
+            return
+        node, rest = found
+        path = list(prefix)
+        path.extend(rest)
+        stack: List[Tuple[Trie, Iterator[str], int]] = []
+        if offset:
+            if not ordered:
+                raise ValueError('offsets are only supported for ordered scans')
+            if after is not None:
+                raise ValueError('cannot combine an offset with a key to start after')
+            landing, emit = _seek_offset(node, offset, path, stack)
+        elif after is not None:
+            if list(after[:len(prefix)]) != list(prefix):
+                raise ValueError(f'{after} does not start with {prefix}')
+            # the prefix may end partway through an edge, below which `after` sorts before or after every key
+            within, below = list(after[len(prefix):len(path)]), list(rest)
+            if within == below:
+                landing, emit = _seek_after(node, after, inclusive, ordered, path, stack)
+            elif within == below[:len(within)]:
+                landing, emit = node, True
+            elif not ordered:
+                raise KeyError(after)
+            else:
+                landing, emit = (node, True) if within < below else (None, False)
         else:
-            if self.value is not None:
-                yield [], self.value
-            for word, child in self.children.items():
-                for key, value in child.items([]):
-                    yield [word] + key, value
+            landing, emit = node, True
+        if landing is not None:
+            if emit and landing.value is not None:
+                yield path, landing
+            if landing.children:
+                stack.append((landing, _words(landing, ordered), len(path)))
+        while stack:
+            node, words, mark = stack[-1]
+            children = node.children or {}
+            for word in words:
+                child = children.get(word, None)
+                if child is None:
+                    continue
+                del path[mark:]
+                path.append(word)
+                if child.edge:
+                    path.extend(child.edge)
+                if child.value is not None:
+                    yield path, child
+                if child.children:
+                    stack.append((child, _words(child, ordered), len(path)))
+                    break
+            else:
+                stack.pop()
+
+    def keys(self, prefix: K, after: Optional[K] = None, ordered: bool = False, offset: int = 0) -> Iterator[K]:
+        for key, _ in self._scan(prefix, after, ordered, offset):
+            yield key[:]
+
+    def items(self, prefix: K, after: Optional[K] = None, ordered: bool = False,
+              offset: int = 0) -> Iterator[Tuple[K, V]]:
+        for key, node in self._scan(prefix, after, ordered, offset):
+            yield key[:], node.value
+
+    def joined_keys(self, prefix: K, after: Optional[K] = None, ordered: bool = False,
+                    offset: int = 0) -> Iterator[str]:
+        separator = config.key_separator
+        for key, _ in self._scan(prefix, after, ordered, offset):
+            yield separator.join(key)
+
+    def joined_items(self, prefix: K, after: Optional[K] = None, ordered: bool = False,
+                     offset: int = 0) -> Iterator[Tuple[str, V]]:
+        separator = config.key_separator
+        for key, node in self._scan(prefix, after, ordered, offset):
+            yield separator.join(key), node.value
+
+    def range_items(self, start: K, end: Optional[K] = None) -> Iterator[Tuple[K, V]]:
+        """yields the items with start <= key < end in sorted order, comparing keys segment by segment"""
+        if end is not None:
+            end = list(end)
+        for key, node in self._scan([], start, ordered=True, inclusive=True):
+            if end is not None and key >= end:
+                return
+            yield key[:], node.value
+
+    def nth(self, prefix: K, index: int) -> K:
+        """returns the `index`-th key under `prefix` in sorted order"""
+        if index < 0:
+            index += self.size(prefix)
+        if index >= 0:
+            for key, _ in self._scan(prefix, ordered=True, offset=index):
+                return key[:]
+        raise IndexError(index)
 
-    def to_json(self) -> Union[str, Dict[str, Any], Tuple[str, Dict[str, Any]]]:
+    def to_json(self) -> Union[V, Dict[str, Any], Tuple[V, Dict[str, Any]]]:
         if not self.children:
             if self.value is not None:
                 return self.value
             return {}
-        children = {word: value.to_json() for word, value in self.children.items()}
+        children = {}
+        for word, child in self.children.items():
+            value = child.to_json()
+            for k in reversed(child.edge):
+                value = {k: value}
+            children[word] = value
         if self.value is not None:
             return self.value, children
         else:
             return children
 
     @staticmethod
-    def from_json(json: Union[str, Dict[str, Any], Tuple[str, Dict[str, Any]]]) -> Trie:
+    def from_json(json: Union[V, Dict[str, Any], Tuple[V, Dict[str, Any]]]) -> Trie:
+        return Trie._from_json(json, True, object())
+
+    @staticmethod
+    def _from_json(json: Union[V, Dict[str, Any], Tuple[V, Dict[str, Any]]], is_root: bool, token: object) -> Trie:
         trie = Trie()
+        trie.owner = token
         if json == {}:
             return trie
         if isinstance(json, str):
             json = json.strip()
             trie.value = json
-            trie.children = {}
+        elif isinstance(json, int):
+            trie.value = json
         else:
             children: Dict[str, Any] = {}
             if isinstance(json, (list, tuple)):
@@ -222,20 +550,315 @@ class Trie:
                 trie.value = None
                 children = json  # type: ignore
             for key, value in children.items():
-                trie.children[key] = Trie.from_json(value)
+                child = Trie._from_json(value, False, token)
+                if child.count:
+                    if trie.children is None:
+                        trie.children = {}
+                    trie.children[key] = child
         count = 0
         if trie.value is not None:
             count += 1
-        for child in trie.children.values():
+        for child in (trie.children or {}).values():
             count += len(child)
         trie.count = count
+        if not is_root and trie.value is None and trie.children is not None and len(trie.children) == 1:
+            (word, child), = trie.children.items()
+            child.edge = (word,) + child.edge
+            return child
         return trie
 
+    @staticmethod
+    def from_sorted_items(items: Iterable[Tuple[K, V]]) -> Trie:
+        """builds a trie in a single pass from items whose keys are strictly increasing, compared segment by segment"""
+        with _gc_paused():
+            return Trie._build(items, object(), True)
+
+    @staticmethod
+    def _build(items: Iterable[Tuple[K, V]], token: object, strict: bool) -> Trie:
+        """
+        builds the trie bottom-up, keeping the nodes along the last key on a stack and closing them as soon as the
+        next key leaves them. Unless `strict`, a repeated key overwrites the previous value.
+        """
+        root = Trie()
+        root.owner = token
+        stack = [root]
+        path: K = []
+        first = True
+        for key, value in items:
+            n = len(path)
+            common = 0
+            limit = min(n, len(key))
+            while common < limit and key[common] == path[common]:
+                common += 1
+            if not first and (common == len(key) and (strict or common < n) or
+                              common < limit and key[common] < path[common]):
+                raise ValueError(f'keys are not sorted: {key} after {path}')
+            first = False
+            while n > common:
+                n -= 1
+                _close(stack, path.pop())
+            for word in key[common:]:
+                node = Trie()
+                node.owner = token
+                stack.append(node)
+                path.append(word)
+            node = stack[-1]
+            if node.value is None:
+                node.count = 1
+            node.value = value
+        while path:
+            _close(stack, path.pop())
+        return root
+
+    def update_many(self, items: Iterable[Tuple[K, V]]) -> None:
+        """
+        puts all items, later items winning over earlier ones with the same key. Sorted items are applied in one pass
+        that resumes each put from the nodes shared with the previous key, and into an empty trie they are built
+        bottom-up.
+        """
+        with _gc_paused():
+            self._update_many(items)
+
+    def _update_many(self, items: Iterable[Tuple[K, V]]) -> None:
+        token = self._claim()
+        if not self.count:
+            # list and tuple keys do not compare with each other
+            built = Trie._build(sorted(((tuple(key), value) for key, value in items), key=itemgetter(0)), token, False)
+            for slot in ('children', 'value', 'count'):
+                setattr(self, slot, getattr(built, slot))
+            self.hash = None
+            self.dirty = None
+            self.order = None
+            return
+        self._invalidate()
+        # ancestors of the previous key's node, and the number of segments of the key consumed down to each of them
+        stack = [self]
+        depths = [0]
+        previous: K = []
+        for key, value in items:
+            n = len(key)
+            depth = depths[-1]
+            while len(stack) > 1 and (depth >= n or key[:depth] != previous[:depth]):
+                stack.pop()
+                depths.pop()
+                depth = depths[-1]
+            top = stack[-1]
+            node = None
+            if depth + 1 == n and top.children is not None:
+                # the common case of a sibling of the previous key needs no walk
+                word = key[depth]
+                node = top.children.get(word, None)
+                if node is not None and not node.edge and node.owner is token:
+                    top._invalidate_child(word, node)
+                else:
+                    node = None
+            if node is None:
+                node, path = top._make_path(key[depth:])
+                for child in path[1:-1]:
+                    depth += 1 + len(child.edge)
+                    stack.append(child)
+                    depths.append(depth)
+            if node.value is None:
+                if node is not self:
+                    node.count += 1
+                _count(stack, 1)
+            node.value = value
+            previous = key[:]
+
+    def diff(self, other: Trie, prefix: K = ()) -> Iterator[Tuple[K, Optional[V], Optional[V]]]:
+        """
+        yields (key, value here, value in `other`) for every key under `prefix` whose values differ, in sorted order.
+        Subtrees whose hashes agree are skipped
+        """
+        self.update_hash()
+        other.update_hash()
+        positions = []
+        for trie in (self, other):
+            found = trie._seek(list(prefix))
+            positions.append(None if found is None else (found[0], len(found[0].edge) - len(found[1])))
+        a, b = positions
+        if a is not None and b is not None and _same(a[0], a[1], b[0], b[1]):
+            return iter(())
+        return _diff(a, b, list(prefix))
+
+    def snapshot(self) -> Trie:
+        """returns an independent copy of this trie in O(1), sharing all nodes until either side writes to them"""
+        copy = Trie.__new__(Trie)
+        for slot in Trie.__slots__:
+            setattr(copy, slot, getattr(self, slot))
+        copy.owner = None
+        self.owner = None
+        return copy
+
     def clone(self) -> Trie:
-        return Trie.from_json(self.to_json())
+        return self.snapshot()
 
     def flatten(self) -> Dict[str, str]:
         return {config.key_separator.join(key): value for key, value in self.items([])}
 
     def __repr__(self) -> str:
         return str(self.to_json())
+
+
+# a node and how many segments of its edge lie above the position, the node itself being at the end of its edge
+_Position = Optional[Tuple[Trie, int]]
+
+
+def _step(position: _Position) -> Tuple[Optional[V], Dict[str, Trie], int]:
+    """returns the value at the position, the nodes one segment below it and how much of their edges lies above"""
+    if position is None:
+        return None, {}, 0
+    node, at = position
+    if at < len(node.edge):
+        return None, {node.edge[at]: node}, at + 1
+    return node.value, node.children or {}, 0
+
+
+def _same(a: Optional[Trie], at_a: int, b: Optional[Trie], at_b: int) -> bool:
+    return (a is not None and b is not None and a.edge[at_a:] == b.edge[at_b:]
+            and (a is b or a.hash == b.hash))
+
+
+def _diff(a: _Position, b: _Position, path: K) -> Iterator[Tuple[K, Optional[V], Optional[V]]]:
+    value_a, below_a, at_a = _step(a)
+    value_b, below_b, at_b = _step(b)
+    if value_a != value_b:
+        yield path[:], value_a, value_b
+    if below_a is below_b:
+        return
+    # subtrees are compared before descending, which for wide nodes saves most of the calls
+    words = [word for word in below_a.keys() | below_b.keys()
+             if not _same(below_a.get(word, None), at_a, below_b.get(word, None), at_b)]
+    for word in sorted(words):
+        child_a = below_a.get(word, None)
+        child_b = below_b.get(word, None)
+        path.append(word)
+        yield from _diff(None if child_a is None else (child_a, at_a), None if child_b is None else (child_b, at_b),
+                         path)
+        path.pop()
+
+
+def _close(stack: List[Trie], word: str) -> None:
+    """pops the finished node off the `stack` of `Trie._build` and places it under `word`, compressing it if possible"""
+    node = stack.pop()
+    if node.value is None and len(node.children) == 1:
+        (child_word, child), = node.children.items()
+        child.edge = (child_word,) + child.edge
+        node = child
+    parent = stack[-1]
+    if parent.children is None:
+        parent.children = {}
+    parent.children[word] = node
+    parent.count += node.count
+
+
+def _sorted_words(node: Trie) -> List[str]:
+    if node.order is not None:
+        return node.order[0]
+    words = sorted(node.children)
+    if len(words) >= _min_cached_order:
+        node.order = [words, None]
+    return words
+
+
+def _ranks(node: Trie, words: List[str]) -> List[int]:
+    """running totals of the children's counts, in the order of `words`"""
+    if node.order is not None and node.order[1] is not None:
+        return node.order[1]
+    children = node.children
+    ranks = list(accumulate(children[word].count for word in words))
+    if node.order is not None:
+        node.order[1] = ranks
+    return ranks
+
+
+def _following(words: List[str], word: Optional[str] = None, inclusive: bool = False) -> Iterator[str]:
+    """
+    yields the words of a sorted list that come after `word`, re-locating the position after every step so that the
+    list may change in between
+    """
+    if word is None:
+        index = 0
+    elif inclusive:
+        index = bisect_left(words, word)
+    else:
+        index = bisect_right(words, word)
+    while index < len(words):
+        word = words[index]
+        yield word
+        index = bisect_right(words, word)
+
+
+def _words(node: Trie, ordered: bool) -> Iterator[str]:
+    if ordered:
+        return _following(_sorted_words(node))
+    return iter(list(node.children))
+
+
+def _words_from(node: Trie, word: str, inclusive: bool, ordered: bool) -> Iterator[str]:
+    if ordered:
+        return _following(_sorted_words(node), word, inclusive)
+    words = list(node.children)
+    index = words.index(word)
+    return iter(words[index if inclusive else index + 1:])
+
+
+def _seek_after(node: Trie, after: K, inclusive: bool, ordered: bool, path: K,
+                stack: List[Tuple[Trie, Iterator[str], int]]) -> Tuple[Optional[Trie], bool]:
+    """
+    prepares a scan to resume after `after`, returns the node at `after` (if any) and whether its value is included
+    """
+    i = len(path)
+    while i < len(after):
+        word = after[i]
+        if not node.children or word not in node.children:
+            if not ordered:
+                raise KeyError(after)
+            if node.children:
+                stack.append((node, _words_from(node, word, False, ordered), len(path)))
+            return None, False
+        child = node.children[word]
+        i += 1
+        edge = child.edge
+        rest = tuple(after[i:i + len(edge)])
+        if rest != edge[:len(rest)]:
+            if not ordered:
+                raise KeyError(after)
+            stack.append((node, _words_from(node, word, rest < edge[:len(rest)], ordered), len(path)))
+            return None, False
+        if len(rest) < len(edge):
+            stack.append((node, _words_from(node, word, True, ordered), len(path)))
+            return None, False
+        stack.append((node, _words_from(node, word, False, ordered), len(path)))
+        path.append(word)
+        path.extend(edge)
+        i += len(edge)
+        node = child
+    return node, inclusive
+
+
+def _seek_offset(node: Trie, index: int, path: K,
+                 stack: List[Tuple[Trie, Iterator[str], int]]) -> Tuple[Optional[Trie], bool]:
+    """prepares an ordered scan to start at the `index`-th key below `node`, using the subtree counts"""
+    if index >= node.count:
+        return None, False
+    while True:
+        if node.value is not None:
+            if index == 0:
+                return node, True
+            index -= 1
+        words = _sorted_words(node)
+        if node.count == len(words) + (node.value is not None):
+            # every child holds exactly one key
+            position = index
+            index = 0
+        else:
+            ranks = _ranks(node, words)
+            position = bisect_right(ranks, index)
+            if position:
+                index -= ranks[position - 1]
+        word = words[position]
+        stack.append((node, _following(words, word), len(path)))
+        node = node.children[word]
+        path.append(word)
+        path.extend(node.edge)
@@ -0,0 +1,139 @@
+"""
+Write-ahead log of commits, blobs and moves of the head.
+
+Every commit is recorded in the log on the caller's thread before the writer queues its writes to the pack, the
+commits log, the dag and the head file, and so are the values of new blobs and every move of the head. Records are
+
+    length (4 bytes), crc32 of kind and payload (4), kind (1), payload
+
+where the payload of a commit is its id as a length-prefixed utf-8 string followed by the commit in the binary commit
+format, that of a blob its value and that of a head the id of the commit. A commit moves the head to itself without a
+record of its own. Under the every_commit durability the log is
+synced before the transaction returns, so a commit is durable after one sync of one file, while the writer syncs the
+other files once per round as under batch.
+
+The log is emptied whenever everything queued to the writer was written. On connect, `recover` replays the records a
+crash left out of the other files, in time proportional to the records logged since, not to the history.
+"""
+from __future__ import annotations
+
+import os
+import struct
+import zlib
+from typing import BinaryIO, Iterator, List, Optional, Tuple, Union
+
+from . import config
+from .blobs import BlobStore
+from .commit_file import CommitFile
+from .dag import Dag
+from .pack import Pack
+
+_header = struct.Struct('<II')
+_commit = 0
+_blob = 1
+_head = 2
+
+
+class Wal:
+    __slots__ = ['path', 'file', 'size', 'head_id']
+
+    def __init__(self, directory: str) -> None:
+        self.path = os.path.join(directory, f'{config.wal_file}_{config.device_name}')
+        self.file: Optional[BinaryIO] = None
+        self.size = os.path.getsize(self.path) if os.path.exists(self.path) else 0
+        # the head as of the last record
+        self.head_id: Optional[str] = None
+
+    def _append(self, kind: int, payload: bytes) -> None:
+        if self.file is None:
+            self.file = open(self.path, 'ab', buffering=0)
+        body = bytes([kind]) + payload
+        record = _header.pack(len(body), zlib.crc32(body)) + body
+        self.file.write(record)
+        self.size += len(record)
+
+    def commit(self, commit_id: str, data: bytes) -> None:
+        encoded = commit_id.encode()
+        self._append(_commit, bytes([len(encoded)]) + encoded + data)
+        self.head_id = commit_id
+
+    def blob(self, value: str) -> None:
+        self._append(_blob, value.encode('utf-8'))
+
+    def head(self, commit_id: str) -> None:
+        if commit_id != self.head_id:
+            self._append(_head, commit_id.encode())
+            self.head_id = commit_id
+
+    def sync(self) -> None:
+        if self.file is not None:
+            os.fsync(self.file.fileno())
+
+    def records(self) -> Iterator[Tuple[int, bytes]]:
+        """yields the kind and payload of every complete record, truncating the log after the last one"""
+        if not self.size:
+            return
+        with open(self.path, 'rb') as f:
+            data = f.read()
+        pos = 0
+        while pos + _header.size <= len(data):
+            length, checksum = _header.unpack_from(data, pos)
+            body = data[pos + _header.size:pos + _header.size + length]
+            # a record torn by a crash
+            if not length or len(body) < length or zlib.crc32(body) != checksum:
+                break
+            yield body[0], body[1:]
+            pos += _header.size + length
+        if pos < len(data):
+            with open(self.path, 'rb+') as f:
+                f.truncate(pos)
+            self.size = pos
+
+    def reset(self) -> None:
+        """empties the log, once everything it records was written to the other files"""
+        if not self.size:
+            return
+        if self.file is None:
+            self.file = open(self.path, 'ab', buffering=0)
+        self.file.truncate(0)
+        self.size = 0
+        self.head_id = None
+
+    def close(self) -> None:
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+
+def recover(directory: str, wal: Wal, pack: Pack, dag: Dag) -> Optional[str]:
+    """
+    writes the commits and blobs of the log that are missing from `pack`, `dag` and the blob store. returns the head
+    the log ends at, None if it is empty
+    """
+    commits: List[Tuple[str, bytes]] = []
+    head = None
+    blobs = BlobStore(directory, pack.writer)
+    for kind, payload in wal.records():
+        if kind == _commit:
+            n = payload[0]
+            commits.append((payload[1:1 + n].decode(), payload[1 + n:]))
+            head = commits[-1][0]
+        elif kind == _blob:
+            blobs.store(payload.decode('utf-8'))
+        elif kind == _head:
+            head = payload.decode()
+    for commit_id, data in _missing(commits, pack):
+        print('recovering commit', commit_id)
+        pack.append(commit_id, data)
+    for commit_id, data in _missing(commits, dag):
+        header = CommitFile(data)
+        dag.append(commit_id, header.parents, header.messages)
+    return head
+
+
+def _missing(commits: List[Tuple[str, bytes]], store: Union[Pack, Dag]) -> List[Tuple[str, bytes]]:
+    """the pack and the dag are appended to in the order of the log, so the commits they miss are the last ones"""
+    present = len(commits)
+    while present and commits[present - 1][0] not in store:
+        present -= 1
+    return commits[present:]
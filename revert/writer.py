@@ -0,0 +1,133 @@
+"""
+Write-behind persistence.
+
+Commits are written by a background thread. Every round it takes all the writes queued since the last round, appends
+them to their files in order and then flushes each file once, so commits made in quick succession share one write and
+one sync of each file. The durability policy decides how far a commit gets before it is considered done:
+
+    none          written by the background thread, never synced
+    batch         written and synced by the background thread, once per round
+    every_commit  as batch, and the transaction waits until its commit is synced to the write-ahead log
+
+Readers of written files call `flush` first, which waits until everything queued so far is written.
+"""
+from __future__ import annotations
+
+import os
+import threading
+from typing import BinaryIO, Callable, Dict, List, Optional, Tuple, Union
+
+durabilities = ('none', 'batch', 'every_commit')
+
+Job = Tuple[str, Union[BinaryIO, str, Callable[[], None], None], Optional[bytes]]
+
+
+class Writer:
+    __slots__ = ['durability', 'jobs', 'queued', 'written', 'error', 'condition', 'thread']
+
+    def __init__(self, durability: str) -> None:
+        if durability not in durabilities:
+            raise ValueError(f'durability must be one of {", ".join(durabilities)}, not {durability}')
+        self.durability = durability
+        self.jobs: List[Job] = []
+        # the number of jobs queued and written so far
+        self.queued = 0
+        self.written = 0
+        self.error: Optional[BaseException] = None
+        self.condition = threading.Condition()
+        self.thread = threading.Thread(target=self._run, name='revert-writer', daemon=True)
+        self.thread.start()
+
+    def _queue(self, job: Job) -> None:
+        with self.condition:
+            self._raise()
+            self.jobs.append(job)
+            self.queued += 1
+            self.condition.notify_all()
+
+    def append(self, f: BinaryIO, data: bytes) -> None:
+        """appends `data` to the open file `f`"""
+        self._queue(('append', f, data))
+
+    def replace(self, path: str, data: bytes) -> None:
+        """replaces the contents of the file at `path` by `data`"""
+        self._queue(('replace', path, data))
+
+    def call(self, function: Callable[[], None]) -> None:
+        """calls `function` on the writer thread, in order with the writes"""
+        self._queue(('call', function, None))
+
+    def close_file(self, f: BinaryIO) -> None:
+        """closes `f` once everything queued before it was written"""
+        self._queue(('close', f, None))
+
+    def close(self) -> None:
+        """writes everything queued so far and stops the writer thread"""
+        self._queue(('stop', None, None))
+        self.thread.join()
+        with self.condition:
+            self._raise()
+
+    def _raise(self) -> None:
+        if self.error is not None:
+            error = self.error
+            self.error = None
+            raise error
+
+    def flush(self) -> None:
+        """waits until everything queued so far is written, and synced unless the durability is none"""
+        with self.condition:
+            target = self.queued
+            while self.written < target and self.error is None:
+                self.condition.wait()
+            self._raise()
+
+    def _sync(self, f: BinaryIO) -> None:
+        f.flush()
+        if self.durability != 'none':
+            os.fsync(f.fileno())
+
+    def _run(self) -> None:
+        while True:
+            with self.condition:
+                while not self.jobs:
+                    self.condition.wait()
+                jobs = self.jobs
+                self.jobs = []
+            try:
+                self._write(jobs)
+            except BaseException as e:
+                with self.condition:
+                    self.error = e
+            with self.condition:
+                self.written += len(jobs)
+                self.condition.notify_all()
+            if jobs[-1][0] == 'stop':
+                return
+
+    def _write(self, jobs: List[Job]) -> None:
+        # files appended to in this round in the order of their first write, and the last contents of replaced files,
+        # which are only written once the appends they may refer to are
+        touched: List[BinaryIO] = []
+        replaced: Dict[str, bytes] = {}
+        for kind, target, data in jobs:
+            if kind == 'append':
+                target.write(data)
+                if target not in touched:
+                    touched.append(target)
+            elif kind == 'replace':
+                replaced[target] = data
+            elif kind == 'call':
+                target()
+            elif kind == 'close':
+                if target in touched:
+                    self._sync(target)
+                    touched.remove(target)
+                target.close()
+        for f in touched:
+            self._sync(f)
+        for path, data in replaced.items():
+            with open(f'{path}.tmp', 'wb') as f:
+                f.write(data)
+                self._sync(f)
+            os.replace(f'{path}.tmp', path)
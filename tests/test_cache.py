@@ -0,0 +1,20 @@
+from revert.cache import SizedCache
+
+
+def test_sized_cache():
+    cache = SizedCache(10)
+    cache.put('a', 1, 4)
+    cache.put('b', 2, 4)
+    assert cache.get('a') == 1
+    cache.put('c', 3, 4)
+    assert cache.get('b') is None
+    assert cache.get('a') == 1
+    assert cache.get('c') == 3
+    cache.put('d', 4, 11)
+    assert cache.get('d') is None
+    cache.put('a', 5, 2)
+    assert cache.get('a') == 5
+    assert cache.stats() == {'hits': 4, 'misses': 2, 'entries': 2, 'size': 6, 'capacity': 10}
+    cache.clear()
+    assert cache.get('a') is None
+    assert cache.size == 0
@@ -0,0 +1,67 @@
+import json
+import os
+
+from revert import commit_file
+from revert.blobs import Blob, digest
+from revert.commit_file import CommitFile
+from revert.transaction import Transaction
+from revert.trie import Trie, split
+
+
+def _transaction():
+    state = Trie()
+    state.put(split('a/b/c'), 'old')
+    state.put(split('a/b/d'), 'gone')
+    trans = Transaction('first')
+    trans.messages.append('second')
+    trans.put(state, split('a/b/c'), 'new')
+    trans.discard(state, split('a/b/d'))
+    trans.put(state, split('a/é/' + 'x' * 300), 'ü' * 200)
+    trans.increment(state, split('a/n'), -3)
+    trans.put(state, split('a/big'), 2 ** 70)
+    return state, trans
+
+
+def test_round_trip():
+    _, trans = _transaction()
+    data = commit_file.encode(['parent'], trans.messages, trans.old_values, trans.new_values)
+    commit = CommitFile(data)
+    assert commit.parents == ['parent']
+    assert commit.messages == ['first', 'second']
+    assert [(key[:], value) for key, value in commit.old_items()] == [(['a', 'b', 'c'], 'old'),
+                                                                      (['a', 'b', 'd'], 'gone')]
+    decoded = commit.to_transaction()
+    assert decoded.old_values.flatten() == trans.old_values.flatten()
+    assert decoded.new_values.flatten() == trans.new_values.flatten()
+
+
+def test_blob_round_trip():
+    new_values = Trie()
+    new_values.put(split('a/blob'), Blob(digest('large')))
+    commit = CommitFile(commit_file.encode([], [], Trie(), new_values))
+    assert [(key[:], value) for key, value in commit.new_items()] == [(['a', 'blob'], Blob(digest('large')))]
+
+
+def test_redo_undo():
+    state, trans = _transaction()
+    after = state.flatten()
+    commit = CommitFile(commit_file.encode([], trans.messages, trans.old_values, trans.new_values))
+    commit.undo(state)
+    assert state.flatten() == {'a/b/c': 'old', 'a/b/d': 'gone'}
+    commit.redo(state)
+    assert state.flatten() == after
+
+
+def test_read_legacy_json(tmp_path):
+    _, trans = _transaction()
+    with open(os.path.join(tmp_path, 'legacy.json'), 'w') as f:
+        f.write(json.dumps({'parents': ['init'], **trans.to_json()}))
+    commit_file.write(str(tmp_path), 'binary', ['init'], trans)
+    legacy = commit_file.read(str(tmp_path), 'legacy')
+    binary = commit_file.read(str(tmp_path), 'binary')
+    assert isinstance(legacy, Transaction)
+    assert isinstance(binary, CommitFile)
+    for commit in (legacy, binary):
+        state = Trie()
+        commit.redo(state)
+        assert state.flatten() == trans.new_values.flatten()
@@ -0,0 +1,123 @@
+import json
+import os
+import random
+
+from revert import config
+from revert.dag import Dag, none
+
+
+def test_append_and_reopen(tmp_path):
+    directory = str(tmp_path)
+    dag = Dag(directory)
+    a, b, c = 'aa' * 32, 'bb' * 28, 'not hex'
+    dag.append(a, [config.init_commit], ['first'])
+    dag.append(b, [a], ['second', 'nested'])
+    dag.append(c, [a], ['third'])
+    dag.close()
+    dag = Dag(directory)
+    assert len(dag) == 3
+    assert [dag.id(i) for i in range(3)] == [a, b, c]
+    assert dag.parents(b) == [a]
+    assert dag.parents(a) == [config.init_commit]
+    assert dag.children(a) == [b, c]
+    assert dag.children(config.init_commit) == [a]
+    assert dag.messages(b) == ['second', 'nested']
+    assert dag.generation(dag.index(c)) == 2
+    assert dag.index(config.init_commit) == none
+    assert 'cc' * 32 not in dag
+    merge = 'dd' * 32
+    dag.append(merge, [b, c], ['merge'])
+    assert dag.parents(merge) == [b, c]
+    assert dag.generation(dag.index(merge)) == 3
+    assert dag.children(c) == [merge]
+    assert list(dag.entries())[-1] == (merge, [b, c], ['merge'])
+    dag.close()
+
+
+def test_catch_up_with_log(tmp_path):
+    directory = str(tmp_path)
+    commits = ['%064x' % i for i in range(1, 6)]
+    with open(os.path.join(directory, config.commit_parents_file), 'w') as f:
+        for parent, commit in zip([config.init_commit] + commits, commits[:3]):
+            f.write(json.dumps([commit, [parent], [f'message {commit}']]) + '\n')
+    dag = Dag(directory)
+    assert len(dag) == 3
+    dag.close()
+    with open(os.path.join(directory, config.commit_parents_file), 'a') as f:
+        f.write(json.dumps([commits[3], [commits[2]], []]) + '\n')
+        f.write('["torn')
+    path = os.path.join(directory, config.dag_file)
+    with open(path, 'ab') as f:
+        f.write(b'torn')
+    dag = Dag(directory)
+    assert len(dag) == 4
+    assert dag.parents(commits[3]) == [commits[2]]
+    assert dag.messages(commits[1]) == [f'message {commits[1]}']
+    dag.close()
+
+
+def test_merge_base(tmp_path):
+    dag = Dag(str(tmp_path))
+    # a - b - d - f
+    #   \ c - e /
+    for commit, parents in (('a', ['init']), ('b', ['a']), ('c', ['a']), ('d', ['b']), ('e', ['c']),
+                            ('f', ['d', 'e']), ('g', ['init'])):
+        dag.append(commit, parents, [commit])
+    i = dag.index
+    assert dag.merge_base(i('d'), i('e')) == i('a')
+    assert dag.merge_base(i('f'), i('e')) == i('e')
+    assert dag.merge_base(i('e'), i('f')) == i('e')
+    assert dag.merge_base(i('f'), i('f')) == i('f')
+    assert dag.merge_base(i('f'), i('g')) == none
+    dag.append('h', ['e'], ['h'])
+    assert dag.merge_base(i('f'), i('h')) == i('e')
+    dag.close()
+
+
+def _ancestors(dag, i):
+    seen = set()
+    stack = [i]
+    while stack:
+        i = stack.pop()
+        if i != none and i not in seen:
+            seen.add(i)
+            stack.extend(dag.parent_indexes(i))
+    return seen
+
+
+def test_skip_pointers(tmp_path):
+    random.seed(2)
+    dag = Dag(str(tmp_path))
+    for i in range(300):
+        parent = f'c{random.randrange(i)}' if i and random.random() < 0.9 else config.init_commit
+        dag.append(f'c{i}', [parent], [])
+    chain = []
+    i = dag.index('c299')
+    while i != none:
+        chain.append(i)
+        i = dag.first_parent(i)
+    assert dag.depth(dag.index('c299')) == len(chain)
+    for depth in range(len(chain) + 1):
+        assert dag.ancestor(chain[0], depth) == (chain[-depth] if depth else none)
+    for _ in range(300):
+        a, b = random.randrange(300), random.randrange(300)
+        common = _ancestors(dag, a) & _ancestors(dag, b)
+        expected = max(common, key=dag.generation) if common else none
+        assert dag.merge_base(a, b) == expected
+    dag.close()
+
+
+def test_previous_format_is_rebuilt(tmp_path):
+    directory = str(tmp_path)
+    dag = Dag(directory)
+    dag.append('aa' * 32, [config.init_commit], ['first'])
+    dag.append('bb' * 32, ['aa' * 32], ['second'])
+    dag.close()
+    with open(os.path.join(directory, config.dag_file), 'r+b') as f:
+        f.write(b'RVD1')
+        f.write(b'\0' * 60)
+    dag = Dag(directory)
+    assert len(dag) == 2
+    assert dag.parents('bb' * 32) == ['aa' * 32]
+    assert dag.depth(dag.index('bb' * 32)) == 2
+    dag.close()
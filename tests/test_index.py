@@ -0,0 +1,37 @@
+from revert.index import IndexedTrie
+from revert.keys import key
+from revert.trie import split
+
+
+def _find(t, pattern, value):
+    return sorted('/'.join(k) for k in t.indexes[key(pattern)].find(value))
+
+
+def test_index_existing_keys():
+    t = IndexedTrie()
+    t.put(split('o/1/c'), 'A')
+    t.put(split('o/2/c'), 'B')
+    t.put(split('o/2/d'), 'A')
+    t.create_index(key('o/*/c'))
+    assert _find(t, 'o/*/c', 'A') == ['o/1/c']
+
+
+def test_index_update_many():
+    t = IndexedTrie()
+    t.create_index(key('o/*/c'))
+    t.put(split('o/1/c'), 'A')
+    t.update_many([(split('o/1/c'), 'B'), (split('o/2/c'), 'A'), (split('o/1/c'), 'C')])
+    assert _find(t, 'o/*/c', 'A') == ['o/2/c']
+    assert _find(t, 'o/*/c', 'B') == []
+    assert _find(t, 'o/*/c', 'C') == ['o/1/c']
+
+
+def test_index_counters():
+    t = IndexedTrie()
+    t.create_index(key('n/*'))
+    t.increment(split('n/x'), 2)
+    assert _find(t, 'n/*', 2) == ['n/x']
+    t.count_down_or_del(split('n/x'))
+    t.count_down_or_del(split('n/x'))
+    assert _find(t, 'n/*', 1) == []
+    assert t.indexes[key('n/*')].entries == {}
@@ -0,0 +1,20 @@
+from revert.keys import Key, as_key, key
+
+
+def test_key_split():
+    assert key('a//b/c/') == ('a', 'b', 'c')
+    assert key('') == ()
+    assert isinstance(key('a/b'), Key)
+
+
+def test_key_interned():
+    assert key('a/b/c') is key('a/b/c')
+    k = key('x/y')
+    assert as_key(k) is k
+
+
+def test_key_join():
+    assert key('a/b') / 'c/d' == key('a/b/c/d')
+    assert key('a') / key('b') == ('a', 'b')
+    assert str(key('a/b') / 'c') == 'a/b/c'
+    assert repr(key('a/b')) == "key('a/b')"
@@ -0,0 +1,43 @@
+import pytest
+
+import revert
+from revert.ogm import DirectedEdge, Node, UndirectedEdge, ogm
+
+
+def _edge(cls, **ends):
+    """the handle to an edge that Node.edges returns"""
+    edge = object.__new__(cls)
+    for name, node in ends.items():
+        object.__setattr__(edge, f'__{name}__', node)
+    return edge
+
+
+def test_delete_edge_twice(tmp_path, monkeypatch):
+    # registered classes write their schema on every connect, so they are dropped after the test
+    monkeypatch.setattr(ogm, 'node_classes', dict(ogm.node_classes))
+    monkeypatch.setattr(ogm, 'edge_classes', dict(ogm.edge_classes))
+
+    class Person(Node):
+        pass
+
+    class Follows(DirectedEdge):
+        pass
+
+    class Knows(UndirectedEdge):
+        pass
+
+    revert.connect(str(tmp_path))
+    with revert.transaction('edges'):
+        a, b = Person(), Person()
+        Follows(parent=a, child=b)
+        Knows(node_1=a, node_2=b)
+    edges = [_edge(Follows, parent=a, child=b), _edge(Knows, node_1=a, node_2=b)]
+    with revert.transaction('delete edges'):
+        for edge in edges:
+            edge.delete()
+    with revert.transaction('delete edges again'):
+        for edge in edges:
+            with pytest.raises(KeyError):
+                edge.delete()
+    assert revert.match_count('ogm/child_relations') == 0
+    assert revert.match_count('ogm/parent_relations') == 0
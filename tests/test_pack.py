@@ -0,0 +1,96 @@
+import json
+import os
+
+from revert import commit_file, config
+from revert.commit_file import CommitFile
+from revert.pack import Pack, migrate
+from revert.transaction import Transaction
+from revert.trie import Trie, split
+
+
+def _commit(i):
+    state = Trie()
+    trans = Transaction(f'commit {i}')
+    trans.put(state, split(f'a/{i}'), str(i))
+    return trans
+
+
+def _encoded(i):
+    trans = _commit(i)
+    return commit_file.encode(['init'], trans.messages, trans.old_values, trans.new_values)
+
+
+def test_append_and_reopen(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, 'pack_segment_size', 100)
+    pack = Pack(str(tmp_path))
+    for i in range(10):
+        pack.append(f'c{i}', _encoded(i))
+    assert pack.segment > 0
+    pack.close()
+    pack = Pack(str(tmp_path))
+    for i in range(10):
+        commit = pack.read(f'c{i}')
+        assert isinstance(commit, CommitFile)
+        assert commit.messages == [f'commit {i}']
+    pack.append('c10', _encoded(10))
+    assert pack.read('c10').messages == ['commit 10']
+    pack.close()
+
+
+def test_torn_index_record(tmp_path):
+    pack = Pack(str(tmp_path))
+    pack.append('c0', _encoded(0))
+    pack.append('c1', _encoded(1))
+    pack.close()
+    path = os.path.join(tmp_path, config.pack_index_file)
+    with open(path, 'rb+') as f:
+        f.truncate(os.path.getsize(path) - 3)
+    pack = Pack(str(tmp_path))
+    assert 'c0' in pack
+    assert 'c1' not in pack
+    pack.append('c2', _encoded(2))
+    assert pack.read('c2').messages == ['commit 2']
+    assert pack.read('c0').messages == ['commit 0']
+    pack.close()
+
+
+def test_migrate(tmp_path):
+    directory = str(tmp_path)
+    legacy = _commit(0)
+    with open(os.path.join(directory, 'c0.json'), 'w') as f:
+        f.write(json.dumps({'parents': ['init'], **legacy.to_json()}))
+    commit_file.write(directory, 'c1', ['c0'], _commit(1))
+    with open(os.path.join(directory, config.commit_parents_file), 'w') as f:
+        f.write(json.dumps(['c0', ['init'], ['commit 0']]) + '\n')
+        f.write(json.dumps(['c1', ['c0'], ['commit 1']]) + '\n')
+    assert migrate(directory) == 2
+    assert not os.path.exists(os.path.join(directory, 'c0.json'))
+    assert not os.path.exists(os.path.join(directory, 'c1.commit'))
+    pack = Pack(directory)
+    assert pack.read('c0').parents == ['init']
+    assert pack.read('c1').parents == ['c0']
+    state = Trie()
+    pack.read('c0').redo(state)
+    pack.read('c1').redo(state)
+    assert state.flatten() == {'a/0': '0', 'a/1': '1'}
+    pack.close()
+    assert migrate(directory) == 0
+
+
+def test_read_many(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, 'pack_segment_size', 100)
+    monkeypatch.setattr(config, 'prefetch_window', 3)
+    pack = Pack(str(tmp_path))
+    for i in range(10):
+        pack.append(f'c{i}', _encoded(i))
+    pack.close()
+    commit_file.write(str(tmp_path), 'loose', ['init'], _commit(10))
+    pack = Pack(str(tmp_path))
+    pack.read('c4')
+    ids = [f'c{i}' for i in range(9, -1, -1)] + ['loose']
+    assert [commit.messages for commit in pack.read_many(ids)] == [[f'commit {i}'] for i in range(9, -1, -1)] + \
+        [['commit 10']]
+    assert pack.pool is not None
+    assert all(pack.cache.get(commit_id) is not None for commit_id in ids)
+    pack.close()
+    assert pack.pool is None
@@ -0,0 +1,169 @@
+import os
+
+import pytest
+
+import revert
+from revert import commit_file, config
+from revert.blobs import Blob, digest, path as blob_path
+from revert.dag import Dag
+from revert.pack import Pack
+from revert.replication import replicate
+from revert.transaction import Transaction
+from revert.trie import Trie, split
+
+
+def _commit(directory, commit_id, parent, value):
+    state = Trie()
+    trans = Transaction(f'commit {commit_id}')
+    trans.put(state, split(f'a/{commit_id}'), value)
+    pack, dag = Pack(directory), Dag(directory)
+    pack.append(commit_id, commit_file.encode([parent], trans.messages, trans.old_values, trans.new_values))
+    dag.append(commit_id, [parent], trans.messages)
+    pack.close()
+    dag.close()
+
+
+def _store_blob(directory, value):
+    blob = Blob(digest(value))
+    path = blob_path(directory, blob.digest)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w') as f:
+        f.write(value)
+    return blob
+
+
+def _log(directory):
+    dag = Dag(directory)
+    entries = list(dag.entries())
+    dag.close()
+    return entries
+
+
+def _pack_size(directory):
+    return sum(os.path.getsize(os.path.join(directory, name)) for name in os.listdir(directory)
+               if name.startswith('pack-'))
+
+
+def test_replicate(tmp_path):
+    source, target = str(tmp_path / 'source'), str(tmp_path / 'target')
+    os.makedirs(source)
+    blob = _store_blob(source, 'large value')
+    parent = config.init_commit
+    for i in range(5):
+        _commit(source, f'c{i}', parent, blob if i == 2 else str(i))
+        parent = f'c{i}'
+    with open(os.path.join(source, f'{config.head_file}_other'), 'w') as f:
+        f.write('c4')
+    assert replicate(source, target) == (5, 1)
+    assert _log(target) == _log(source)
+    assert os.path.exists(blob_path(target, blob.digest))
+    with open(os.path.join(target, f'{config.head_file}_other'), 'r') as f:
+        assert f.read() == 'c4'
+    assert replicate(source, target) == (0, 0)
+    _commit(target, 't0', 'c4', 'target')
+    _commit(source, 'c5', 'c4', '5')
+    own_head = os.path.join(target, f'{config.head_file}_{config.device_name}')
+    with open(os.path.join(source, f'{config.head_file}_{config.device_name}'), 'w') as f:
+        f.write('c5')
+    with open(own_head, 'w') as f:
+        f.write('c4')
+    assert replicate(source, target) == (1, 0)
+    with open(own_head, 'r') as f:
+        assert f.read() == 'c5'
+    with open(own_head, 'w') as f:
+        f.write('t0')
+    replicate(source, target)
+    with open(own_head, 'r') as f:
+        assert f.read() == 't0'
+    assert [commit_id for commit_id, _, _ in _log(target)] == ['c0', 'c1', 'c2', 'c3', 'c4', 't0', 'c5']
+    pack = Pack(target)
+    assert pack.read('c5').messages == ['commit c5']
+    pack.close()
+
+
+def test_resume_after_interruption(tmp_path, monkeypatch):
+    source, target = str(tmp_path / 'source'), str(tmp_path / 'target')
+    os.makedirs(source)
+    parent = config.init_commit
+    for i in range(6):
+        _commit(source, f'c{i}', parent, str(i))
+        parent = f'c{i}'
+    append = Dag.append
+
+    def interrupted(self, commit_id, parents, messages):
+        if commit_id == 'c3':
+            raise KeyboardInterrupt
+        append(self, commit_id, parents, messages)
+
+    monkeypatch.setattr(Dag, 'append', interrupted)
+    with pytest.raises(KeyboardInterrupt):
+        replicate(source, target)
+    monkeypatch.setattr(Dag, 'append', append)
+    assert [commit_id for commit_id, _, _ in _log(target)] == ['c0', 'c1', 'c2']
+    # c3 reached the pack before the interruption and is not packed twice
+    assert replicate(source, target) == (3, 0)
+    assert _log(target) == _log(source)
+    pack = Pack(target)
+    assert [pack.read(f'c{i}').messages for i in range(6)] == [[f'commit c{i}'] for i in range(6)]
+    pack.close()
+    assert _pack_size(target) == _pack_size(source)
+
+
+def test_foreign_heads_only_move_forward(tmp_path):
+    source, target = str(tmp_path / 'source'), str(tmp_path / 'target')
+    os.makedirs(source)
+    parent = config.init_commit
+    for i in range(3):
+        _commit(source, f'c{i}', parent, str(i))
+        parent = f'c{i}'
+    ahead = os.path.join(target, f'{config.head_file}_ahead')
+    diverged = os.path.join(target, f'{config.head_file}_diverged')
+    for device in ('ahead', 'diverged', 'behind'):
+        with open(os.path.join(source, f'{config.head_file}_{device}'), 'w') as f:
+            f.write('c2')
+    replicate(source, target)
+    _commit(target, 'y0', 'c2', 'ahead')
+    _commit(target, 'z0', 'c0', 'diverged')
+    _commit(source, 'c3', 'c2', '3')
+    with open(os.path.join(source, f'{config.head_file}_behind'), 'w') as f:
+        f.write('c3')
+    for path, head in ((ahead, 'y0'), (diverged, 'z0')):
+        with open(path, 'w') as f:
+            f.write(head)
+    replicate(source, target)
+    for path, head in ((ahead, 'y0'), (diverged, 'z0'), (os.path.join(target, f'{config.head_file}_behind'), 'c3')):
+        with open(path, 'r') as f:
+            assert f.read() == head
+    revert.connect(target)
+    revert.gc()
+    assert 'y0' in revert.commit_dag() and 'z0' in revert.commit_dag()
+
+
+def test_source_is_read_only(tmp_path):
+    source, target = str(tmp_path / 'source'), str(tmp_path / 'target')
+    os.makedirs(source)
+    parent = config.init_commit
+    for i in range(3):
+        _commit(source, f'c{i}', parent, str(i))
+        parent = f'c{i}'
+    # records another process is still writing, and an index that lags behind the log
+    with open(os.path.join(source, config.commit_parents_file), 'a') as f:
+        f.write('["c3", ["c2"]')
+    with open(os.path.join(source, config.pack_index_file), 'ab') as f:
+        f.write(b'\x02c3')
+    os.remove(os.path.join(source, config.dag_file))
+    files = {}
+    for name in os.listdir(source):
+        with open(os.path.join(source, name), 'rb') as f:
+            files[name] = f.read()
+    assert replicate(source, target) == (3, 0)
+    assert [commit_id for commit_id, _, _ in _log(target)] == ['c0', 'c1', 'c2']
+    assert sorted(os.listdir(source)) == sorted(files)
+    for name, data in files.items():
+        with open(os.path.join(source, name), 'rb') as f:
+            assert f.read() == data
+    dag = Dag(source, read_only=True)
+    assert len(dag) == 3
+    with pytest.raises(ValueError):
+        dag.append('c3', ['c2'], [])
+    dag.close()
@@ -5,7 +5,11 @@
 import os
 import shutil
 
+import pytest
+
 import revert
+from revert.revert import rollback_current_transaction
+from revert.trie import Trie
 
 
 def test_connect():
@@ -42,3 +46,520 @@ def test_undo_redo():
     for i in range(5):
         revert.redo()
         _assert_values(i)
+
+
+def test_match_pagination():
+    with revert.transaction('pagination'):
+        for i in range(50):
+            revert.put(f'pages/{i:02d}', str(i))
+    assert list(revert.match_keys('pages', offset=10, limit=3)) == ['pages/10', 'pages/11', 'pages/12']
+    assert list(revert.match_items('pages', after='pages/47')) == [('pages/48', '48'), ('pages/49', '49')]
+    assert revert.nth_key('pages', 42) == 'pages/42'
+    assert list(revert.match_range('pages/48', 'pages/99')) == [('pages/48', '48'), ('pages/49', '49')]
+    with revert.transaction('pagination inside an edge'):
+        revert.put('edges/b/c/x', 'x')
+        revert.put('edges/b/c/y', 'y')
+    assert list(revert.match_keys('edges/b', after='edges/b/a')) == ['edges/b/c/x', 'edges/b/c/y']
+
+
+def test_snapshot():
+    with revert.transaction('before snapshot'):
+        revert.put('snap/a', '1')
+    snap = revert.snapshot()
+    with revert.transaction('after snapshot'):
+        revert.put('snap/a', '2')
+        revert.put('snap/b', '3')
+    assert snap.get('snap/a') == '1'
+    assert not snap.has('snap/b')
+    assert list(snap.match_keys('snap')) == ['snap/a']
+    assert revert.get('snap/a') == '2'
+    assert revert.match_count('snap') == 2
+
+
+def test_key_objects():
+    base = revert.key('keys/objects')
+    with revert.transaction('keys'):
+        revert.put(base / 'a', '1')
+        revert.put('keys/objects/b', '2')
+    assert revert.get('keys/objects/a') == '1'
+    assert revert.get(base / 'b') == '2'
+    assert revert.has(base / 'a')
+    assert revert.match_count(base) == 2
+    assert list(revert.match_keys(base, after=base / 'a')) == ['keys/objects/b']
+    assert list(revert.match_range(base / 'a', base / 'b')) == [('keys/objects/a', '1')]
+
+
+def test_counters():
+    with revert.transaction('counters'):
+        assert revert.increment('counters/a') == 1
+        assert revert.increment('counters/a', 4) == 5
+        revert.add_many({'counters/a': -5, 'counters/b': 2})
+        revert.add_many([('counters/c', 1), ('counters/c', 1)])
+    assert not revert.has('counters/a')
+    assert revert.get('counters/b') == 2
+    assert revert.get('counters/c') == 2
+    with revert.transaction('more counters'):
+        revert.increment('counters/b', -1)
+    revert.undo()
+    assert revert.get('counters/b') == 2
+    revert.redo()
+    assert revert.get('counters/b') == 1
+
+
+def test_reverse_index():
+    with revert.transaction('indexed objects'):
+        revert.put('indexed/1/class_reference', 'A')
+        revert.put('indexed/2/class_reference', 'B')
+    revert.create_index('indexed/*/class_reference')
+    assert revert.find_by_value('indexed/*/class_reference', 'A') == ['indexed/1/class_reference']
+    with revert.transaction('more indexed objects'):
+        revert.put('indexed/3/class_reference', 'A')
+        revert.put('indexed/2/class_reference', 'A')
+        revert.put('indexed/3/other', 'A')
+    assert sorted(revert.find_by_value('indexed/*/class_reference', 'A')) == [
+        'indexed/1/class_reference', 'indexed/2/class_reference', 'indexed/3/class_reference']
+    assert revert.find_by_value('indexed/*/class_reference', 'B') == []
+    revert.undo()
+    assert revert.find_by_value('indexed/*/class_reference', 'B') == ['indexed/2/class_reference']
+    revert.redo()
+    assert revert.find_by_value('indexed/*/class_reference', 'B') == []
+    with revert.transaction('rolled back'):
+        revert.discard('indexed/1/class_reference')
+        assert len(revert.find_by_value('indexed/*/class_reference', 'A')) == 2
+        rollback_current_transaction()
+    assert len(revert.find_by_value('indexed/*/class_reference', 'A')) == 3
+    with pytest.raises(revert.NoSuchIndexError):
+        revert.find_by_value('indexed/*', 'A')
+    revert.drop_index('indexed/*/class_reference')
+
+
+def test_checkpoints(monkeypatch):
+    from revert import config
+    from revert.pack import Pack
+    directory = os.path.join(os.curdir, '../test_tmp_dir')
+    checkpoint_directory = os.path.join(os.curdir, '../test_tmp_checkpoints')
+    shutil.rmtree(checkpoint_directory, ignore_errors=True)
+    os.makedirs(checkpoint_directory, exist_ok=True)
+    monkeypatch.setattr(config, 'checkpoint_interval', 4)
+    revert.connect(checkpoint_directory)
+    commits = []
+    for i in range(10):
+        with revert.transaction(f'checkpointed {i}'):
+            revert.put(f'checkpointed/{i}', str(i))
+            revert.put('checkpointed/last', str(i))
+        commits.append(revert.get_commit_dag()[0])
+    revert.flush()
+    assert len([name for name in os.listdir(checkpoint_directory) if name.endswith('.checkpoint')]) == 2
+    replayed = []
+    read, fetch = Pack.read, Pack._fetch
+    monkeypatch.setattr(Pack, 'read', lambda self, commit_id: replayed.append(commit_id) or read(self, commit_id))
+    monkeypatch.setattr(Pack, '_fetch', lambda self, commit_id, location: replayed.append(commit_id) or
+                        fetch(self, commit_id, location))
+    revert.connect(checkpoint_directory)
+    assert 0 < len(replayed) < 4
+    assert revert.get('checkpointed/last') == '9'
+    assert revert.match_count('checkpointed') == 11
+    revert.checkout(commits[4])
+    assert revert.get('checkpointed/last') == '4'
+    assert not revert.has('checkpointed/5')
+    revert.checkout(commits[9])
+    assert revert.match_count('checkpointed') == 11
+    revert.connect(directory)
+
+
+def test_checkout_branches():
+    with revert.transaction('branch base'):
+        revert.put('branch', 'base')
+    base = revert.get_commit_dag()[0]
+    with revert.transaction('branch a'):
+        revert.put('branch', 'a')
+        revert.put('branch/a', 'a')
+    branch_a = revert.get_commit_dag()[0]
+    revert.checkout(base)
+    with revert.transaction('branch b'):
+        revert.put('branch', 'b')
+    branch_b = revert.get_commit_dag()[0]
+    head, parents, children, messages = revert.get_commit_dag()
+    assert sorted(children[base]) == sorted([branch_a, branch_b])
+    assert messages[branch_b] == ['branch b']
+    revert.checkout(branch_a)
+    assert revert.get('branch') == 'a'
+    assert revert.get('branch/a') == 'a'
+    revert.checkout(branch_b)
+    assert revert.get('branch') == 'b'
+    assert not revert.has('branch/a')
+    with pytest.raises(revert.AmbiguousRedoError):
+        revert.checkout(base)
+        revert.redo()
+
+
+@pytest.mark.parametrize('durability', ['none', 'batch', 'every_commit'])
+def test_durability(monkeypatch, durability):
+    from revert import config
+    directory = os.path.join(os.curdir, '../test_tmp_dir')
+    durability_directory = os.path.join(os.curdir, '../test_tmp_durability')
+    shutil.rmtree(durability_directory, ignore_errors=True)
+    os.makedirs(durability_directory, exist_ok=True)
+    monkeypatch.setattr(config, 'durability', durability)
+    revert.connect(durability_directory)
+    for i in range(20):
+        with revert.transaction(f'durable {i}'):
+            revert.put('durable', str(i))
+    head = revert.get_commit_dag()[0]
+    revert.flush()
+    with open(os.path.join(durability_directory, f'{config.head_file}_{config.device_name}')) as f:
+        assert f.read() == head
+    revert.undo()
+    assert revert.get('durable') == '18'
+    revert.connect(durability_directory)
+    assert revert.get('durable') == '18'
+    monkeypatch.undo()
+    revert.connect(directory)
+
+
+def test_checkout_net_delta():
+    import random
+    rng = random.Random(15)
+    commits = []
+    states = []
+    for i in range(30):
+        with revert.transaction(f'delta {i}'):
+            for _ in range(3):
+                key = f'delta/{rng.randrange(5)}'
+                if rng.random() < 0.3:
+                    revert.discard(key)
+                elif rng.random() < 0.5:
+                    revert.increment(key + '/count', rng.randrange(1, 3))
+                else:
+                    revert.put(key, str(i))
+        commits.append(revert.get_commit_dag()[0])
+        states.append(dict(revert.match_items('delta')))
+    for _ in range(20):
+        i = rng.randrange(len(commits))
+        revert.checkout(commits[i])
+        assert dict(revert.match_items('delta')) == states[i]
+
+
+def test_nested_transaction_old_values():
+    with revert.transaction('outer'):
+        revert.put('nested/created', '1')
+        revert.put('nested/created', '2')
+        with revert.transaction('inner'):
+            revert.discard('nested/created')
+            revert.put('nested/inner', '1')
+    assert not revert.has('nested/created')
+    head = revert.get_commit_dag()[0]
+    revert.undo()
+    assert not revert.has('nested/created')
+    assert not revert.has('nested/inner')
+    revert.checkout(head)
+    assert not revert.has('nested/created')
+    assert revert.get('nested/inner') == '1'
+
+
+def test_commit_cache(monkeypatch):
+    from revert.pack import Pack
+    with revert.transaction('cached'):
+        revert.put('cached', '1')
+    reads = []
+    read_bytes = Pack.read_bytes
+    monkeypatch.setattr(Pack, 'read_bytes', lambda self, commit_id: reads.append(commit_id) or read_bytes(self, commit_id))
+    hits = revert.commit_cache_stats()['hits']
+    for _ in range(3):
+        revert.undo()
+        assert not revert.has('cached')
+        revert.redo()
+        assert revert.get('cached') == '1'
+    assert reads == []
+    assert revert.commit_cache_stats()['hits'] == hits + 6
+
+
+def test_gc_and_squash():
+    directory = os.path.join(os.curdir, '../test_tmp_dir')
+    gc_directory = os.path.join(os.curdir, '../test_tmp_gc')
+    shutil.rmtree(gc_directory, ignore_errors=True)
+    os.makedirs(gc_directory, exist_ok=True)
+    revert.connect(gc_directory)
+    commits = []
+    for i in range(5):
+        with revert.transaction(f'gc {i}'):
+            revert.put('gc', str(i))
+            revert.put(f'gc/{i}', str(i))
+        commits.append(revert.get_commit_dag()[0])
+    revert.checkout(commits[2])
+    with revert.transaction('gc branch'):
+        revert.put('gc', 'branch')
+    branch = revert.get_commit_dag()[0]
+    expected = dict(revert.match_items('gc'))
+    assert revert.gc() > 0
+    _, parents, children, _ = revert.get_commit_dag()
+    assert commits[3] not in parents and commits[4] not in parents
+    assert children[commits[2]] == [branch]
+    revert.undo()
+    revert.redo()
+    assert dict(revert.match_items('gc')) == expected
+    assert revert.squash(commits[1]) > 0
+    _, parents, _, messages = revert.get_commit_dag()
+    assert commits[0] not in parents
+    assert parents[commits[1]] == [revert.config.init_commit]
+    assert messages[commits[1]] == ['squashed 3 commits']
+    revert.connect(gc_directory)
+    assert dict(revert.match_items('gc')) == expected
+    revert.checkout(commits[1])
+    assert revert.get('gc') == '1'
+    assert revert.get('gc/0') == '0'
+    with revert.transaction('gc second branch'):
+        revert.put('gc', 'second branch')
+    with pytest.raises(revert.SquashError):
+        revert.squash(commits[2])
+    revert.connect(directory)
+
+
+def test_compaction_closes_files(monkeypatch):
+    with revert.transaction('compaction'):
+        revert.put('compaction', '1')
+    pack, dag = revert.db_state.pack, revert.db_state.dag
+    pack.read_bytes(revert.db_state.head)
+    removed = []
+    remove, replace = os.remove, os.replace
+
+    def closed(path):
+        name = os.path.basename(path)
+        if name == revert.config.dag_file or name == revert.config.commit_parents_file:
+            assert dag.map is None and dag.log is None
+        if name.startswith('pack-') or name == revert.config.pack_index_file:
+            assert not pack.readers and pack.segment_file is None and pack.index_file is None
+        removed.append(name)
+
+    monkeypatch.setattr(os, 'remove', lambda path: closed(path) or remove(path))
+    monkeypatch.setattr(os, 'replace', lambda source, path: closed(path) or replace(source, path))
+    revert.gc()
+    assert revert.config.dag_file in removed and revert.config.pack_index_file in removed
+    assert revert.get('compaction') == '1'
+
+
+def test_squash_keeps_roots():
+    directory = os.path.join(os.curdir, '../test_tmp_dir')
+    squash_directory = os.path.join(os.curdir, '../test_tmp_squash')
+    shutil.rmtree(squash_directory, ignore_errors=True)
+    os.makedirs(squash_directory, exist_ok=True)
+    revert.connect(squash_directory)
+    commits = []
+    for i in range(4):
+        with revert.transaction(f'squash {i}'):
+            revert.put('squash', str(i))
+        commits.append(revert.db_state.head)
+    other_head = os.path.join(squash_directory, f'{revert.config.head_file}_other device')
+    with open(other_head, 'w') as f:
+        f.write(commits[0])
+    with pytest.raises(revert.SquashError):
+        revert.squash(commits[2])
+    os.remove(other_head)
+    with pytest.raises(revert.SquashError):
+        revert.squash(commits[2], keep=[commits[1]])
+    assert all(commit in revert.commit_dag() for commit in commits)
+    revert.squash(commits[2], keep=[commits[3]])
+    assert commits[1] not in revert.commit_dag()
+    revert.connect(directory)
+
+
+def test_diff():
+    with revert.transaction('diff base'):
+        revert.put('diff/a', '1')
+        revert.put('diff/b', '1')
+    base = revert.get_commit_dag()[0]
+    with revert.transaction('diff change'):
+        revert.put('diff/a', '2')
+        revert.delete('diff/b')
+        revert.put('diff/c/d', '3')
+    changed = revert.get_commit_dag()[0]
+    revert.checkout(base)
+    with revert.transaction('diff branch'):
+        revert.put('diff/e', '4')
+    branch = revert.get_commit_dag()[0]
+    state = revert.db_state.state
+    assert list(revert.diff(base, changed)) == [('diff/a', '1', '2'), ('diff/b', '1', None), ('diff/c/d', None, '3')]
+    assert list(revert.diff(changed, branch, 'diff/a')) == [('diff/a', '2', '1')]
+    assert list(revert.diff(changed, branch, revert.key('diff/e'))) == [('diff/e', None, '4')]
+    assert list(revert.diff(branch, branch)) == []
+    assert revert.db_state.head == branch
+    assert revert.db_state.state is state
+    assert revert.get('diff/e') == '4'
+    revert.checkout(changed)
+
+
+def test_merge():
+    with revert.transaction('merge base'):
+        revert.put('merge/ours', 'base')
+        revert.put('merge/theirs', 'base')
+        revert.put('merge/both', 'base')
+        revert.put('merge/removed', 'base')
+    base = revert.get_commit_dag()[0]
+    with revert.transaction('merge theirs'):
+        revert.put('merge/theirs', 'theirs')
+        revert.put('merge/both', 'theirs')
+        revert.put('merge/new', 'theirs')
+    theirs = revert.get_commit_dag()[0]
+    revert.checkout(base)
+    with revert.transaction('merge ours'):
+        revert.put('merge/ours', 'ours')
+        revert.put('merge/both', 'ours')
+        revert.delete('merge/removed')
+    ours = revert.get_commit_dag()[0]
+    with pytest.raises(revert.MergeConflictError) as error:
+        revert.merge(theirs)
+    assert error.value.conflicts == ['merge/both']
+    assert revert.db_state.head == ours
+    assert revert.get('merge/both') == 'ours'
+    calls = []
+    merged = revert.merge(theirs, lambda key, *values: calls.append((key, values)) or 'resolved')
+    assert calls == [('merge/both', ('base', 'ours', 'theirs'))]
+    expected = {'merge/ours': 'ours', 'merge/theirs': 'theirs', 'merge/both': 'resolved', 'merge/new': 'theirs'}
+    assert dict(revert.match_items('merge')) == expected
+    head, parents, _, messages = revert.get_commit_dag()
+    assert head == merged
+    assert parents[merged] == [ours, theirs]
+    assert messages[merged] == [f'merged {theirs}']
+    assert revert.merge(theirs) == merged
+    assert revert.merge(base) == merged
+    revert.undo()
+    assert revert.db_state.head == ours
+    assert revert.get('merge/both') == 'ours'
+    revert.checkout(theirs)
+    revert.checkout(merged)
+    assert dict(revert.match_items('merge')) == expected
+    revert.checkout(theirs)
+    assert revert.merge(merged) == merged
+    assert dict(revert.match_items('merge')) == expected
+    revert.connect(revert.db_state.directory)
+    assert revert.db_state.head == merged
+    assert dict(revert.match_items('merge')) == expected
+
+
+def test_pull():
+    directory = os.path.join(os.curdir, '../test_tmp_dir')
+    source = os.path.join(os.curdir, '../test_tmp_pull')
+    shutil.rmtree(source, ignore_errors=True)
+    os.makedirs(source)
+    revert.connect(source)
+    with revert.transaction('pulled'):
+        revert.put('pulled', 'source')
+    source_head = revert.get_commit_dag()[0]
+    revert.connect(directory)
+    with revert.transaction('pull local'):
+        revert.put('pull local', 'target')
+    assert revert.pull(source) == [source_head]
+    assert source_head in revert.get_commit_dag()[1]
+    revert.merge(source_head)
+    assert revert.get('pulled') == 'source'
+    assert revert.get('pull local') == 'target'
+    assert revert.pull(source) == [source_head]
+
+
+def test_commit_dag():
+    with revert.transaction('view base'):
+        revert.put('view', 'base')
+    base = revert.get_commit_dag()[0]
+    with revert.transaction('view a'):
+        revert.put('view', 'a')
+    a = revert.get_commit_dag()[0]
+    revert.checkout(base)
+    with revert.transaction('view b'):
+        revert.put('view', 'b')
+    head, parents, children, messages = revert.get_commit_dag()
+    view = revert.commit_dag()
+    assert view.head == head
+    assert list(view) == list(parents)
+    assert len(view) == len(parents)
+    assert all(view.parents(commit) == parents[commit] for commit in view)
+    assert sorted(view.children(base)) == sorted(children[base])
+    assert view.messages(a) == messages[a] == ['view a']
+    assert view.merge_base(a, head) == base
+    assert view.is_ancestor(base, head) and not view.is_ancestor(a, head)
+    assert view.ancestor(head, 1) == base
+    assert view.ancestor(head, len(view) + 1) == revert.config.init_commit
+    assert view.generation(head) == view.generation(a) == view.generation(base) + 1
+
+
+def test_time_travel(monkeypatch):
+    commits = []
+    for i in range(3):
+        with revert.transaction(f'travel {i}'):
+            revert.put('travel/value', str(i))
+            revert.put(f'travel/{i}', str(i))
+        commits.append(revert.db_state.head)
+    revert.checkout(commits[1])
+    with revert.transaction('travel branch'):
+        revert.put('travel/value', 'branch')
+    head = revert.db_state.head
+    state = revert.db_state.state
+    assert revert.get_at(commits[0], 'travel/value') == '0'
+    assert revert.get_at(commits[2], revert.key('travel/2')) == '2'
+    with pytest.raises(KeyError):
+        revert.get_at(commits[0], 'travel/2')
+    assert list(revert.match_items_at(commits[2], 'travel', limit=2)) == [('travel/0', '0'), ('travel/1', '1')]
+    with revert.transaction('travel uncommitted'):
+        revert.put('travel/value', 'uncommitted')
+        assert revert.get_at(head, 'travel/value') == 'branch'
+        with revert.view(commits[2]) as snap:
+            revert.put('travel/value', 'still uncommitted')
+            assert snap.commit == commits[2]
+            assert snap.get('travel/value') == '2'
+            assert dict(snap.match_items('travel')) == {'travel/0': '0', 'travel/1': '1', 'travel/2': '2',
+                                                        'travel/value': '2'}
+        rollback_current_transaction()
+    assert revert.db_state.head == head
+    assert revert.db_state.state is state
+    assert revert.get('travel/value') == 'branch'
+    # versions read before are not moved to again
+    monkeypatch.setattr(revert.revert, '_move', None)
+    assert revert.get_at(commits[0], 'travel/value') == '0'
+    assert revert.get_at(commits[2], 'travel/value') == '2'
+
+
+def test_blobs(monkeypatch):
+    directory = os.path.join(os.curdir, '../test_tmp_dir')
+    blob_directory = os.path.join(os.curdir, '../test_tmp_blobs')
+    shutil.rmtree(blob_directory, ignore_errors=True)
+    os.makedirs(blob_directory, exist_ok=True)
+    monkeypatch.setattr(revert.config, 'blob_threshold', 100)
+    revert.connect(blob_directory)
+    large = 'large ' * 100
+    other = 'other ' * 100
+    with revert.transaction('blobs'):
+        revert.put('blob/a', large)
+        revert.put('blob/b', large)
+        revert.put('blob/small', 'small')
+    first = revert.get_commit_dag()[0]
+    inline = Trie()
+    for key, value in (('blob/a', large), ('blob/b', large), ('blob/small', 'small')):
+        inline.put(revert.key(key), value)
+    assert revert.db_state.state.update_hash() == inline.update_hash()
+    with revert.transaction('other'):
+        revert.put('blob/a', other)
+    revert.flush()
+    blobs = [name for _, _, names in os.walk(os.path.join(blob_directory, 'blobs')) for name in names]
+    assert len(blobs) == 2
+    assert large not in revert.db_state.pack.encoded(first).decode('utf-8', 'replace')
+    assert dict(revert.match_items('blob')) == {'blob/a': other, 'blob/b': large, 'blob/small': 'small'}
+    revert.create_index('blob/*')
+    assert revert.find_by_value('blob/*', large) == ['blob/b']
+    revert.drop_index('blob/*')
+    view = revert.snapshot()
+    revert.undo()
+    assert revert.get('blob/a') == large
+    assert view.get('blob/a') == other
+    revert.redo()
+    revert.connect(blob_directory)
+    assert revert.get('blob/a') == other
+    assert list(revert.match_range('blob/a', 'blob/b')) == [('blob/a', other)]
+    revert.squash(revert.get_commit_dag()[0])
+    blobs = [name for _, _, names in os.walk(os.path.join(blob_directory, 'blobs')) for name in names]
+    assert len(blobs) == 2
+    with revert.transaction('drop'):
+        revert.delete('blob/b')
+    revert.squash(revert.get_commit_dag()[0])
+    blobs = [name for _, _, names in os.walk(os.path.join(blob_directory, 'blobs')) for name in names]
+    assert len(blobs) == 1
+    assert revert.get('blob/a') == other
+    revert.connect(directory)
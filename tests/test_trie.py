@@ -1,3 +1,4 @@
+import itertools
 import random
 
 import pytest
@@ -137,8 +138,32 @@ def test_count_up_or_set():
     assert t.count_up_or_set(['x']) == 1
     assert t.count_up_or_set(['x', 'y']) is None
     assert t.count_up_or_set(['x', 'y']) == 1
-    assert t[['x']] == '2'
-    assert t[['x', 'y']] == '2'
+    assert t[['x']] == 2
+    assert t[['x', 'y']] == 2
+
+
+def test_increment():
+    t = Trie()
+    assert t.increment(['x'], 5) is None
+    assert t.increment(['x'], -2) == 5
+    assert t[['x']] == 3
+    t.put(['y'], '4')
+    assert t.increment(['y'], 1) == '4'
+    assert t[['y']] == 5
+    assert t.increment(['y'], -5) == 5
+    assert ['y'] not in t
+    assert t.increment(['z'], 0) is None
+    assert ['z'] not in t
+    assert len(t) == 1
+
+
+def test_int_values_hash_apart_from_strings():
+    t1 = Trie()
+    t1.put(['x'], 1)
+    t2 = Trie()
+    t2.put(['x'], '1')
+    assert t1.update_hash() != t2.update_hash()
+    assert Trie.from_json(t1.to_json())[['x']] == 1
 
 
 def test_count_down_or_del():
@@ -155,6 +180,156 @@ def test_count_down_or_del():
     assert t[['x', 'y']] is None
 
 
+def test_radix_collapses_single_child_chains():
+    t = Trie()
+    t.put(['a', 'b', 'c', 'd'], 'value')
+    child = t.children['a']
+    assert child.edge == ('b', 'c', 'd')
+    assert child.children is None
+    assert t[['a', 'b']] is None
+    assert t.size(['a', 'b']) == 1
+
+
+def test_radix_splits_edge_on_divergence():
+    t = Trie()
+    t.put(['a', 'b', 'c', 'd'], 'value1')
+    t.put(['a', 'b', 'x'], 'value2')
+    mid = t.children['a']
+    assert mid.edge == ('b',)
+    assert set(mid.children) == {'c', 'x'}
+    assert mid.children['c'].edge == ('d',)
+    assert t.flatten() == {'a/b/c/d': 'value1', 'a/b/x': 'value2'}
+    # a trie that was never hashed tracks no dirty children
+    assert mid.dirty is None
+
+
+def test_radix_split_after_hashing():
+    t = Trie()
+    t.put(['a', 'b', 'c', 'd'], 'value1')
+    t.update_hash()
+    t.put(['a', 'b', 'x'], 'value2')
+    assert t.children['a'].dirty == {'x'}
+    rebuilt = Trie()
+    rebuilt.put(['a', 'b', 'x'], 'value2')
+    rebuilt.put(['a', 'b', 'c', 'd'], 'value1')
+    assert t.update_hash() == rebuilt.update_hash()
+
+
+def test_radix_splits_edge_on_prefix_insert():
+    t = Trie()
+    t.put(['a', 'b', 'c'], 'value1')
+    t.put(['a', 'b'], 'value2')
+    assert t.children['a'].edge == ('b',)
+    assert t.children['a'].value == 'value2'
+    assert len(t) == 2
+
+
+def test_radix_merges_on_discard():
+    t = Trie()
+    t.put(['a', 'b', 'c', 'd'], 'value1')
+    t.put(['a', 'b', 'x'], 'value2')
+    t.discard(['a', 'b', 'x'])
+    assert t.children['a'].edge == ('b', 'c', 'd')
+    t.put(['a', 'b'], 'value3')
+    t.discard(['a', 'b'])
+    assert t.children['a'].edge == ('b', 'c', 'd')
+    assert t.flatten() == {'a/b/c/d': 'value1'}
+
+
+def test_radix_keys_with_prefix_inside_edge():
+    t = Trie()
+    t.put(['a', 'b', 'c'], 'value')
+    assert _join_keys(t.keys(['a', 'b'])) == ['a/b/c']
+    assert _join_keys(t.keys(['a', 'x'])) == []
+
+
+def test_radix_from_json_is_compressed():
+    t = Trie.from_json({'a': {'b': {'c': 'value1', 'd': 'value2'}}})
+    assert t.children['a'].edge == ('b',)
+    assert t.to_json() == {'a': {'b': {'c': 'value1', 'd': 'value2'}}}
+
+
+def test_hash_ignores_insertion_order():
+    t1 = Trie()
+    t1.put(['x', 'y'], 'value1')
+    t1.put(['x'], 'value2')
+    t1.put(['z'], 'value3')
+    t2 = Trie()
+    t2.put(['z'], 'value3')
+    t2.put(['x'], 'value2')
+    t2.put(['x', 'y'], 'value1')
+    assert t1.update_hash() == t2.update_hash()
+
+
+def test_hash_distinguishes_empty_value():
+    t1 = Trie()
+    t1.put(['x', 'y'], 'value')
+    t2 = Trie()
+    t2.put(['x', 'y'], 'value')
+    t2.put(['x'], '')
+    assert t1.update_hash() != t2.update_hash()
+
+
+def test_hash_only_dirties_changed_path():
+    t = Trie()
+    for i in range(10):
+        t.put(['x', str(i)], 'value')
+    t.update_hash()
+    t.put(['x', '3'], 'other')
+    node = t.children['x']
+    assert node.hash is None
+    assert node.dirty == {'3'}
+    assert all(child.hash is not None for word, child in node.children.items() if word != '3')
+
+
+def test_hash_incremental_matches_rebuild():
+    random.seed(0)
+    for _ in range(500):
+        t = Trie()
+        for _ in range(random.randint(1, 5)):
+            for _ in range(random.randint(0, 8)):
+                key = split(''.join(random.choices('ab///', k=random.randint(1, 6))))
+                if random.random() < 0.3:
+                    t.discard(key)
+                else:
+                    t.put(key, str(random.randint(1, 3)))
+            assert t.update_hash() == t.clone().update_hash()
+
+
+def test_diff_matches_flattened():
+    random.seed(1)
+    for _ in range(300):
+        a = Trie()
+        for _ in range(random.randint(0, 12)):
+            a.put(split(''.join(random.choices('ab///', k=random.randint(1, 6)))), str(random.randint(1, 3)))
+        b = a.snapshot()
+        for _ in range(random.randint(0, 4)):
+            key = split(''.join(random.choices('ab///', k=random.randint(1, 6))))
+            if random.random() < 0.3:
+                b.discard(key)
+            else:
+                b.put(key, str(random.randint(1, 3)))
+        old, new = a.flatten(), b.flatten()
+        expected = sorted((split(key), old.get(key, None), new.get(key, None)) for key in old.keys() | new.keys()
+                          if old.get(key, None) != new.get(key, None))
+        assert list(a.diff(b)) == expected
+        assert list(a.diff(b, ['a'])) == [change for change in expected if change[0][:1] == ['a']]
+
+
+def test_diff_skips_equal_subtrees():
+    a = Trie()
+    for i in range(100):
+        a.put(['same', str(i)], str(i))
+    b = Trie()
+    for i in range(100):
+        b.put(['same', str(i)], str(i))
+    b.put(['other'], 'x')
+    b.update_hash()
+    # equal hashes of separately built subtrees are enough to skip them
+    b.children['same'].children = None
+    assert list(a.diff(b)) == [(['other'], None, 'x')]
+
+
 def test_trie_dict_keys_empty():
     t = Trie()
     assert set(t.keys([])) == set()
@@ -168,6 +343,105 @@ def test_trie_dict_keys_with_prefix(custom_trie):
     assert _join_keys(custom_trie.keys(['x'])) == ['x', 'x/y', 'x/y/w/a/b']
 
 
+def test_trie_dict_joined_keys(custom_trie):
+    assert list(custom_trie.joined_keys(['x'])) == ['x', 'x/y', 'x/y/w/a/b']
+
+
+def test_trie_dict_joined_items(custom_trie):
+    assert list(custom_trie.joined_items(['z'])) == [('z/a/b', 'value5')]
+
+
+def test_trie_dict_keys_after(custom_trie):
+    assert _join_keys(custom_trie.keys([], after=['x', 'y'])) == ['x/y/w/a/b', 'y', 'z/a/b']
+
+
+def test_trie_dict_keys_after_inside_edge(custom_trie):
+    assert _join_keys(custom_trie.keys([], after=['x', 'y', 'w'])) == ['x/y/w/a/b', 'y', 'z/a/b']
+
+
+def test_trie_dict_keys_after_with_prefix(custom_trie):
+    assert _join_keys(custom_trie.keys(['x'], after=['x'])) == ['x/y', 'x/y/w/a/b']
+
+
+def test_trie_dict_keys_after_missing_key(custom_trie):
+    with pytest.raises(KeyError):
+        list(custom_trie.keys([], after=['w']))
+
+
+def test_trie_dict_keys_after_prefix_inside_edge():
+    t = Trie()
+    for key in ['c/b/c/x', 'c/b/c/y']:
+        t.put(split(key), key)
+    assert _join_keys(t.keys(['c', 'b'], after=['c', 'b', 'a'], ordered=True)) == ['c/b/c/x', 'c/b/c/y']
+    assert _join_keys(t.keys(['c', 'b'], after=['c', 'b', 'd'], ordered=True)) == []
+    assert _join_keys(t.keys(['c', 'b'], after=['c', 'b', 'c', 'x'], ordered=True)) == ['c/b/c/y']
+    assert _join_keys(t.keys(['c', 'b'], after=['c', 'b'])) == ['c/b/c/x', 'c/b/c/y']
+    with pytest.raises(KeyError):
+        list(t.keys(['c', 'b'], after=['c', 'b', 'a']))
+    with pytest.raises(ValueError):
+        list(t.keys(['c', 'b'], after=['c', 'a', 'c']))
+
+
+def test_trie_dict_keys_resume():
+    t = Trie()
+    for i in range(10):
+        t.put(['x', str(i), 'y'], str(i))
+    first = list(itertools.islice(t.keys(['x']), 4))
+    rest = list(t.keys(['x'], after=first[-1]))
+    assert first + rest == list(t.keys(['x']))
+
+
+def test_trie_dict_discard_while_iterating(custom_trie):
+    for key in custom_trie.keys([]):
+        custom_trie.discard(key)
+    assert custom_trie.flatten() == {}
+
+
+def test_trie_dict_keys_ordered():
+    t = Trie()
+    for key in ['b/a', 'a/c', 'a', 'c', 'a/b/x']:
+        t.put(split(key), key)
+    assert _join_keys(t.keys([], ordered=True)) == ['a', 'a/b/x', 'a/c', 'b/a', 'c']
+
+
+def test_trie_dict_keys_offset(custom_trie):
+    assert _join_keys(custom_trie.keys([], ordered=True, offset=2)) == ['x/y/w/a/b', 'y', 'z/a/b']
+    assert _join_keys(custom_trie.keys(['x'], ordered=True, offset=1)) == ['x/y', 'x/y/w/a/b']
+    assert _join_keys(custom_trie.keys([], ordered=True, offset=5)) == []
+
+
+def test_trie_dict_keys_offset_requires_order(custom_trie):
+    with pytest.raises(ValueError):
+        list(custom_trie.keys([], offset=1))
+
+
+def test_trie_dict_keys_ordered_after_missing_key(custom_trie):
+    assert _join_keys(custom_trie.keys([], after=['x', 'z'], ordered=True)) == ['y', 'z/a/b']
+
+
+def test_trie_dict_nth(custom_trie):
+    assert custom_trie.nth([], 2) == ['x', 'y', 'w', 'a', 'b']
+    assert custom_trie.nth([], -1) == ['z', 'a', 'b']
+    with pytest.raises(IndexError):
+        custom_trie.nth([], 5)
+
+
+def test_trie_dict_nth_wide_node():
+    t = Trie()
+    for i in range(100):
+        t.put(['x', f'{i:03d}'], str(i))
+    t.put(['x', '050', 'y'], 'nested')
+    assert t.nth(['x'], 51) == ['x', '050', 'y']
+    assert t.nth(['x'], 52) == ['x', '051']
+    t.discard(['x', '000'])
+    assert t.nth(['x'], 51) == ['x', '051']
+
+
+def test_trie_dict_range_items(custom_trie):
+    assert _join_items(custom_trie.range_items(['x', 'y'], ['z'])) == [('x/y', 'value2'), ('x/y/w/a/b', 'value1'),
+                                                                       ('y', 'value4')]
+
+
 def test_trie_dict_items_empty():
     assert _join_items(Trie().items([])) == []
 
@@ -262,3 +536,116 @@ def test_trie_dict_hypothesis():
             assert set(_join_items(t.items([]))) == set(normal_dict.items())
             assert set(_join_keys(t.keys([]))) == set(normal_dict.keys())
             assert len(t) == len(normal_dict)
+
+
+def test_snapshot_isolation():
+    t = Trie()
+    t.put(['x', 'y', 'z'], 'value1')
+    t.put(['x', 'w'], 'value2')
+    snap = t.snapshot()
+    t.put(['x', 'y', 'z'], 'changed')
+    t.discard(['x', 'w'])
+    snap.put(['x', 'v'], 'value3')
+    assert t.flatten() == {'x/y/z': 'changed'}
+    assert snap.flatten() == {'x/y/z': 'value1', 'x/w': 'value2', 'x/v': 'value3'}
+
+
+def test_snapshot_hypothesis():
+    random.seed(0)
+    for _ in range(200):
+        t = Trie()
+        normal_dict = {}
+        snapshots = []
+        for _ in range(40):
+            key = ''.join(random.choices('ab//', k=random.randint(1, 6)))
+            clean_key = '/'.join(split(key))
+            if not clean_key:
+                continue
+            if random.random() < 0.3:
+                t.discard(split(key))
+                normal_dict.pop(clean_key, None)
+            else:
+                value = str(random.randint(1, 5))
+                t.put(split(key), value)
+                normal_dict[clean_key] = value
+            if random.random() < 0.2:
+                t.update_hash()
+            if random.random() < 0.2:
+                snapshots.append((t.snapshot(), dict(normal_dict)))
+        assert t.flatten() == normal_dict
+        for snap, expected in snapshots:
+            assert snap.flatten() == expected
+            rebuilt = Trie()
+            for key, value in expected.items():
+                rebuilt.put(split(key), value)
+            assert snap.update_hash() == rebuilt.update_hash()
+
+
+def test_from_sorted_items():
+    keys = ['a', 'a/b/c', 'a/b/d', 'a/e', 'b/c/d/e', 'c']
+    t = Trie.from_sorted_items((split(key), key) for key in keys)
+    expected = Trie()
+    for key in keys:
+        expected.put(split(key), key)
+    assert t.flatten() == expected.flatten()
+    assert t.to_json() == expected.to_json()
+    assert t.update_hash() == expected.update_hash()
+    assert t.size(['a']) == 4
+    assert t.children['b'].edge == ('c', 'd', 'e')
+
+
+def test_from_sorted_items_unsorted():
+    with pytest.raises(ValueError):
+        Trie.from_sorted_items([(['b'], '1'), (['a'], '2')])
+    with pytest.raises(ValueError):
+        Trie.from_sorted_items([(['a', 'b'], '1'), (['a'], '2')])
+    with pytest.raises(ValueError):
+        Trie.from_sorted_items([(['a'], '1'), (['a'], '2')])
+
+
+def test_update_many_hypothesis():
+    random.seed(0)
+    for _ in range(500):
+        t = Trie()
+        normal_dict = {}
+        for _ in range(random.randint(0, 10)):
+            key = ''.join(random.choices('ab//', k=random.randint(1, 6)))
+            t.put(split(key), '0')
+            normal_dict['/'.join(split(key))] = '0'
+        t.update_hash()
+        snap = t.snapshot()
+        before = dict(normal_dict)
+        items = []
+        for i in range(random.randint(0, 10)):
+            key = ''.join(random.choices('ab//', k=random.randint(1, 6)))
+            items.append((split(key), str(i)))
+            normal_dict['/'.join(split(key))] = str(i)
+        if random.random() < 0.5:
+            items.sort(key=lambda item: item[0])
+        t.update_many(items)
+        assert t.flatten() == normal_dict
+        assert len(t) == len(normal_dict)
+        assert snap.flatten() == before
+        rebuilt = Trie()
+        for key, value in normal_dict.items():
+            rebuilt.put(split(key), value)
+        assert t.update_hash() == rebuilt.update_hash()
+        for key in normal_dict:
+            assert t.size(split(key)) == rebuilt.size(split(key))
+
+
+def test_update_many_tuple_keys():
+    t = Trie()
+    t.put(['a'], '0')
+    t.update_many([(('a', 'b'), '1'), (('a', 'c'), '2'), (('d',), '3')])
+    assert t.flatten() == {'a': '0', 'a/b': '1', 'a/c': '2', 'd': '3'}
+    assert len(t) == 4
+
+
+def test_update_many_mixed_keys():
+    t = Trie()
+    t.update_many([(['b'], '1'), (('a', 'c'), '2'), (['a'], '3')])
+    assert t.flatten() == {'a': '3', 'a/c': '2', 'b': '1'}
+    assert t.nth(['a'], 1) == ['a', 'c']
+    t.update_many([(('b', 'd'), '4'), (['a'], '5')])
+    assert t.flatten() == {'a': '5', 'a/c': '2', 'b': '1', 'b/d': '4'}
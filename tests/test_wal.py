@@ -0,0 +1,93 @@
+import os
+import shutil
+
+import pytest
+
+import revert
+from revert import config, db_state
+from revert.wal import Wal
+
+
+def test_records_and_torn_tail(tmp_path):
+    wal = Wal(str(tmp_path))
+    wal.commit('c1', b'data 1')
+    wal.blob('value')
+    wal.head('c1')
+    wal.head('c0')
+    wal.close()
+    with open(wal.path, 'ab') as f:
+        f.write(b'\x20\0\0\0torn')
+    wal = Wal(str(tmp_path))
+    assert list(wal.records()) == [(0, b'\x02c1data 1'), (1, b'value'), (2, b'c0')]
+    assert wal.size == os.path.getsize(wal.path)
+    wal.reset()
+    assert os.path.getsize(wal.path) == 0
+    assert list(wal.records()) == []
+    wal.close()
+
+
+def _files(directory, lost):
+    """the files whose writes a crash loses"""
+    names = {'pack': ('pack-', config.pack_index_file), 'log': (config.commit_parents_file, config.dag_file),
+             'head': (config.head_file,), 'blobs': ('blobs',)}
+    if lost == 'all':
+        prefixes = sum(names.values(), ())
+    else:
+        prefixes = names[lost]
+    return [name for name in os.listdir(directory) if name.startswith(prefixes)]
+
+
+@pytest.mark.parametrize('lost', ['pack', 'log', 'head', 'blobs', 'all', 'torn'])
+def test_crash_recovery(monkeypatch, lost):
+    directory = os.path.join(os.curdir, '../test_tmp_dir')
+    wal_directory = os.path.join(os.curdir, '../test_tmp_wal')
+    before = os.path.join(os.curdir, '../test_tmp_wal_before')
+    for path in (wal_directory, before):
+        shutil.rmtree(path, ignore_errors=True)
+    os.makedirs(wal_directory)
+    monkeypatch.setattr(config, 'blob_threshold', 100)
+    revert.connect(wal_directory)
+    for i in range(2):
+        with revert.transaction(f'kept {i}'):
+            revert.put('wal', str(i))
+    revert.flush()
+    shutil.copytree(wal_directory, before)
+    for i in range(2):
+        with revert.transaction(f'crashed {i}'):
+            revert.put('wal', str(i + 2))
+            revert.put(f'wal/{i}', 'large ' * 100)
+    expected = dict(revert.match_items('wal'))
+    head, parents, _, _ = revert.get_commit_dag()
+    with open(db_state.wal.path, 'rb') as f:
+        log = f.read()
+    # the process dies here: the writes after the log are replaced by those that reached the disk before
+    revert.connect(directory)
+    lost_files = 'all' if lost == 'torn' else lost
+    for name in _files(wal_directory, lost_files):
+        path = os.path.join(wal_directory, name)
+        if os.path.isdir(path):
+            shutil.rmtree(path)
+        else:
+            os.remove(path)
+    for name in _files(before, lost_files):
+        path = os.path.join(before, name)
+        if os.path.isdir(path):
+            shutil.copytree(path, os.path.join(wal_directory, name))
+        else:
+            shutil.copy(path, os.path.join(wal_directory, name))
+    with open(os.path.join(wal_directory, f'{config.wal_file}_{config.device_name}'), 'wb') as f:
+        f.write(log[:-3] if lost == 'torn' else log)
+    revert.connect(wal_directory)
+    assert os.path.getsize(db_state.wal.path) == 0
+    if lost == 'torn':
+        # the last commit is lost with its record, the commits before it are not
+        assert revert.get_commit_dag()[0] == parents[head][0]
+        assert head not in revert.get_commit_dag()[1]
+    else:
+        assert revert.get_commit_dag()[0] == head
+        assert dict(revert.match_items('wal')) == expected
+        revert.undo()
+    assert revert.get('wal') == '2'
+    revert.connect(wal_directory)
+    assert revert.get('wal') == '2'
+    revert.connect(directory)
@@ -0,0 +1,43 @@
+import os
+
+import pytest
+
+from revert.writer import Writer
+
+
+@pytest.mark.parametrize('durability', ['none', 'batch', 'every_commit'])
+def test_writes_in_order(tmp_path, durability):
+    writer = Writer(durability)
+    log = open(os.path.join(tmp_path, 'log'), 'ab')
+    head = os.path.join(tmp_path, 'head')
+    seen = []
+    for i in range(100):
+        writer.append(log, f'{i}\n'.encode())
+        writer.replace(head, str(i).encode())
+        if i == 50:
+            writer.call(lambda i=i: seen.append(i))
+    writer.close_file(log)
+    writer.flush()
+    assert log.closed
+    assert seen == [50]
+    with open(os.path.join(tmp_path, 'log'), 'rb') as f:
+        assert f.read() == b''.join(f'{i}\n'.encode() for i in range(100))
+    with open(head, 'rb') as f:
+        assert f.read() == b'99'
+    writer.close()
+    assert not writer.thread.is_alive()
+
+
+def test_errors_surface(tmp_path):
+    writer = Writer('none')
+
+    def fail():
+        raise OSError('disk full')
+
+    writer.call(fail)
+    with pytest.raises(OSError):
+        writer.flush()
+    writer.append(open(os.path.join(tmp_path, 'log'), 'ab'), b'written')
+    writer.close()
+    with pytest.raises(ValueError):
+        Writer('sometimes')